@@ -25,17 +25,36 @@ is_registered = False
 def load_ipython_extension(ipython):
     """Called by IPython when this module is loaded as an IPython extension."""
     # Import here to avoid circular imports.
-    from bigquery_magics.bigquery import _cell_magic
+    from bigquery_magics.bigquery import (
+        _batch_cell_magic,
+        _cell_magic,
+        _start_warm_up,
+        _stats_line_magic,
+    )
 
     ipython.register_magic_function(
         _cell_magic, magic_kind="cell", magic_name="bigquery"
     )
+    ipython.register_magic_function(
+        _batch_cell_magic, magic_kind="cell", magic_name="bigquery_batch"
+    )
+    ipython.register_magic_function(
+        _stats_line_magic, magic_kind="line", magic_name="bigquery_stats"
+    )
+
+    if context.warm_up_on_load:
+        _start_warm_up()
 
     global is_registered
     is_registered = True
 
 
 def unload_ipython_extension(ipython):
+    # Import here to avoid circular imports.
+    from bigquery_magics.client_pool import client_pool
+
+    client_pool.close()
+
     global is_registered
     is_registered = False
 
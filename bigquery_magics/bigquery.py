@@ -38,6 +38,12 @@
         Variable should be in a format <dataset_id>.<table_id>.
     * ``--no_query_cache`` (Optional[line argument]):
         Do not use cached query results.
+    * ``--no_client_cache`` (Optional[line argument]):
+        Do not look up or store the results in the session's in-memory result
+        cache. See :attr:`~bigquery_magics.config.Context.use_client_cache`.
+    * ``--refresh`` (Optional[line argument]):
+        Re-run the query even if its results are in the in-memory result
+        cache, and cache the new results.
     * ``--project <project>`` (Optional[line argument]):
         Project to use for running the query. Defaults to the context
         :attr:`~google.cloud.bigquery.magics.Context.project`.
@@ -45,14 +51,109 @@
         [Deprecated] Not used anymore, as BigQuery Storage API is used by default.
     * ``--use_rest_api`` (Optional[line argument]):
         Use the BigQuery REST API instead of the Storage API.
+    * ``--use_query_and_wait`` (Optional[line argument]):
+        Run the query with the stateless ``jobs.query`` API, which may skip
+        creating a job and returns the first page of results with the query
+        response. The results are not stored in the result cache. Defaults
+        to the context
+        :attr:`~bigquery_magics.config.Context.use_query_and_wait`.
     * ``--use_legacy_sql`` (Optional[line argument]):
         Runs the query using Legacy SQL syntax. Defaults to Standard SQL if
         this argument not used.
+    * ``--async`` (Optional[line argument]):
+        Submit the query job and return a
+        :class:`~bigquery_magics.query_handle.QueryHandle` right away. The
+        results are downloaded on a background thread and stored in
+        ``<destination_var>`` once they are available. The handle can be
+        awaited, waited on with ``result()``, or cancelled with ``cancel()``.
+    * ``--output <format>`` (Optional[line argument]):
+        Format of the results: ``pandas`` for a :class:`pandas.DataFrame`,
+        ``arrow`` for the :class:`pyarrow.Table` as downloaded, without
+        converting it to pandas, or ``polars`` for a
+        :class:`polars.DataFrame` built from that table. Defaults to the
+        context
+        :attr:`~bigquery_magics.config.Context.output_format`.
+    * ``--dtype_backend <backend>`` (Optional[line argument]):
+        Backing data of the DataFrame columns: ``pyarrow`` for
+        :class:`pandas.ArrowDtype` columns converted from the downloaded
+        Arrow table without copying it, printing an estimate of the memory
+        saved, or ``numpy`` for the client library default dtypes. Defaults
+        to the context
+        :attr:`~bigquery_magics.config.Context.dtype_backend`.
+    * ``--optimize_dtypes`` (Optional[line argument]):
+        Convert the DataFrame columns to smaller dtypes, such as categoricals
+        for low-cardinality strings and downcast integers and floats, and
+        print the memory saved. Floats are only downcast to float32 if all
+        their values are exactly representable. Defaults to the context
+        :attr:`~bigquery_magics.config.Context.optimize_dtypes`.
+    * ``--columns <columns>`` (Optional[line argument]):
+        Comma-separated columns to read when the cell contains a table ID.
+        Only these columns are read from BigQuery.
+    * ``--where <filter>`` (Optional[line argument]):
+        SQL filter of the rows to read when the cell contains a table ID,
+        such as ``--where="num > 5"``. The filter is applied by the BigQuery
+        Storage API read session, so only matching rows are read.
+    * ``--max_stream_count <num_streams>`` (Optional[line argument]):
+        Maximum number of BigQuery Storage API streams to read the results
+        from in parallel, or ``0`` to let the server decide. Defaults to the
+        context
+        :attr:`~bigquery_magics.config.Context.bqstorage_max_stream_count`.
+    * ``--preserve_order`` / ``--no_preserve_order`` (Optional[line argument]):
+        Read the results from a single BigQuery Storage API stream so that
+        rows arrive in order, or read the results of queries with an ORDER
+        BY clause from several streams too. Defaults to the context
+        :attr:`~bigquery_magics.config.Context.bqstorage_preserve_order`.
+    * ``--bqstorage_compression <codec>`` (Optional[line argument]):
+        Compression of the record batches sent by the BigQuery Storage API,
+        ``lz4``, ``zstd`` or ``none``. Defaults to the context
+        :attr:`~bigquery_magics.config.Context.bqstorage_compression`.
+    * ``--memory_budget <size>`` (Optional[line argument]):
+        Maximum estimated memory size of the results, in bytes or with a
+        unit, such as ``2GiB``. The size is estimated before downloading
+        the results, from the size and schema of the table holding them.
+        Defaults to the context
+        :attr:`~bigquery_magics.config.Context.memory_budget`.
+    * ``--memory_budget_policy <policy>`` (Optional[line argument]):
+        What to do with results estimated to exceed the memory budget:
+        ``error`` to refuse downloading them, ``sample`` to download only
+        the first rows that fit, ``stream`` to return a stream of record
+        batches as with ``--stream arrow``, or ``spill`` to write them to a
+        temporary file and return them memory-mapped from it. Defaults to
+        the context
+        :attr:`~bigquery_magics.config.Context.memory_budget_policy`.
+    * ``--stream <format>`` (Optional[line argument]):
+        Instead of a DataFrame, return a
+        :class:`~bigquery_magics.result_stream.ResultStream` that downloads
+        the results in chunks as it is iterated, so that they never have to
+        fit in memory at once. The chunks are :class:`pyarrow.RecordBatch`
+        objects if ``<format>`` is ``arrow``, or :class:`pandas.DataFrame`
+        objects if it is ``pandas``.
+    * ``--stream_prefetch <num_chunks>`` (Optional[line argument]):
+        Maximum number of chunks to download ahead of the one being
+        processed with ``--stream``. Defaults to the context
+        :attr:`~bigquery_magics.config.Context.stream_prefetch`.
+    * ``--to_parquet <path>`` (Optional[line argument]):
+        Write the results to a local Parquet file as they are downloaded,
+        instead of returning a DataFrame. Only a few record batches are kept
+        in memory at once.
+    * ``--to_arrow_ipc <path>`` (Optional[line argument]):
+        Like ``--to_parquet``, but writes an Arrow IPC file.
+    * ``--export_compression <codec>`` (Optional[line argument]):
+        Compression codec of the exported file. One of ``snappy`` (the
+        default), ``gzip``, ``brotli``, ``zstd``, ``lz4`` or ``none`` with
+        ``--to_parquet``, or ``lz4``, ``zstd`` or ``none`` (the default) with
+        ``--to_arrow_ipc``.
+    * ``--row_group_size <num_rows>`` (Optional[line argument]):
+        Number of rows in each row group of the file written with
+        ``--to_parquet``. Defaults to one row group per downloaded batch.
     * ``--verbose`` (Optional[line argument]):
         If this flag is used, information including the query job ID and the
         amount of time for the query to complete will not be cleared after the
         query is finished. By default, this information will be displayed but
-        will be cleared after the query is finished.
+        will be cleared after the query is finished. The time spent in each
+        phase of the cell, the query job statistics and the size of the
+        downloaded results are printed too, from
+        :attr:`~bigquery_magics.config.Context.last_run_stats`.
     * ``--graph`` (Optional[line argument]):
         Visualizes the query result as a graph.
     * ``--use_geodataframe <params>`` (Optional[line argument]):
@@ -99,50 +200,144 @@
     .. note::
         All queries run using this magic will run using the context
         :attr:`~bigquery_magics.config.Context.credentials`.
+
+.. function:: ``%%bigquery_batch``
+
+    IPython cell magic to run several independent queries concurrently and
+    store each result in its own DataFrame variable
+
+    .. code-block:: python
+
+        %%bigquery_batch [--max_concurrency <max_concurrency>] [--project <project>]
+        -- name: <destination_var>
+        <query>
+        -- name: <destination_var>
+        <query>
+
+    Each query starts with a ``-- name: <destination_var>`` line. Queries are
+    submitted and their results downloaded on a thread pool, so the cell takes
+    about as long as the slowest query. Errors are reported per query, and the
+    other results are still stored.
+
+    Parameters:
+
+    * ``--max_concurrency <max_concurrency>`` (Optional[line argument]):
+        Maximum number of queries to run at the same time. Defaults to the
+        context
+        :attr:`~bigquery_magics.config.Context.batch_max_concurrency`.
+    * ``--project``, ``--location``, ``--max_results``,
+      ``--maximum_bytes_billed``, ``--no_query_cache``, ``--use_legacy_sql``,
+      ``--use_rest_api``, ``--bigquery_api_endpoint``,
+      ``--bqstorage_api_endpoint`` (Optional[line arguments]):
+        Same as for ``%%bigquery``, applied to every query.
+
+    The context :attr:`~bigquery_magics.config.Context.memory_budget` applies
+    to the results of each query, with the ``error``, ``sample`` or ``spill``
+    policy.
+
+.. function:: ``%bigquery_stats``
+
+    IPython line magic to summarize the ``%%bigquery`` cells run in the
+    session
+
+    .. code-block:: python
+
+        %bigquery_stats [--top <n>] [--sort_by <statistic>] [--reset]
+
+    Prints the totals of the bytes processed and billed, slot-milliseconds,
+    cache hit ratio, time spent in each phase, and rows and bytes downloaded,
+    followed by the cells that took longest or cost most. Only the last
+    :attr:`~bigquery_magics.config.Context.stats_history_size` cells are
+    kept.
+
+    Parameters:
+
+    * ``--top <n>`` (Optional[line argument]):
+        Number of cells to list. Defaults to 5.
+    * ``--sort_by <statistic>`` (Optional[line argument]):
+        Rank cells by ``duration`` (the default), ``bytes_processed``,
+        ``bytes_billed`` or ``slot_millis``.
+    * ``--reset`` (Optional[line argument]):
+        Forget the statistics of the cells run so far.
 """
 
-from __future__ import print_function
+from __future__ import annotations, print_function
 
 import ast
 from concurrent import futures
+import contextlib
+import contextvars
 import copy
+import functools
+import importlib.util
 import json
+import os
 import re
 import sys
+import tempfile
 import threading
 import time
-from typing import Any, List, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 import warnings
 
 import IPython  # type: ignore
 from IPython.core import magic_arguments  # type: ignore
 from IPython.core.getipython import get_ipython
-from google.api_core.exceptions import NotFound
-from google.cloud import bigquery
-from google.cloud.bigquery import exceptions
-from google.cloud.bigquery.dataset import DatasetReference
-from google.cloud.bigquery.dbapi import _helpers
-from google.cloud.bigquery.job import QueryJobConfig
-import pandas
 
 from bigquery_magics import line_arg_parser as lap
-import bigquery_magics._versions_helpers
+from bigquery_magics.client_pool import client_pool
 import bigquery_magics.config
-import bigquery_magics.graph_server as graph_server
-from bigquery_magics import core
+from bigquery_magics import core, export, memory_budget, read_session, telemetry
 import bigquery_magics.pyformat
+from bigquery_magics.query_handle import QueryHandle
+from bigquery_magics.result_stream import ResultStream
+from bigquery_magics.disk_cache import disk_cache
+from bigquery_magics.result_cache import (
+    ResultInfo,
+    destination_tables,
+    expires_soon,
+    is_anonymous_table,
+    is_cacheable,
+    query_fingerprint,
+    result_cache,
+)
+from bigquery_magics import stats
+from bigquery_magics.stats import RunStats
+
+# Loading the extension only needs this module to register the magic. Heavy
+# dependencies, such as google-cloud-bigquery (which pulls in pandas and
+# pyarrow), bigframes, the BigQuery Storage client and the graph server, are
+# imported on first use.
+if TYPE_CHECKING:
+    from google.cloud import bigquery
+    from google.cloud.bigquery.job import QueryJobConfig
+    import pandas
 
-try:
-    from google.cloud import bigquery_storage  # type: ignore
-except ImportError:
-    bigquery_storage = None
+context = bigquery_magics.config.context
 
-try:
-    import bigframes.pandas as bpd
-except ImportError:
-    bpd = None
+# How often to update the elapsed time while waiting for a query.
+_STATUS_UPDATE_INTERVAL = 1.0
 
-context = bigquery_magics.config.context
+# Results capped with --max_results to fewer rows than this fit in a few
+# pages of the REST API, which is faster than starting a BigQuery Storage API
+# read session.
+_MIN_BQSTORAGE_MAX_RESULTS = 10_000
+
+
+# The handle of the query whose results are downloaded on the current
+# thread with --async, if any.
+_async_query = threading.local()
+
+
+def _print_message(message: str):
+    """Prints a message about the query results, or keeps it for when the
+    results of a query running in the background are retrieved.
+    """
+    handle = getattr(_async_query, "handle", None)
+    if handle is None:
+        print(message)
+    else:
+        handle._add_message(message)
 
 
 def _handle_error(error, destination_var=None):
@@ -170,6 +365,50 @@ def _handle_error(error, destination_var=None):
     print("\nERROR:\n", str(error), file=sys.stderr)
 
 
+class _ElapsedTimeStatus:
+    """Prints the time elapsed since ``start_time`` on a timer, independently
+    of how often the job is polled.
+    """
+
+    def __init__(self, start_time: float):
+        self._start_time = start_time
+        self._interval = _STATUS_UPDATE_INTERVAL
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _print(self):
+        elapsed = time.perf_counter() - self._start_time
+        print(f"\rQuery executing: {elapsed:.2f}s", end="")
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            self._print()
+
+    def __enter__(self):
+        self._print()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+
+def _wait_for_job(query_job):
+    """Waits for a query job to finish.
+
+    Without a timeout, ``QueryJob.result`` waits with server-side long polls
+    of ``jobs.getQueryResults``, which return as soon as the job finishes, or
+    after 10 seconds. A client-side timeout would instead abort the request
+    in flight and start another one.
+
+    Args:
+        query_job (google.cloud.bigquery.job.QueryJob):
+            The query job to wait for.
+    """
+    query_job.result()
+
+
 def _run_query(client, query, job_config=None):
     """Runs a query while printing status updates
 
@@ -194,27 +433,147 @@ def _run_query(client, query, job_config=None):
         'bf633912-af2c-4780-b568-5d868058632b'
     """
     start_time = time.perf_counter()
-    query_job = client.query(query, job_config=job_config)
+    with stats.timed("submit"):
+        query_job = client.query(query, job_config=job_config)
 
     if job_config and job_config.dry_run:
         return query_job
 
     print(f"Executing query with job ID: {query_job.job_id}")
 
-    while True:
-        print(
-            f"\rQuery executing: {time.perf_counter() - start_time:.2f}s".format(),
-            end="",
-        )
-        try:
-            query_job.result(timeout=0.5)
-            break
-        except futures.TimeoutError:
-            continue
+    with _ElapsedTimeStatus(start_time), stats.timed("wait"):
+        _wait_for_job(query_job)
     print(f"\nJob ID {query_job.job_id} successfully executed")
+
+    run_stats = stats.current()
+    if run_stats is not None:
+        run_stats.record_job(query_job)
     return query_job
 
 
+def _run_query_async(
+    client, query, args, bqstorage_client, job_config=None
+) -> QueryHandle:
+    """Submits a query and waits for it and downloads its results on a
+    background thread.
+
+    Args:
+        client (google.cloud.bigquery.client.Client):
+            Client to bundle configuration needed for API requests.
+        query (str):
+            SQL query to be executed.
+        args (Any):
+            The parsed magic arguments.
+        bqstorage_client (Optional[google.cloud.bigquery_storage.BigQueryReadClient]):
+            Client to download the results with, if any.
+        job_config (Optional[google.cloud.bigquery.job.QueryJobConfig]):
+            Extra configuration options for the job.
+
+    Returns:
+        bigquery_magics.query_handle.QueryHandle: handle to the running query.
+    """
+    query_job = client.query(query, job_config=job_config)
+    handle = QueryHandle(query_job)
+    print(f"Executing query with job ID {query_job.job_id} in the background")
+
+    def wait_and_download():
+        _async_query.handle = handle
+        try:
+            # Cancelling the handle cancels the job, which ends the wait.
+            _wait_for_job(query_job)
+            if handle.cancelled():
+                return
+
+            over_budget = None
+            if _memory_budget(args) is not None:
+                over_budget = _check_query_memory_budget(client, query_job, None, args)
+
+            max_results = int(args.max_results) if args.max_results else None
+            if args.stream:
+                rows = query_job.result(max_results=max_results)
+                result = _stream_rows(rows, args, client, bqstorage_client)
+            elif over_budget == "spill":
+                rows = query_job.result(max_results=max_results)
+                result = _spill_rows(rows, args, bqstorage_client)
+            else:
+                rows = query_job
+                limit_rows = _limit_rows_with_bqstorage(
+                    args, bqstorage_client, query_job
+                )
+                if max_results and not limit_rows:
+                    rows = query_job.result(max_results=max_results)
+                # Progress bars would be written to whichever cell is running.
+                result = _download_rows(
+                    rows, args, bqstorage_client, None, limit_rows=limit_rows
+                )
+        except Exception as ex:
+            handle._set_exception(ex)
+            return
+        finally:
+            _async_query.handle = None
+        handle._set_result(result, lambda result: _handle_result(result, args))
+
+    threading.Thread(
+        target=wait_and_download,
+        name=f"bigquery-magics-{query_job.job_id}",
+        daemon=True,
+    ).start()
+    return handle
+
+
+def _run_query_and_wait(client, query, job_config=None, max_results=None):
+    """Runs a query with the stateless jobs.query API while printing status
+    updates.
+
+    BigQuery may skip creating a job for short queries, and the first page of
+    results is returned along with the query response. Queries that do not
+    finish within the jobs.query timeout continue as a regular query job.
+
+    The response does not list the tables the query read, so its results
+    are not stored in the result cache, which needs them to tell when the
+    results become stale.
+
+    Args:
+        client (google.cloud.bigquery.client.Client):
+            Client to bundle configuration needed for API requests.
+        query (str):
+            SQL query to be executed. Defaults to the standard SQL dialect.
+            Use the ``job_config`` parameter to change dialects.
+        job_config (Optional[google.cloud.bigquery.job.QueryJobConfig]):
+            Extra configuration options for the job.
+        max_results (Optional[int]):
+            Maximum number of rows to return.
+
+    Returns:
+        google.cloud.bigquery.table.RowIterator: the query results.
+    """
+    start_time = time.perf_counter()
+    print("Executing query...")
+
+    # Let BigQuery skip creating a job for short queries. Only query_and_wait
+    # reads this setting, so it is restored once the query has been sent, as
+    # the client may be shared with other cells.
+    job_creation_mode = client.default_job_creation_mode
+    client.default_job_creation_mode = "JOB_CREATION_OPTIONAL"
+    try:
+        with stats.timed("wait"):
+            rows = client.query_and_wait(
+                query, job_config=job_config, max_results=max_results
+            )
+    finally:
+        client.default_job_creation_mode = job_creation_mode
+    run_stats = stats.current()
+    if run_stats is not None:
+        run_stats.record_job(rows)
+
+    elapsed = time.perf_counter() - start_time
+    if rows.job_id:
+        print(f"Job ID {rows.job_id} successfully executed in {elapsed:.2f}s")
+    else:
+        print(f"Query ID {rows.query_id} successfully executed in {elapsed:.2f}s")
+    return rows
+
+
 def _create_dataset_if_necessary(client, dataset_id):
     """Create a dataset in the current project if it doesn't exist.
 
@@ -224,6 +583,10 @@ def _create_dataset_if_necessary(client, dataset_id):
         dataset_id (str):
             Dataset id.
     """
+    from google.api_core.exceptions import NotFound
+    from google.cloud import bigquery
+    from google.cloud.bigquery.dataset import DatasetReference
+
     dataset_reference = DatasetReference(client.project, dataset_id)
     try:
         dataset = client.get_dataset(dataset_reference)
@@ -285,6 +648,20 @@ def _create_dataset_if_necessary(client, dataset_id):
         "Does not work with engine 'bigframes'. "
     ),
 )
+@magic_arguments.argument(
+    "--use_query_and_wait",
+    action="store_true",
+    default=False,
+    help=(
+        "Run the query with the stateless jobs.query API, which returns the "
+        "first page of results with the query response and may skip creating "
+        "a job. Best suited to short queries. The results are not stored in "
+        "the result cache. Defaults to the context "
+        "use_query_and_wait setting. Ignored for dry runs, with --graph, "
+        "when the engine is 'bigframes', and with versions of "
+        "google-cloud-bigquery without job creation modes."
+    ),
+)
 @magic_arguments.argument(
     "--use_legacy_sql",
     action="store_true",
@@ -318,6 +695,24 @@ def _create_dataset_if_necessary(client, dataset_id):
     default=False,
     help=("Do not use cached query results."),
 )
+@magic_arguments.argument(
+    "--no_client_cache",
+    action="store_true",
+    default=False,
+    help=(
+        "Do not look up or store the results in the in-memory result cache of "
+        "this session."
+    ),
+)
+@magic_arguments.argument(
+    "--refresh",
+    action="store_true",
+    default=False,
+    help=(
+        "Re-run the query even if its results are in the in-memory result "
+        "cache, and cache the new results."
+    ),
+)
 @magic_arguments.argument(
     "--use_bqstorage_api",
     action="store_true",
@@ -338,6 +733,191 @@ def _create_dataset_if_necessary(client, dataset_id):
         "download query results."
     ),
 )
+@magic_arguments.argument(
+    "--async",
+    dest="run_async",
+    action="store_true",
+    default=False,
+    help=(
+        "Submit the query and return a handle right away, then wait for the "
+        "query and download its results in the background. The results are "
+        "stored in the destination variable once available. The handle can "
+        "be awaited or cancelled. Not supported with --dry_run, --graph, or "
+        "when the engine is 'bigframes'. Table previews always run in the "
+        "foreground."
+    ),
+)
+@magic_arguments.argument(
+    "--output",
+    type=str,
+    default=None,
+    choices=("pandas", "arrow", "polars"),
+    help=(
+        "Format of the results: a pandas DataFrame with 'pandas', a pyarrow "
+        "Table with 'arrow', or a polars DataFrame with 'polars'. 'arrow' and "
+        "'polars' skip the conversion to pandas. Defaults to the context "
+        "output_format."
+    ),
+)
+@magic_arguments.argument(
+    "--dtype_backend",
+    type=str,
+    default=None,
+    choices=("numpy", "pyarrow"),
+    help=(
+        "Backing data of the DataFrame columns: 'pyarrow' for pandas.ArrowDtype "
+        "columns, printing an estimate of the memory saved, or 'numpy' for "
+        "the default dtypes. Defaults to the context dtype_backend."
+    ),
+)
+@magic_arguments.argument(
+    "--optimize_dtypes",
+    action="store_true",
+    default=False,
+    help=(
+        "Convert the DataFrame columns to smaller dtypes and print the memory "
+        "saved. Defaults to the context optimize_dtypes setting."
+    ),
+)
+@magic_arguments.argument(
+    "--columns",
+    type=str,
+    default=None,
+    help=(
+        "Comma-separated columns to read when previewing a table, for "
+        "example --columns=name,num. Only these columns are downloaded."
+    ),
+)
+@magic_arguments.argument(
+    "--where",
+    type=str,
+    default=None,
+    help=(
+        "SQL filter of the rows to read when previewing a table, for example "
+        '--where="num > 5". Requires the BigQuery Storage API.'
+    ),
+)
+@magic_arguments.argument(
+    "--max_stream_count",
+    type=int,
+    default=None,
+    help=(
+        "Maximum number of BigQuery Storage API streams to read the results "
+        "from in parallel, or 0 to let the server decide. Defaults to the "
+        "context bqstorage_max_stream_count."
+    ),
+)
+@magic_arguments.argument(
+    "--preserve_order",
+    action="store_const",
+    const=True,
+    default=None,
+    help=(
+        "Read the results from a single BigQuery Storage API stream, so that "
+        "rows arrive in order."
+    ),
+)
+@magic_arguments.argument(
+    "--no_preserve_order",
+    dest="preserve_order",
+    action="store_const",
+    const=False,
+    help=(
+        "Read the results of queries with an ORDER BY clause from several "
+        "BigQuery Storage API streams too. Rows may arrive out of order."
+    ),
+)
+@magic_arguments.argument(
+    "--bqstorage_compression",
+    type=str,
+    default=None,
+    choices=read_session.COMPRESSIONS,
+    help=(
+        "Compression of the record batches sent by the BigQuery Storage API. "
+        "Defaults to the context bqstorage_compression."
+    ),
+)
+@magic_arguments.argument(
+    "--memory_budget",
+    type=str,
+    default=None,
+    help=(
+        "Maximum estimated memory size of the results, in bytes or with a "
+        "unit, such as 2GiB. Defaults to the context memory_budget."
+    ),
+)
+@magic_arguments.argument(
+    "--memory_budget_policy",
+    type=str,
+    default=None,
+    choices=memory_budget.POLICIES,
+    help=(
+        "What to do with results estimated to exceed the memory budget: "
+        "'error', 'sample' the first rows that fit, 'stream' them, or "
+        "'spill' them to a temporary file. Defaults to the context "
+        "memory_budget_policy."
+    ),
+)
+@magic_arguments.argument(
+    "--stream",
+    type=str,
+    default=None,
+    choices=("arrow", "pandas"),
+    help=(
+        "Return an iterator that downloads the results in chunks as it is "
+        "consumed, instead of a DataFrame. The chunks are pyarrow "
+        "RecordBatches with 'arrow', or DataFrames with 'pandas'. Not "
+        "supported with --dry_run, --graph, --async or --use_geodataframe."
+    ),
+)
+@magic_arguments.argument(
+    "--to_parquet",
+    type=str,
+    default=None,
+    metavar="PATH",
+    help=(
+        "Write the results to a local Parquet file as they are downloaded, "
+        "instead of returning a DataFrame."
+    ),
+)
+@magic_arguments.argument(
+    "--to_arrow_ipc",
+    type=str,
+    default=None,
+    metavar="PATH",
+    help=(
+        "Write the results to a local Arrow IPC file as they are downloaded, "
+        "instead of returning a DataFrame."
+    ),
+)
+@magic_arguments.argument(
+    "--export_compression",
+    type=str,
+    default=None,
+    help=(
+        "Compression codec of the file written with --to_parquet (snappy, "
+        "gzip, brotli, zstd, lz4 or none, defaults to snappy) or "
+        "--to_arrow_ipc (lz4, zstd or none, defaults to none)."
+    ),
+)
+@magic_arguments.argument(
+    "--row_group_size",
+    type=int,
+    default=None,
+    help=(
+        "Number of rows in each row group of the file written with "
+        "--to_parquet. Defaults to one row group per downloaded batch."
+    ),
+)
+@magic_arguments.argument(
+    "--stream_prefetch",
+    type=int,
+    default=None,
+    help=(
+        "Maximum number of chunks to download ahead of the one being "
+        "processed with --stream. Defaults to the context stream_prefetch."
+    ),
+)
 @magic_arguments.argument(
     "--verbose",
     action="store_true",
@@ -346,7 +926,8 @@ def _create_dataset_if_necessary(client, dataset_id):
         "If set, print verbose output, including the query job ID and the "
         "amount of time for the query to finish. By default, this "
         "information will be displayed as the query runs, but will be "
-        "cleared after the query is finished."
+        "cleared after the query is finished. Also prints the time spent in "
+        "each phase of the cell and the query job statistics. "
         "This flag is ignored when the engine is 'bigframes'."
     ),
 )
@@ -433,54 +1014,408 @@ def _cell_magic(line, query):
         pandas.DataFrame: the query results.
     """
 
-    params, args = _parse_magic_args(line)
+    run_stats = RunStats()
+    execution_count = getattr(get_ipython(), "execution_count", None)
+    if isinstance(execution_count, int):
+        run_stats.cell_number = execution_count
+    context.last_run_stats = run_stats
+    start_time = time.perf_counter()
+    with telemetry.span("cell") as cell_span, stats.recording(run_stats):
+        try:
+            with stats.timed("parse_args"):
+                params, args = _parse_magic_args(line)
+
+            query = query.strip()
+            if not query:
+                error = ValueError("Query is missing.")
+                _handle_error(error, args.destination_var)
+                return
+            query = _validate_and_resolve_query(query, args)
+            run_stats.query = query
+
+            engine = args.engine or context.engine
+            run_stats.engine = engine
+
+            if engine == "bigframes":
+                result = _query_with_bigframes(query, params, args)
+            else:
+                result = _query_with_pandas(query, params, args)
+        finally:
+            run_stats.duration = time.perf_counter() - start_time
+            telemetry.record_run(cell_span, run_stats, run_stats.duration)
+            stats.session_stats.max_size = context.stats_history_size
+            stats.session_stats.add(run_stats)
+
+    if args.verbose:
+        summary = run_stats.summary()
+        if summary:
+            print(summary)
+    return result
 
-    query = query.strip()
-    if not query:
-        error = ValueError("Query is missing.")
-        _handle_error(error, args.destination_var)
-        return
-    query = _validate_and_resolve_query(query, args)
 
-    engine = args.engine or context.engine
+@magic_arguments.magic_arguments()
+@magic_arguments.argument(
+    "--top",
+    type=int,
+    default=5,
+    help=("Number of cells to list, with the largest --sort_by value first."),
+)
+@magic_arguments.argument(
+    "--sort_by",
+    choices=sorted(stats.SORT_KEYS),
+    default="duration",
+    help=(
+        "Statistic to rank cells by: duration (the default), bytes_processed, "
+        "bytes_billed or slot_millis."
+    ),
+)
+@magic_arguments.argument(
+    "--reset",
+    action="store_true",
+    default=False,
+    help=("Forget the statistics of the cells run so far."),
+)
+def _stats_line_magic(line):
+    """Underlying function for bigquery_stats line magic
 
-    if engine == "bigframes":
-        return _query_with_bigframes(query, params, args)
+    Note:
+        This function contains the underlying logic for the 'bigquery_stats'
+        line magic. This function is not meant to be called directly.
 
-    return _query_with_pandas(query, params, args)
+    Args:
+        line (str): "%bigquery_stats" followed by arguments as required
+    """
+    args = magic_arguments.parse_argstring(_stats_line_magic, line)
+    if args.top < 0:
+        raise ValueError("--top must be a non-negative integer.")
 
+    if args.reset:
+        stats.session_stats.clear()
+        return
+    print(stats.session_stats.summary(top=args.top, sort_by=args.sort_by))
 
-def _parse_magic_args(line: str) -> Tuple[List[Any], Any]:
-    # The built-in parser does not recognize Python structures such as dicts, thus
-    # we extract the "--params" option and interpret it separately.
-    try:
-        params_option_value, rest_of_args = _split_args_line(line)
 
-    except lap.QueryParamsParseError as exc:
-        raise SyntaxError(
-            "--params is not a correctly formatted JSON string or a JSON "
-            "serializable dictionary"
-        ) from exc
+# Starts each query in a %%bigquery_batch cell, naming its destination variable.
+_BATCH_QUERY_HEADER = re.compile(
+    r"^[ \t]*--[ \t]*name:[ \t]*(\S*)[ \t]*$", re.MULTILINE
+)
 
-    except lap.DuplicateQueryParamsError as exc:
-        raise ValueError("Duplicate --params option.") from exc
+# Options of %%bigquery_batch that are passed on to each query.
+_BATCH_QUERY_OPTIONS = (
+    "project",
+    "location",
+    "max_results",
+    "maximum_bytes_billed",
+    "no_query_cache",
+    "use_legacy_sql",
+    "use_rest_api",
+    "bigquery_api_endpoint",
+    "bqstorage_api_endpoint",
+)
 
-    except lap.ParseError as exc:
-        raise ValueError(
-            "Unrecognized input, are option values correct? "
-            "Error details: {}".format(exc.args[0])
-        ) from exc
 
-    params = []
-    if params_option_value:
-        # A non-existing params variable is not expanded and ends up in the input
-        # in its raw form, e.g. "$query_params".
-        if params_option_value.startswith("$"):
-            msg = 'Parameter expansion failed, undefined variable "{}".'.format(
+@magic_arguments.magic_arguments()
+@magic_arguments.argument(
+    "--max_concurrency",
+    type=int,
+    default=None,
+    help=(
+        "Maximum number of queries to run at the same time. Defaults to the "
+        "context batch_max_concurrency."
+    ),
+)
+@magic_arguments.argument(
+    "--project",
+    type=str,
+    default=None,
+    help=("Project to use for executing the queries. Defaults to the context project."),
+)
+@magic_arguments.argument(
+    "--location",
+    type=str,
+    default=None,
+    help=("Set the location to execute the queries."),
+)
+@magic_arguments.argument(
+    "--max_results",
+    default=None,
+    help=("Maximum number of rows in each dataframe. Defaults to all rows."),
+)
+@magic_arguments.argument(
+    "--maximum_bytes_billed",
+    default=None,
+    help=(
+        "maximum_bytes_billed to use for each query. Defaults to the context "
+        "default_query_job_config.maximum_bytes_billed."
+    ),
+)
+@magic_arguments.argument(
+    "--no_query_cache",
+    action="store_true",
+    default=False,
+    help=("Do not use cached query results."),
+)
+@magic_arguments.argument(
+    "--use_legacy_sql",
+    action="store_true",
+    default=False,
+    help=("Sets the queries to use Legacy SQL instead of Standard SQL."),
+)
+@magic_arguments.argument(
+    "--use_rest_api",
+    action="store_true",
+    default=False,
+    help=(
+        "Use the classic REST API instead of the BigQuery Storage API to "
+        "download query results."
+    ),
+)
+@magic_arguments.argument(
+    "--bigquery_api_endpoint",
+    type=str,
+    default=None,
+    help=("The desired API endpoint, e.g., bigquery.googlepis.com."),
+)
+@magic_arguments.argument(
+    "--bqstorage_api_endpoint",
+    type=str,
+    default=None,
+    help=("The desired API endpoint, e.g., bigquerystorage.googlepis.com."),
+)
+def _batch_cell_magic(line, cell):
+    """Underlying function for bigquery_batch cell magic
+
+    Note:
+        This function contains the underlying logic for the 'bigquery_batch'
+        cell magic. This function is not meant to be called directly.
+
+    Args:
+        line (str): "%%bigquery_batch" followed by arguments as required
+        cell (str): Queries to run, each preceded by a "-- name: <variable>"
+            line.
+    """
+    batch_args = magic_arguments.parse_argstring(_batch_cell_magic, line)
+    queries = _split_batch_queries(cell)
+
+    max_concurrency = batch_args.max_concurrency or context.batch_max_concurrency
+    if max_concurrency < 1:
+        raise ValueError("--max_concurrency must be a positive integer.")
+
+    # Run each query with the same options as an equivalent %%bigquery cell.
+    args = magic_arguments.parse_argstring(_cell_magic, "")
+    for option in _BATCH_QUERY_OPTIONS:
+        setattr(args, option, getattr(batch_args, option))
+    if _memory_budget(args) is not None and context.memory_budget_policy == "stream":
+        raise ValueError(
+            "%%bigquery_batch cannot stream results. Set the memory_budget_policy "
+            "to 'error', 'sample' or 'spill'."
+        )
+
+    bq_client, bqstorage_client = _create_clients(args)
+    try:
+        with telemetry.span("batch"):
+            _run_batch(
+                queries,
+                args,
+                bq_client,
+                _tune_read_sessions(bqstorage_client, args),
+                max_concurrency,
+            )
+    finally:
+        if not context.reuse_clients:
+            _close_transports(bq_client, bqstorage_client)
+
+
+def _split_batch_queries(cell: str) -> Dict[str, str]:
+    """Split the content of a %%bigquery_batch cell into named queries.
+
+    Args:
+        cell: The cell content.
+
+    Returns:
+        A mapping of destination variable names to queries, in cell order.
+    """
+    parts = _BATCH_QUERY_HEADER.split(cell)
+    if parts[0].strip():
+        raise ValueError("Each query must be preceded by a '-- name: <variable>' line.")
+
+    queries: Dict[str, str] = {}
+    for name, query in zip(parts[1::2], parts[2::2]):
+        if not name.isidentifier():
+            raise ValueError(f"Invalid variable name: {name!r}.")
+        if name in queries:
+            raise ValueError(f"Duplicate variable name: {name}.")
+        query = query.strip()
+        if not query:
+            raise ValueError(f"Query for {name} is missing.")
+        queries[name] = query
+
+    if not queries:
+        raise ValueError("Query is missing.")
+    return queries
+
+
+def _run_batch(
+    queries: Dict[str, str],
+    args: Any,
+    bq_client: bigquery.Client,
+    bqstorage_client: Any,
+    max_concurrency: int,
+):
+    """Run queries on a thread pool and store each result in the variable of
+    the same name.
+    """
+    start_time = time.perf_counter()
+    print(f"Executing {len(queries)} queries...")
+
+    execution_count = getattr(get_ipython(), "execution_count", None)
+    cell_number = execution_count if isinstance(execution_count, int) else None
+    with futures.ThreadPoolExecutor(
+        max_workers=min(max_concurrency, len(queries)),
+        thread_name_prefix="bigquery-magics-batch",
+    ) as executor:
+        pending = {
+            # Running in a copy of the current context makes the spans of the
+            # queries children of the span of the cell.
+            name: executor.submit(
+                contextvars.copy_context().run,
+                _run_recorded_batch_query,
+                query,
+                args,
+                bq_client,
+                bqstorage_client,
+                cell_number,
+            )
+            for name, query in queries.items()
+        }
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Executed {len(queries)} queries in {elapsed:.2f}s")
+
+    results = {}
+    for name, future in pending.items():
+        try:
+            job_id, result = future.result()
+        except Exception as ex:
+            _handle_error(ex, name)
+            continue
+        results[name] = result
+        job_info = f" from job ID {job_id}" if job_id else ""
+        print(f"{name}: {len(result)} rows{job_info}")
+
+    get_ipython().push(results)
+
+
+def _run_recorded_batch_query(
+    query: str,
+    args: Any,
+    bq_client: bigquery.Client,
+    bqstorage_client: Any,
+    cell_number: Optional[int],
+) -> Tuple[Optional[str], Any]:
+    """Run one query of a %%bigquery_batch cell like :func:`_run_batch_query`,
+    recording its statistics in the session statistics and tracing it as an
+    OpenTelemetry span, as for a %%bigquery cell.
+    """
+    run_stats = RunStats(query=query, engine="pandas", cell_number=cell_number)
+    start_time = time.perf_counter()
+    with telemetry.span("batch_query") as query_span, stats.recording(run_stats):
+        try:
+            return _run_batch_query(query, args, bq_client, bqstorage_client)
+        finally:
+            run_stats.duration = time.perf_counter() - start_time
+            telemetry.record_run(query_span, run_stats, run_stats.duration)
+            stats.session_stats.max_size = context.stats_history_size
+            stats.session_stats.add(run_stats)
+
+
+def _run_batch_query(
+    query: str, args: Any, bq_client: bigquery.Client, bqstorage_client: Any
+) -> Tuple[Optional[str], Any]:
+    """Run one query of a %%bigquery_batch cell and download its results.
+
+    Returns:
+        A tuple of the query job ID, or None for a table preview, and the
+        query results.
+    """
+    # The memory budget policy may lower --max_results for this query only.
+    args = copy.copy(args)
+    check_budget = _memory_budget(args) is not None
+
+    # As with %%bigquery, a query without whitespace is a table ID.
+    if not re.search(r"\s", query):
+        query_job = None
+        table = query
+        over_budget = None
+        if check_budget:
+            table = bq_client.get_table(query)
+            over_budget = _check_memory_budget(
+                args, table.schema, table.num_rows, table.num_bytes
+            )
+        max_results = int(args.max_results) if args.max_results else None
+        rows = bq_client.list_rows(table, max_results=max_results)
+    else:
+        with stats.timed("submit"):
+            query_job = bq_client.query(query, job_config=_create_job_config(args, []))
+        with stats.timed("wait"):
+            _wait_for_job(query_job)
+        run_stats = stats.current()
+        if run_stats is not None:
+            run_stats.record_job(query_job)
+        over_budget = None
+        if check_budget:
+            try:
+                over_budget = _check_query_memory_budget(
+                    bq_client, query_job, None, args
+                )
+            except memory_budget.MemoryBudgetExceededError as ex:
+                ex.query_job = query_job
+                raise
+        max_results = int(args.max_results) if args.max_results else None
+        rows = query_job
+        if max_results:
+            rows = query_job.result(max_results=max_results)
+
+    job_id = query_job.job_id if query_job is not None else None
+    if over_budget == "spill":
+        return job_id, _spill_rows(rows, args, bqstorage_client)
+    # Progress bars of concurrent downloads would overwrite each other.
+    return job_id, _download_rows(rows, args, bqstorage_client, None)
+
+
+def _parse_magic_args(line: str) -> Tuple[List[Any], Any]:
+    # The built-in parser does not recognize Python structures such as dicts, thus
+    # we extract the "--params" option and interpret it separately.
+    try:
+        params_option_value, rest_of_args = _split_args_line(line)
+
+    except lap.QueryParamsParseError as exc:
+        raise SyntaxError(
+            "--params is not a correctly formatted JSON string or a JSON "
+            "serializable dictionary"
+        ) from exc
+
+    except lap.DuplicateQueryParamsError as exc:
+        raise ValueError("Duplicate --params option.") from exc
+
+    except lap.ParseError as exc:
+        raise ValueError(
+            "Unrecognized input, are option values correct? "
+            "Error details: {}".format(exc.args[0])
+        ) from exc
+
+    params = []
+    if params_option_value:
+        # A non-existing params variable is not expanded and ends up in the input
+        # in its raw form, e.g. "$query_params".
+        if params_option_value.startswith("$"):
+            msg = 'Parameter expansion failed, undefined variable "{}".'.format(
                 params_option_value[1:]
             )
             raise NameError(msg)
 
+        from google.cloud.bigquery.dbapi import _helpers
+
         params = _helpers.to_query_parameters(ast.literal_eval(params_option_value), {})
 
     args = magic_arguments.parse_argstring(_cell_magic, rest_of_args)
@@ -513,8 +1448,21 @@ def _query_with_bigframes(query: str, params: List[Any], args: Any):
     if args.dry_run:
         raise ValueError("Dry run is not supported by bigframes engine.")
 
-    if bpd is None:
-        raise ValueError("Bigframes package is not installed.")
+    if args.run_async:
+        raise ValueError("--async is not supported by bigframes engine.")
+
+    if args.output:
+        raise ValueError("--output is not supported by bigframes engine.")
+
+    if args.to_parquet or args.to_arrow_ipc:
+        raise ValueError(
+            "--to_parquet and --to_arrow_ipc are not supported by bigframes engine."
+        )
+
+    try:
+        import bigframes.pandas as bpd
+    except ImportError as err:
+        raise ValueError("Bigframes package is not installed.") from err
 
     bpd.options.bigquery.project = context.project
     bpd.options.bigquery.credentials = context.credentials
@@ -531,25 +1479,94 @@ def _query_with_bigframes(query: str, params: List[Any], args: Any):
 
 
 def _query_with_pandas(query: str, params: List[Any], args: Any):
-    bq_client, bqstorage_client = _create_clients(args)
+    if args.run_async and (args.dry_run or args.graph):
+        raise ValueError("--async cannot be used with --dry_run or --graph.")
+    if args.stream and (
+        args.dry_run or args.graph or args.run_async or args.use_geodataframe
+    ):
+        raise ValueError(
+            "--stream cannot be used with --dry_run, --graph, --async or "
+            "--use_geodataframe."
+        )
+    if args.stream_prefetch is not None and args.stream_prefetch < 1:
+        raise ValueError("--stream_prefetch must be a positive integer.")
+    _validate_export_args(args)
+    if _output_format(args) != "pandas" and (args.use_geodataframe or args.graph):
+        raise ValueError(
+            "--use_geodataframe and --graph require the 'pandas' output format."
+        )
+    _validate_dtype_args(args)
+    _memory_budget(args)
+
+    with stats.timed("create_clients"):
+        bq_client, bqstorage_client = _create_clients(args)
+    run_stats = stats.current()
+    if run_stats is not None:
+        run_stats.project = getattr(bq_client, "project", None)
+        run_stats.location = getattr(bq_client, "location", None)
+    # Streams close the clients themselves, once they are consumed.
+    close_transports = not context.reuse_clients and not args.stream
     try:
-        return _make_bq_query(
+        result = _make_bq_query(
             query,
             args=args,
             params=params,
             bq_client=bq_client,
-            bqstorage_client=bqstorage_client,
+            bqstorage_client=_tune_read_sessions(bqstorage_client, args),
         )
+        if close_transports and args.stream:
+            # The memory budget policy switched to streaming the results.
+            close_transports = False
+        if close_transports and isinstance(result, QueryHandle):
+            # The clients are still needed to download the results, or to
+            # stream them if the memory budget policy switched to streaming.
+            result.add_done_callback(
+                lambda _: args.stream or _close_transports(bq_client, bqstorage_client)
+            )
+            close_transports = False
+        return result
     finally:
-        _close_transports(bq_client, bqstorage_client)
+        if close_transports:
+            _close_transports(bq_client, bqstorage_client)
 
 
-def _create_clients(args: Any) -> Tuple[bigquery.Client, Any]:
-    bq_client = core.create_bq_client(
-        project=args.project,
-        bigquery_api_endpoint=args.bigquery_api_endpoint,
-        location=args.location,
+def _tune_read_sessions(bqstorage_client: Any, args: Any) -> Any:
+    """Applies the read session options of the cell and the context to the
+    BigQuery Storage API client.
+    """
+
+    def option(value, default):
+        return value if value is not None else default
+
+    options = read_session.ReadSessionOptions(
+        max_stream_count=option(
+            args.max_stream_count, context.bqstorage_max_stream_count
+        ),
+        preserve_order=option(args.preserve_order, context.bqstorage_preserve_order),
+        compression=option(args.bqstorage_compression, context.bqstorage_compression),
     )
+    if options.max_stream_count is not None and options.max_stream_count < 0:
+        raise ValueError("--max_stream_count must be a non-negative integer.")
+    if options.compression not in (None,) + read_session.COMPRESSIONS:
+        raise ValueError(
+            f"Invalid BigQuery Storage API compression: {options.compression}."
+        )
+    return read_session.tune_read_client(bqstorage_client, options)
+
+
+def _create_clients(args: Any) -> Tuple[bigquery.Client, Any]:
+    if context.reuse_clients:
+        bq_client = client_pool.get_bq_client(
+            project=args.project,
+            bigquery_api_endpoint=args.bigquery_api_endpoint,
+            location=args.location,
+        )
+    else:
+        bq_client = core.create_bq_client(
+            project=args.project,
+            bigquery_api_endpoint=args.bigquery_api_endpoint,
+            location=args.location,
+        )
 
     # Check and instantiate bq storage client
     if args.use_bqstorage_api is not None:
@@ -558,7 +1575,7 @@ def _create_clients(args: Any) -> Tuple[bigquery.Client, Any]:
             "Storage API is already used by default.",
             category=DeprecationWarning,
         )
-    use_bqstorage_api = not args.use_rest_api and (bigquery_storage is not None)
+    use_bqstorage_api = not args.use_rest_api and _is_bigquery_storage_installed()
 
     if not use_bqstorage_api:
         return bq_client, None
@@ -570,14 +1587,29 @@ def _create_clients(args: Any) -> Tuple[bigquery.Client, Any]:
         else:
             bqstorage_client_options.api_endpoint = args.bqstorage_api_endpoint
 
-    bqstorage_client = _make_bqstorage_client(
-        bq_client,
-        bqstorage_client_options,
-    )
+    if context.reuse_clients:
+        bqstorage_client = client_pool.get_bqstorage_client(
+            bq_client,
+            bqstorage_api_endpoint=args.bqstorage_api_endpoint,
+            factory=lambda: _make_bqstorage_client(bq_client, bqstorage_client_options),
+        )
+    else:
+        bqstorage_client = _make_bqstorage_client(
+            bq_client,
+            bqstorage_client_options,
+        )
 
     return bq_client, bqstorage_client
 
 
+def _is_bigquery_storage_installed() -> bool:
+    """Checks if the BigQuery Storage client is available, without importing it."""
+    try:
+        return importlib.util.find_spec("google.cloud.bigquery_storage") is not None
+    except (ImportError, ValueError):
+        return False
+
+
 def _handle_result(result, args):
     """Determine the output of the cell, depending on options set.
 
@@ -589,18 +1621,21 @@ def _handle_result(result, args):
 
     Finally, there is no variable to save to, so just show the output.
     """
-    if args.destination_var:
-        get_ipython().push({args.destination_var: result})
-        return None
+    with stats.timed("store"):
+        if args.destination_var:
+            get_ipython().push({args.destination_var: result})
+            return None
 
-    if context.default_variable:
-        # If a default variable is set, save the result _and_ show the results.
-        get_ipython().push({context.default_variable: result})
+        if context.default_variable:
+            # If a default variable is set, save the result _and_ show the results.
+            get_ipython().push({context.default_variable: result})
 
-    return result
+        return result
 
 
 def _colab_query_callback(query: str, params: str):
+    from bigquery_magics import graph_server
+
     return IPython.core.display.JSON(
         graph_server.convert_graph_params(json.loads(params))
     )
@@ -623,6 +1658,8 @@ def _colab_node_expansion_callback(request: dict, params_str: str):
             - The query results with nodes and edges
             - An error message if the request failed
     """
+    from bigquery_magics import graph_server
+
     return IPython.core.display.JSON(
         graph_server.execute_node_expansion(params_str, request)
     )
@@ -658,6 +1695,10 @@ def _get_graph_name(query_text: str):
 def _get_graph_schema(
     bq_client: bigquery.client.Client, query_text: str, query_job: bigquery.job.QueryJob
 ):
+    from google.cloud import bigquery
+
+    from bigquery_magics import graph_server
+
     graph_name_result = _get_graph_name(query_text)
     if graph_name_result is None:
         return None
@@ -700,6 +1741,8 @@ def _add_graph_widget(
         )
         raise customized_error from err
 
+    from bigquery_magics import graph_server
+
     # In Jupyter, create an http server to be invoked from the Javascript to populate the
     # visualizer widget. In colab, we are not able to create an http server on a
     # background thread, so we use a special colab-specific api to register a callback,
@@ -800,23 +1843,97 @@ def _make_bq_query(
     bq_client: bigquery.Client,
     bqstorage_client: Any,
 ):
+    from google.cloud.bigquery.dataset import DatasetReference
+
     max_results = int(args.max_results) if args.max_results else None
-    geography_column = args.use_geodataframe
 
     # Any query that does not contain whitespace (aside from leading and trailing whitespace)
     # is assumed to be a table id
     if not re.search(r"\s", query):
+        if args.where:
+            if bqstorage_client is None:
+                raise ValueError(
+                    "--where requires the BigQuery Storage API, which is not "
+                    "used with --use_rest_api or without the "
+                    "google-cloud-bigquery-storage package."
+                )
+            if max_results and (args.stream or args.to_parquet or args.to_arrow_ipc):
+                raise ValueError(
+                    "--where and --max_results cannot be used with --stream, "
+                    "--to_parquet or --to_arrow_ipc."
+                )
+            bqstorage_client = read_session.restrict_rows(
+                bqstorage_client, _unquote(args.where)
+            )
+
+        check_budget = _memory_budget(args) is not None and not (
+            args.stream or args.to_parquet or args.to_arrow_ipc
+        )
+        try:
+            table_id = query
+            list_rows_kwargs = {}
+            if args.columns or check_budget:
+                table_id = bq_client.get_table(query)
+            if args.columns:
+                list_rows_kwargs["selected_fields"] = _selected_fields(
+                    table_id, args.columns
+                )
+        except Exception as ex:
+            _handle_error(ex, args.destination_var)
+            return
+
+        over_budget = None
+        if check_budget:
+            try:
+                over_budget = _check_memory_budget(
+                    args,
+                    table_id.schema,
+                    table_id.num_rows,
+                    table_id.num_bytes,
+                    selected_fields=list_rows_kwargs.get("selected_fields"),
+                )
+            except memory_budget.MemoryBudgetExceededError as ex:
+                _handle_error(ex, args.destination_var)
+                return
+            max_results = int(args.max_results) if args.max_results else None
+
+        limit_rows = _limit_rows_with_bqstorage(args, bqstorage_client)
         try:
-            rows = bq_client.list_rows(query, max_results=max_results)
+            rows = bq_client.list_rows(
+                table_id,
+                max_results=None if limit_rows else max_results,
+                **list_rows_kwargs,
+            )
         except Exception as ex:
             _handle_error(ex, args.destination_var)
             return
 
-        result = rows.to_dataframe(
-            bqstorage_client=bqstorage_client,
+        if args.stream:
+            return _handle_result(
+                _stream_rows(rows, args, bq_client, bqstorage_client), args
+            )
+        if args.to_parquet or args.to_arrow_ipc:
+            return _export_rows(rows, args, bqstorage_client)
+        if over_budget == "spill":
+            return _handle_result(_spill_rows(rows, args, bqstorage_client), args)
+
+        table_bqstorage_client = bqstorage_client
+        if limit_rows:
+            table_bqstorage_client = read_session.limit_rows(
+                bqstorage_client, max_results
+            )
+        result = _convert_rows(
+            rows,
+            args,
+            bqstorage_client=table_bqstorage_client,
             create_bqstorage_client=False,
         )
-        return _handle_result(result, args)
+        if limit_rows:
+            result = _head(result, max_results)
+        return _handle_result(_optimize_dtypes(result, args), args)
+
+    if args.columns or args.where:
+        raise ValueError("--columns and --where can only be used with a table ID.")
 
     job_config = _create_job_config(args, params)
     if args.destination_table:
@@ -834,8 +1951,62 @@ def _make_bq_query(
         job_config.write_disposition = "WRITE_TRUNCATE"
         _create_dataset_if_necessary(bq_client, dataset_id)
 
+    cache_key = _result_cache_key(query, job_config, bq_client, args)
+    if cache_key is not None and not args.refresh:
+        cached = _get_cached_result(cache_key, bq_client, args)
+        if cached is not None:
+            result, info = cached
+            if args.verbose:
+                print(f"Using cached results of job ID {info.job_id}")
+            return _handle_result(result, args)
+
+        try:
+            cached = _read_destination_table(
+                cache_key, bq_client, bqstorage_client, args
+            )
+        except Exception as ex:
+            _handle_error(ex, args.destination_var)
+            return
+        if cached is not None:
+            result, info = cached
+            _cache_result(cache_key, result, info, args)
+            return _handle_result(result, args)
+
+    if args.run_async:
+        try:
+            return _run_query_async(
+                bq_client, query, args, bqstorage_client, job_config=job_config
+            )
+        except Exception as ex:
+            _handle_error(ex, args.destination_var)
+            return
+
+    # Dry runs and graph visualization need the query job, so they always
+    # take the full job path, as do versions of google-cloud-bigquery that
+    # cannot make job creation optional.
+    use_query_and_wait = (
+        (args.use_query_and_wait or context.use_query_and_wait)
+        and not args.dry_run
+        and not args.graph
+        and hasattr(bq_client, "query_and_wait")
+        and hasattr(bq_client, "default_job_creation_mode")
+    )
+
+    # Results capped with --max_results are read with the BigQuery Storage
+    # API too, if they are large enough. The download stops early instead.
+    limit_rows = _limit_rows_with_bqstorage(args, bqstorage_client)
     try:
-        query_job = _run_query(bq_client, query, job_config=job_config)
+        if use_query_and_wait:
+            query_job = None
+            rows = _run_query_and_wait(
+                bq_client,
+                query,
+                job_config=job_config,
+                max_results=None if limit_rows else max_results,
+            )
+        else:
+            query_job = _run_query(bq_client, query, job_config=job_config)
+            rows = None
     except Exception as ex:
         _handle_error(ex, args.destination_var)
         return
@@ -858,28 +2029,69 @@ def _make_bq_query(
             )
             return query_job
 
-    progress_bar = context.progress_bar_type or args.progress_bar_type
-    dataframe_kwargs = {
-        "bqstorage_client": bqstorage_client,
-        "create_bqstorage_client": False,
-        "progress_bar_type": progress_bar,
-    }
-    if max_results:
-        dataframe_kwargs["bqstorage_client"] = None
+    over_budget = None
+    if _memory_budget(args) is not None and not (
+        args.stream or args.to_parquet or args.to_arrow_ipc
+    ):
+        try:
+            over_budget = _check_query_memory_budget(bq_client, query_job, rows, args)
+        except Exception as ex:
+            if query_job is not None and not hasattr(ex, "query_job"):
+                # Store the job in the destination variable, as for query
+                # errors.
+                ex.query_job = query_job
+            _handle_error(ex, args.destination_var)
+            return
+        if over_budget == "sample":
+            # The results are capped to fewer rows than requested.
+            cache_key = None
+            max_results = int(args.max_results)
+            limit_rows = _limit_rows_with_bqstorage(args, bqstorage_client)
+            if query_job is None and not limit_rows:
+                rows.max_results = max_results
+
+    if args.stream:
+        if query_job is not None:
+            rows = query_job.result(max_results=max_results)
+        return _handle_result(
+            _stream_rows(rows, args, bq_client, bqstorage_client), args
+        )
+    if args.to_parquet or args.to_arrow_ipc:
+        if query_job is not None:
+            rows = query_job.result(max_results=max_results)
+        return _export_rows(rows, args, bqstorage_client)
+    if over_budget == "spill":
+        if query_job is not None:
+            rows = query_job.result(max_results=max_results)
+        return _handle_result(_spill_rows(rows, args, bqstorage_client), args)
 
-    result = query_job
-    if max_results:
-        result = result.result(max_results=max_results)
+    if query_job is not None:
+        rows = query_job
+        limit_rows = _limit_rows_with_bqstorage(args, bqstorage_client, query_job)
+        if max_results and not limit_rows:
+            rows = query_job.result(max_results=max_results)
 
-    if geography_column:
-        result = result.to_geodataframe(
-            geography_column=geography_column, **dataframe_kwargs
-        )
-    else:
-        result = result.to_dataframe(**dataframe_kwargs)
+    progress_bar = context.progress_bar_type or args.progress_bar_type
+    result = _download_rows(
+        rows, args, bqstorage_client, progress_bar, limit_rows=limit_rows
+    )
+
+    if (
+        cache_key is not None
+        and query_job is not None
+        and is_cacheable(query, query_job)
+    ):
+        info = ResultInfo.from_query_job(query_job)
+        _cache_result(cache_key, result, info, args)
+        if is_anonymous_table(query_job.destination):
+            destination_tables.put(cache_key, str(query_job.destination), info)
 
     if args.graph and _supports_graph_widget(result):
-        if _add_graph_widget(bq_client, result, query, query_job, args):
+        with stats.timed("graph"):
+            added_graph_widget = _add_graph_widget(
+                bq_client, result, query, query_job, args
+            )
+        if added_graph_widget:
             # Invoke _handle_result() in case the result is saved to a variable,
             # but return None to suppress the default table view, which is redundant
             # with the table view in the graph visualizer.
@@ -888,6 +2100,664 @@ def _make_bq_query(
     return _handle_result(result, args)
 
 
+def _result_cache_key(
+    query: str, job_config: QueryJobConfig, bq_client: bigquery.Client, args: Any
+) -> Optional[str]:
+    """Returns the key of the query results in the result cache, or None if
+    the results must not be cached.
+    """
+    if (
+        not context.use_client_cache
+        or args.no_client_cache
+        or args.dry_run
+        or args.graph
+        or args.run_async
+        or args.stream
+        or args.to_parquet
+        or args.to_arrow_ipc
+        or args.destination_table
+    ):
+        return None
+
+    default_job_config = bq_client.default_query_job_config
+    if default_job_config is not None:
+        job_config = job_config._fill_from_default(default_job_config)
+    # Respect requests for fresh results from BigQuery, too.
+    if job_config.use_query_cache is False:
+        return None
+
+    return query_fingerprint(
+        query,
+        job_config,
+        project=bq_client.project,
+        location=bq_client.location,
+        credentials=context.credentials,
+        max_results=args.max_results,
+        geography_column=args.use_geodataframe,
+        output=_output_format(args),
+        dtype_backend=_dtype_backend(args),
+        optimize_dtypes=_should_optimize_dtypes(args),
+    )
+
+
+def _get_cached_result(key: str, bq_client: bigquery.Client, args: Any):
+    """Looks up query results in the in-memory cache, then in the disk cache.
+
+    Returns:
+        Optional[Tuple[pandas.DataFrame, bigquery_magics.result_cache.ResultInfo]]:
+            The cached results and the job that produced them, if any.
+    """
+    cached = result_cache.get(key, bq_client)
+    if cached is not None or args.use_geodataframe:
+        return cached
+
+    cached = disk_cache.get(key, bq_client)
+    if cached is not None:
+        result, info = cached
+        output_format = _output_format(args)
+        if output_format == "polars":
+            # The disk cache stores polars DataFrames as Arrow tables.
+            result = _from_arrow(result, output_format)
+            cached = result, info
+        result_cache.put(key, result, info)
+    return cached
+
+
+def _read_destination_table(
+    key: str, bq_client: bigquery.Client, bqstorage_client: Any, args: Any
+):
+    """Reads the results of a previous run of the query from the anonymous
+    destination table of its job, without running a new job.
+
+    Returns:
+        Optional[Tuple[pandas.DataFrame, bigquery_magics.result_cache.ResultInfo]]:
+            The query results and the job that produced them, or None if
+            there is no usable destination table.
+    """
+    remembered = destination_tables.get(key, bq_client)
+    if remembered is None:
+        return None
+    destination, info = remembered
+
+    if args.verbose:
+        print(f"Reading the results of job ID {info.job_id} from {destination}")
+
+    max_results = int(args.max_results) if args.max_results else None
+    limit_rows = _limit_rows_with_bqstorage(args, bqstorage_client)
+    progress_bar = context.progress_bar_type or args.progress_bar_type
+    from google.api_core.exceptions import Forbidden, NotFound
+
+    try:
+        # Fetching the table first gives list_rows() the schema, and fails
+        # fast if the table has expired.
+        destination_table = bq_client.get_table(destination)
+        if expires_soon(destination_table):
+            destination_tables.discard(key)
+            return None
+        if _estimate_over_budget(
+            args,
+            destination_table.schema,
+            destination_table.num_rows,
+            destination_table.num_bytes,
+        ):
+            # Run the query again, applying the memory budget policy to its
+            # results. They likely come from the BigQuery cache.
+            return None
+        rows = bq_client.list_rows(
+            destination_table, max_results=None if limit_rows else max_results
+        )
+        result = _download_rows(
+            rows, args, bqstorage_client, progress_bar, limit_rows=limit_rows
+        )
+    except (NotFound, Forbidden) as ex:
+        # The table expired or can no longer be read. Run the query again
+        # instead.
+        if args.verbose:
+            print(f"Could not read the results from {destination}: {ex}")
+        destination_tables.discard(key)
+        return None
+    return result, info
+
+
+def _cache_result(key: str, result: Any, info: ResultInfo, args: Any):
+    """Stores query results in the in-memory cache and the disk cache."""
+    result_cache.put(key, result, info)
+
+    # GeoDataFrames do not round-trip through Arrow files.
+    if args.use_geodataframe:
+        return
+    try:
+        disk_cache.put(key, result, info)
+    except Exception as ex:
+        warnings.warn(f"Could not write the query results to the disk cache: {ex}")
+
+
+def _stream_rows(rows, args, bq_client, bqstorage_client) -> ResultStream:
+    """Returns an iterator over the query results in chunks, in the format
+    requested with ``--stream``.
+
+    Args:
+        rows (google.cloud.bigquery.table.RowIterator):
+            The query results.
+        args (Any):
+            The parsed magic arguments.
+        bq_client (google.cloud.bigquery.client.Client):
+            The client the results are downloaded with.
+        bqstorage_client (Optional[google.cloud.bigquery_storage.BigQueryReadClient]):
+            Client to download the results with, if any.
+    """
+    iterable_kwargs = {"bqstorage_client": bqstorage_client}
+    prefetch = (
+        args.stream_prefetch
+        if args.stream_prefetch is not None
+        else context.stream_prefetch
+    )
+    if prefetch is not None:
+        iterable_kwargs["max_queue_size"] = prefetch
+
+    if args.stream == "pandas":
+        chunks = rows.to_dataframe_iterable(**iterable_kwargs)
+    else:
+        chunks = rows.to_arrow_iterable(**iterable_kwargs)
+
+    on_close = None
+    if not context.reuse_clients:
+        on_close = functools.partial(_close_transports, bq_client, bqstorage_client)
+    return ResultStream(chunks, total_rows=rows.total_rows, on_close=on_close)
+
+
+def _validate_export_args(args: Any):
+    if not (args.to_parquet or args.to_arrow_ipc):
+        if args.export_compression or args.row_group_size is not None:
+            raise ValueError(
+                "--export_compression and --row_group_size require --to_parquet "
+                "or --to_arrow_ipc."
+            )
+        return
+
+    if args.to_parquet and args.to_arrow_ipc:
+        raise ValueError("--to_parquet cannot be used with --to_arrow_ipc.")
+    if (
+        args.dry_run
+        or args.graph
+        or args.run_async
+        or args.stream
+        or args.use_geodataframe
+    ):
+        raise ValueError(
+            "--to_parquet and --to_arrow_ipc cannot be used with --dry_run, "
+            "--graph, --async, --stream or --use_geodataframe."
+        )
+
+    if args.to_parquet:
+        compressions = export.PARQUET_COMPRESSIONS
+    else:
+        compressions = export.ARROW_IPC_COMPRESSIONS
+        if args.row_group_size is not None:
+            raise ValueError("--row_group_size requires --to_parquet.")
+    if args.export_compression and args.export_compression not in compressions:
+        raise ValueError(
+            f"Invalid --export_compression: {args.export_compression}. "
+            f"Expected one of: {', '.join(compressions)}."
+        )
+    if args.row_group_size is not None and args.row_group_size < 1:
+        raise ValueError("--row_group_size must be a positive integer.")
+
+
+def _export_rows(rows, args, bqstorage_client):
+    """Writes the query results to the file requested with ``--to_parquet``
+    or ``--to_arrow_ipc``, one record batch at a time.
+
+    Args:
+        rows (google.cloud.bigquery.table.RowIterator):
+            The query results.
+        args (Any):
+            The parsed magic arguments.
+        bqstorage_client (Optional[google.cloud.bigquery_storage.BigQueryReadClient]):
+            Client to download the results with, if any.
+    """
+    batches = rows.to_arrow_iterable(bqstorage_client=bqstorage_client)
+
+    def empty_schema():
+        return rows.to_arrow(create_bqstorage_client=False).schema
+
+    if args.to_parquet:
+        path = args.to_parquet
+        num_rows = export.write_parquet(
+            batches,
+            path,
+            empty_schema=empty_schema,
+            compression=args.export_compression,
+            row_group_size=args.row_group_size,
+        )
+    else:
+        path = args.to_arrow_ipc
+        num_rows = export.write_arrow_ipc(
+            batches,
+            path,
+            empty_schema=empty_schema,
+            compression=args.export_compression,
+        )
+
+    print(f"Wrote {num_rows} rows to {path}")
+
+
+def _memory_budget(args: Any) -> Optional[int]:
+    """Returns the memory budget of the cell, in bytes, if any."""
+    budget = args.memory_budget or context.memory_budget
+    if budget is None:
+        return None
+    return memory_budget.parse_size(budget)
+
+
+def _check_query_memory_budget(
+    bq_client: bigquery.Client, query_job: Any, rows: Any, args: Any
+) -> Optional[str]:
+    """Checks the estimated size of query results against the memory budget,
+    from their destination table or, without a job, from the first page of
+    results.
+    """
+    if query_job is None:
+        return _check_memory_budget(args, rows.schema, rows.total_rows)
+    if query_job.destination is None:
+        # Scripts have no destination table to estimate the results from.
+        return None
+    destination = bq_client.get_table(query_job.destination)
+    return _check_memory_budget(
+        args, destination.schema, destination.num_rows, destination.num_bytes
+    )
+
+
+def _estimate_over_budget(
+    args: Any,
+    schema: Any,
+    num_rows: Optional[int],
+    num_bytes: Optional[int] = None,
+    selected_fields: Optional[List[Any]] = None,
+) -> Optional[Tuple[int, int]]:
+    """Estimates the memory size of the results before downloading them.
+
+    Returns:
+        The estimated size and the memory budget, in bytes, if the results
+        do not fit in the budget, otherwise None.
+    """
+    budget = _memory_budget(args)
+    if budget is None or num_rows is None:
+        return None
+
+    max_results = int(args.max_results) if args.max_results else None
+    estimate = memory_budget.estimate_size(
+        schema,
+        num_rows,
+        num_bytes,
+        max_rows=max_results,
+        selected_fields=selected_fields,
+        python_objects=(
+            _output_format(args) == "pandas" and _dtype_backend(args) == "numpy"
+        ),
+    )
+    if estimate <= budget:
+        return None
+    return estimate, budget
+
+
+def _check_memory_budget(
+    args: Any,
+    schema: Any,
+    num_rows: Optional[int],
+    num_bytes: Optional[int] = None,
+    selected_fields: Optional[List[Any]] = None,
+) -> Optional[str]:
+    """Estimates the memory size of the results before downloading them,
+    and applies the memory budget policy if they do not fit.
+
+    With the "sample" policy, ``args.max_results`` is lowered to the number
+    of rows that fit, and with the "stream" policy, ``args.stream`` is set.
+
+    Returns:
+        The policy applied, or None if the results fit in the budget.
+
+    Raises:
+        bigquery_magics.memory_budget.MemoryBudgetExceededError:
+            If the results do not fit and the policy is "error".
+    """
+    over_budget = _estimate_over_budget(
+        args, schema, num_rows, num_bytes, selected_fields=selected_fields
+    )
+    if over_budget is None:
+        return None
+    estimate, budget = over_budget
+    max_results = int(args.max_results) if args.max_results else None
+
+    from bigquery_magics.dtypes import format_bytes
+
+    message = (
+        f"The results are estimated to take {format_bytes(estimate)} of "
+        f"memory, more than the budget of {format_bytes(budget)}"
+    )
+    policy = args.memory_budget_policy or context.memory_budget_policy
+    if policy == "error":
+        raise memory_budget.MemoryBudgetExceededError(
+            f"{message}. Select fewer rows or columns, or set "
+            "--memory_budget_policy to sample, stream or spill the results."
+        )
+
+    if policy == "sample":
+        num_rows = min(num_rows, max_results) if max_results else num_rows
+        args.max_results = str(
+            max(1, memory_budget.rows_within(budget, estimate, num_rows))
+        )
+        _print_message(
+            f"{message}. Downloading the first {args.max_results} rows only."
+        )
+    elif policy == "stream":
+        args.stream = "arrow"
+        _print_message(f"{message}. Returning a stream of record batches instead.")
+    else:
+        _print_message(f"{message}. Spilling them to a temporary file instead.")
+    return policy
+
+
+def _spill_rows(rows, args, bqstorage_client):
+    """Writes the query results to a temporary Arrow IPC file, one record
+    batch at a time, and returns them memory-mapped from that file, so that
+    the operating system pages them in from disk as they are used.
+
+    Results in the "pandas" output format are returned as a
+    :class:`pyarrow.Table`, as converting them would load them in memory.
+    """
+    import pyarrow
+    import pyarrow.ipc
+
+    fd, path = tempfile.mkstemp(prefix="bigquery_magics_", suffix=".arrow")
+    os.close(fd)
+    with stats.timed("download"):
+        export.write_arrow_ipc(
+            rows.to_arrow_iterable(bqstorage_client=bqstorage_client),
+            path,
+            empty_schema=lambda: rows.to_arrow(create_bqstorage_client=False).schema,
+        )
+    table = pyarrow.ipc.open_file(pyarrow.memory_map(path)).read_all()
+    run_stats = stats.current()
+    if run_stats is not None:
+        run_stats.record_result(table)
+    try:
+        # The mapping keeps the data available until the table is freed.
+        os.unlink(path)
+    except OSError:
+        # Mapped files cannot be removed on Windows.
+        pass
+    return _from_arrow(table, _output_format(args))
+
+
+def _output_format(args: Any) -> str:
+    return args.output or context.output_format
+
+
+def _from_arrow(table: Any, output_format: str) -> Any:
+    """Converts a :class:`pyarrow.Table` to the requested output format,
+    other than pandas.
+    """
+    if output_format != "polars":
+        return table
+
+    try:
+        import polars
+    except ImportError as err:
+        customized_error = ImportError(
+            "Use of --output polars requires the polars package to be installed. Install it with `pip install 'bigquery-magics[polars]'`."
+        )
+        raise customized_error from err
+
+    # Chunks of the table are used as is, without copying them.
+    return polars.from_arrow(table, rechunk=False)
+
+
+def _dtype_backend(args: Any) -> str:
+    return args.dtype_backend or context.dtype_backend or "numpy"
+
+
+def _should_optimize_dtypes(args: Any) -> bool:
+    return bool(args.optimize_dtypes or context.optimize_dtypes)
+
+
+def _validate_dtype_args(args: Any):
+    if _dtype_backend(args) == "numpy" and not _should_optimize_dtypes(args):
+        return
+    if _output_format(args) != "pandas":
+        raise ValueError(
+            "--dtype_backend and --optimize_dtypes require the 'pandas' output "
+            "format."
+        )
+    if args.use_geodataframe and _dtype_backend(args) == "pyarrow":
+        raise ValueError(
+            "--dtype_backend pyarrow cannot be used with --use_geodataframe."
+        )
+
+
+def _optimize_dtypes(result: Any, args: Any) -> Any:
+    """Converts the columns of a DataFrame to smaller dtypes if requested, and
+    prints the memory saved.
+    """
+    if not _should_optimize_dtypes(args) or not hasattr(result, "memory_usage"):
+        return result
+
+    from bigquery_magics import dtypes
+
+    with stats.timed("convert"):
+        result, before, after = dtypes.optimize(result)
+    _print_message(
+        f"Optimized dtypes: {dtypes.format_bytes(before)} -> "
+        f"{dtypes.format_bytes(after)} ({dtypes.format_bytes(before - after)} saved)"
+    )
+    return result
+
+
+def _limit_rows_with_bqstorage(
+    args: Any, bqstorage_client: Any, query_job: Any = None
+) -> bool:
+    """Whether to download the first ``--max_results`` rows with the BigQuery
+    Storage API, stopping once enough rows were read, rather than with the
+    REST API.
+
+    The client library only pages through results capped with max_results
+    with the REST API, so the results must be requested without a cap.
+    """
+    if (
+        bqstorage_client is None
+        or not args.max_results
+        # Filtered rows can only be read with the BigQuery Storage API.
+        or (int(args.max_results) < _MIN_BQSTORAGE_MAX_RESULTS and not args.where)
+        or args.stream
+        or args.to_parquet
+        or args.to_arrow_ipc
+    ):
+        return False
+    # Without a destination table, such as for some scripts, the client
+    # library would page through all the results with the REST API.
+    return query_job is None or query_job.destination is not None
+
+
+def _unquote(value: str) -> str:
+    """Removes the quotes around an option value containing whitespace, which
+    the argument parser keeps.
+    """
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+        inner = value[1:-1]
+        if value[0] not in inner.replace("\\" + value[0], ""):
+            return inner.replace("\\" + value[0], value[0])
+    return value
+
+
+def _selected_fields(table: Any, columns: str) -> List[Any]:
+    """Returns the schema fields of the comma-separated ``columns`` of a
+    table, in the order they are listed.
+    """
+    fields = {field.name.lower(): field for field in table.schema}
+    selected_fields = []
+    for column in columns.split(","):
+        column = column.strip()
+        if not column:
+            continue
+        field = fields.get(column.lower())
+        if field is None:
+            raise ValueError(f"Unknown column in --columns: {column}.")
+        selected_fields.append(field)
+    return selected_fields
+
+
+def _head(result: Any, max_results: int) -> Any:
+    """Returns the first ``max_results`` rows of downloaded results."""
+    if len(result) <= max_results:
+        return result
+    if hasattr(result, "iloc"):
+        # Copy the rows, so that the DataFrame is not a view of a larger one.
+        return result.iloc[:max_results].copy()
+    # pyarrow.Table and polars.DataFrame slices share the original memory.
+    return result.slice(0, max_results)
+
+
+def _download_rows(
+    rows, args, bqstorage_client, progress_bar_type, limit_rows: bool = False
+):
+    """Downloads query results in the requested output format: a DataFrame, a
+    GeoDataFrame if ``--use_geodataframe`` is set, a pyarrow Table or a
+    polars DataFrame.
+
+    Args:
+        rows (Union[google.cloud.bigquery.job.QueryJob, google.cloud.bigquery.table.RowIterator]):
+            The query results.
+        args (Any):
+            The parsed magic arguments.
+        bqstorage_client (Optional[google.cloud.bigquery_storage.BigQueryReadClient]):
+            Client to download the results with, if any.
+        progress_bar_type (Optional[str]):
+            Type of progress bar to display while downloading.
+        limit_rows (bool):
+            If True, ``rows`` are not capped to ``--max_results`` rows, and
+            the download is stopped early with the BigQuery Storage API
+            instead.
+    """
+    dataframe_kwargs = {
+        "bqstorage_client": bqstorage_client,
+        "create_bqstorage_client": False,
+        "progress_bar_type": progress_bar_type,
+    }
+    max_results = int(args.max_results) if args.max_results else None
+    if limit_rows:
+        dataframe_kwargs["bqstorage_client"] = read_session.limit_rows(
+            bqstorage_client, max_results
+        )
+    elif max_results:
+        dataframe_kwargs["bqstorage_client"] = None
+
+    result = _convert_rows(rows, args, **dataframe_kwargs)
+    if limit_rows:
+        result = _head(result, max_results)
+    return _optimize_dtypes(result, args)
+
+
+@contextlib.contextmanager
+def _timed_dataframe_download(rows):
+    """Times a ``to_dataframe`` call on ``rows`` as the ``download`` phase
+    until the client library has downloaded the results as Arrow data, and
+    the conversion of that data to pandas as the ``convert`` phase.
+
+    The client library downloads with ``to_arrow`` and then converts to its
+    default dtypes, so the switch happens when ``to_arrow`` returns. If it
+    is never called, for example for empty results, the whole call counts
+    as ``download``.
+    """
+    with contextlib.ExitStack() as timers:
+
+        def timed_to_arrow(to_arrow):
+            def wrapper(*args, **kwargs):
+                table = to_arrow(*args, **kwargs)
+                timers.close()
+                timers.enter_context(stats.timed("convert"))
+                return table
+
+            return wrapper
+
+        def timed_result(result):
+            def wrapper(*args, **kwargs):
+                row_iterator = result(*args, **kwargs)
+                timers.enter_context(
+                    _patched_method(row_iterator, "to_arrow", timed_to_arrow)
+                )
+                return row_iterator
+
+            return wrapper
+
+        timers.enter_context(stats.timed("download"))
+        if not hasattr(rows, "result"):
+            # A RowIterator downloads with its own to_arrow. A QueryJob
+            # creates a RowIterator with result() and downloads with it.
+            with _patched_method(rows, "to_arrow", timed_to_arrow):
+                yield
+        else:
+            with _patched_method(rows, "result", timed_result):
+                yield
+
+
+@contextlib.contextmanager
+def _patched_method(obj, name, wrap):
+    """Replaces the method ``name`` of the object ``obj`` with
+    ``wrap(method)`` in the ``with`` block.
+    """
+    missing = object()
+    previous = vars(obj).get(name, missing)
+    setattr(obj, name, wrap(getattr(obj, name)))
+    try:
+        yield
+    finally:
+        if previous is missing:
+            vars(obj).pop(name, None)
+        else:
+            vars(obj)[name] = previous
+
+
+def _convert_rows(rows, args, **dataframe_kwargs):
+    """Downloads ``rows`` and converts them to the requested output format
+    and dtypes.
+    """
+    output_format = _output_format(args)
+    run_stats = stats.current()
+    if output_format != "pandas" or (
+        _dtype_backend(args) == "pyarrow" and not args.use_geodataframe
+    ):
+        with stats.timed("download"):
+            table = rows.to_arrow(**dataframe_kwargs)
+        if run_stats is not None:
+            run_stats.record_result(table)
+
+        with stats.timed("convert"):
+            if output_format != "pandas":
+                return _from_arrow(table, output_format)
+            from bigquery_magics import dtypes
+
+            result = dtypes.arrow_to_pandas(table)
+        default = dtypes.estimate_default_memory_usage(table)
+        actual = dtypes.memory_usage(result)
+        _print_message(
+            f"pyarrow dtypes: ~{dtypes.format_bytes(default)} -> "
+            f"{dtypes.format_bytes(actual)} "
+            f"(~{dtypes.format_bytes(default - actual)} saved)"
+        )
+        return result
+
+    with _timed_dataframe_download(rows):
+        if args.use_geodataframe:
+            result = rows.to_geodataframe(
+                geography_column=args.use_geodataframe, **dataframe_kwargs
+            )
+        else:
+            result = rows.to_dataframe(**dataframe_kwargs)
+    if run_stats is not None:
+        run_stats.record_result(result)
+    return result
+
+
 def _validate_and_resolve_query(query: str, args: Any) -> str:
     # Check if query is given as a reference to a variable.
     if query.startswith("$"):
@@ -918,6 +2788,8 @@ def _validate_and_resolve_query(query: str, args: Any) -> str:
 
 
 def _create_job_config(args: Any, params: List[Any]) -> QueryJobConfig:
+    from google.cloud.bigquery.job import QueryJobConfig
+
     job_config = QueryJobConfig()
     job_config.query_parameters = params
     job_config.use_legacy_sql = args.use_legacy_sql
@@ -955,6 +2827,10 @@ def _make_bqstorage_client(client, client_options):
             is outdated.
         BigQuery Storage Client:
     """
+    from google.cloud.bigquery import exceptions
+
+    import bigquery_magics._versions_helpers
+
     try:
         bigquery_magics._versions_helpers.BQ_STORAGE_VERSIONS.try_import(
             raise_if_error=True
@@ -998,3 +2874,50 @@ def _close_transports(client, bqstorage_client):
     client.close()
     if bqstorage_client is not None:
         bqstorage_client._transport.grpc_channel.close()
+
+
+_WARM_UP_CHANNEL_TIMEOUT = 30.0
+
+warm_up_thread: threading.Thread = None
+
+
+def _warm_up():
+    """Resolve credentials and project, and create the default clients.
+
+    This does the work the first query would otherwise do on its critical
+    path. Errors are ignored, as they will surface again when a query
+    actually needs the failing resource.
+    """
+    try:
+        credentials = context.credentials
+        context.project
+
+        if not credentials.valid:
+            # The background refresh of default credentials may be fetching
+            # the first token already. Only one of them fetches it.
+            context._refresh_token(credentials, getattr(credentials, "token", None))
+
+        if not context.reuse_clients:
+            return
+
+        args = magic_arguments.parse_argstring(_cell_magic, "")
+        _, bqstorage_client = _create_clients(args)
+
+        if bqstorage_client is not None:
+            import grpc
+
+            grpc.channel_ready_future(bqstorage_client._transport.grpc_channel).result(
+                timeout=_WARM_UP_CHANNEL_TIMEOUT
+            )
+    except Exception:
+        pass
+
+
+def _start_warm_up() -> threading.Thread:
+    """Run :func:`_warm_up` on a background daemon thread."""
+    global warm_up_thread
+    warm_up_thread = threading.Thread(
+        target=_warm_up, name="bigquery-magics-warm-up", daemon=True
+    )
+    warm_up_thread.start()
+    return warm_up_thread
@@ -0,0 +1,177 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Session-scoped pool of BigQuery REST and BigQuery Storage API clients."""
+
+import atexit
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import weakref
+
+from bigquery_magics import core
+import bigquery_magics.config
+
+context = bigquery_magics.config.context
+
+
+def _close_bq_client(client):
+    client.close()
+
+
+def _close_bqstorage_client(bqstorage_client):
+    bqstorage_client._transport.grpc_channel.close()
+
+
+class ClientPool:
+    """Reuses clients across cells so that each query does not pay for a new
+    HTTP session, TLS handshake and gRPC channel.
+
+    Clients are keyed by project, API endpoint, location and the context
+    credentials. Clients of credentials other than the current context
+    credentials are evicted, as are the storage clients of evicted clients.
+    The whole pool is invalidated whenever one of the other context settings
+    used to construct a client changes. Evicted clients are not closed, as
+    cells started earlier, such as ``--async`` cells, may still be using
+    them. Their connections are closed once they are garbage collected.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._settings: Optional[Tuple] = None
+        # Maps a key to a (client, close function) tuple. Keys refer to the
+        # credentials, or to the BigQuery client of a storage client, with a
+        # weak reference: unlike an id(), it cannot match another object once
+        # the original is gone, and it does not keep the original alive.
+        self._clients: Dict[Hashable, Tuple[Any, Callable[[Any], None]]] = {}
+
+    @staticmethod
+    def _context_settings() -> Tuple:
+        # Clients copy the default query job configuration, so it is compared
+        # by content to notice changes made to it in place.
+        job_config = context.default_query_job_config
+        return (
+            repr(context.bigquery_client_options),
+            repr(context.bqstorage_client_options),
+            repr(job_config.to_api_repr()) if job_config is not None else None,
+            id(context._connection),
+        )
+
+    def _get_or_create(self, key, factory, close, credentials):
+        with self._lock:
+            settings = self._context_settings()
+            if settings != self._settings:
+                self._clients.clear()
+                self._settings = settings
+            self._evict_stale(credentials)
+
+            entry = self._clients.get(key)
+            if entry is None:
+                entry = (factory(), close)
+                self._clients[key] = entry
+            return entry[0]
+
+    def _evict_stale(self, credentials):
+        """Removes the clients of credentials other than ``credentials``,
+        and the storage clients of the removed clients, from the pool.
+        """
+        live_clients = set()
+        stale_keys = []
+        for key, (client, _) in self._clients.items():
+            # The key of a BigQuery client ends with a reference to its
+            # credentials and the key of a storage client starts with a
+            # reference to its BigQuery client, which is inserted first.
+            if key[0] == "bigquery":
+                if key[-1]() is credentials:
+                    live_clients.add(id(client))
+                    continue
+            elif id(key[1]()) in live_clients:
+                continue
+            stale_keys.append(key)
+        for key in stale_keys:
+            del self._clients[key]
+
+    def get_bq_client(
+        self, *, project: str, bigquery_api_endpoint: str, location: str
+    ) -> Any:
+        """Returns a pooled BigQuery client, creating it if necessary.
+
+        Args:
+            project: Project to use for api calls, None to obtain the project from the context.
+            bigquery_api_endpoint: Bigquery client endpoint.
+            location: Cloud region to use for api calls.
+
+        Returns:
+            google.cloud.bigquery.client.Client: The BigQuery client.
+        """
+        project = project or context.project
+        credentials = context.credentials
+        key = (
+            "bigquery",
+            project,
+            bigquery_api_endpoint,
+            location,
+            weakref.ref(credentials),
+        )
+        return self._get_or_create(
+            key,
+            lambda: core.create_bq_client(
+                project=project,
+                bigquery_api_endpoint=bigquery_api_endpoint,
+                location=location,
+            ),
+            _close_bq_client,
+            credentials,
+        )
+
+    def get_bqstorage_client(
+        self,
+        bq_client: Any,
+        *,
+        bqstorage_api_endpoint: Optional[str],
+        factory: Callable[[], Any],
+    ) -> Any:
+        """Returns a pooled BigQuery Storage client, creating it if necessary.
+
+        Args:
+            bq_client: The pooled BigQuery client the storage client belongs to.
+            bqstorage_api_endpoint: BigQuery Storage client endpoint.
+            factory: Called to create the storage client on a pool miss.
+
+        Returns:
+            google.cloud.bigquery_storage.BigQueryReadClient: The storage client.
+        """
+        key = ("bigquery_storage", weakref.ref(bq_client), bqstorage_api_endpoint)
+        return self._get_or_create(
+            key, factory, _close_bqstorage_client, context.credentials
+        )
+
+    def close(self):
+        """Closes the transports of all pooled clients and empties the pool."""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._settings = None
+
+        # Close storage clients before the REST clients they were created from.
+        for client, close in reversed(clients):
+            try:
+                close(client)
+            except Exception:
+                pass
+
+
+client_pool = ClientPool()
+
+
+atexit.register(client_pool.close)
@@ -13,19 +13,45 @@
 # limitations under the License.
 
 from dataclasses import dataclass
+import datetime
+import threading
 from typing import Optional
 
 import google.api_core.client_options as client_options
-import google.cloud.bigquery as bigquery
-import pydata_google_auth
 
 _SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
 
+# How long before the access token expires to refresh it in the background.
+_TOKEN_REFRESH_MARGIN = datetime.timedelta(minutes=5)
+
+# Lower bound between background refreshes, in case of short-lived tokens.
+_MIN_TOKEN_REFRESH_INTERVAL = 60.0
+
 
 def _get_default_credentials_with_project():
+    import pydata_google_auth
+
     return pydata_google_auth.default(scopes=_SCOPES, use_local_webserver=False)
 
 
+def _seconds_until_refresh(credentials) -> Optional[float]:
+    """Returns how long to wait before refreshing the credentials in the
+    background, or None if they do not need to be refreshed.
+    """
+    if getattr(credentials, "token", None) is None:
+        # No access token has been fetched yet.
+        return 0.0
+
+    expiry = getattr(credentials, "expiry", None)
+    if not isinstance(expiry, datetime.datetime):
+        # The token never expires.
+        return None
+
+    # Credentials use naive datetimes in UTC.
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return max((expiry - _TOKEN_REFRESH_MARGIN - now).total_seconds(), 0.0)
+
+
 @dataclass
 class Context(object):
     """Storage for objects to be used throughout an IPython notebook session.
@@ -36,8 +62,11 @@ class Context(object):
 
     _connection = None
 
-    default_query_job_config = bigquery.QueryJobConfig()
-    """google.cloud.bigquery.job.QueryJobConfig: Default job
+    _default_query_job_config = None
+
+    @property
+    def default_query_job_config(self):
+        """google.cloud.bigquery.job.QueryJobConfig: Default job
         configuration for queries.
 
         The context's :class:`~google.cloud.bigquery.job.QueryJobConfig` is
@@ -50,7 +79,17 @@ class Context(object):
 
             >>> from google.cloud.bigquery import magics
             >>> bigquery_magics.context.default_query_job_config.maximum_bytes_billed = 100000000
-    """
+        """
+        if self._default_query_job_config is None:
+            # Imported here, as google-cloud-bigquery is slow to import.
+            import google.cloud.bigquery as bigquery
+
+            self._default_query_job_config = bigquery.QueryJobConfig()
+        return self._default_query_job_config
+
+    @default_query_job_config.setter
+    def default_query_job_config(self, value):
+        self._default_query_job_config = value
 
     bigquery_client_options = client_options.ClientOptions()
     """google.api_core.client_options.ClientOptions: client options to be
@@ -88,6 +127,77 @@ class Context(object):
             >>> bigquery_magics.context.bqstorage_client_options = client_options
     """
 
+    bqstorage_max_stream_count = None
+    """Optional[int]: Maximum number of BigQuery Storage API streams to read
+        query results from in parallel. If 0, the server picks the number of
+        streams. If not set, the client library default is used. Can be
+        overridden per cell with the ``--max_stream_count`` option.
+
+        Example:
+            Reading results from at most 16 streams:
+
+            >>> from google.cloud.bigquery import magics
+            >>> bigquery_magics.context.bqstorage_max_stream_count = 16
+    """
+
+    bqstorage_preserve_order = None
+    """Optional[bool]: Whether to read query results from a single BigQuery
+        Storage API stream, so that rows arrive in order. If False, the
+        results of queries with an ORDER BY clause are read from several
+        streams too, and rows may arrive out of order. If not set, only the
+        results of such queries are read from a single stream. Can be
+        overridden per cell with the ``--preserve_order`` and
+        ``--no_preserve_order`` options.
+
+        Example:
+            Reading ordered results in parallel:
+
+            >>> from google.cloud.bigquery import magics
+            >>> bigquery_magics.context.bqstorage_preserve_order = False
+    """
+
+    bqstorage_compression = None
+    """Optional[str]: Compression of the Arrow record batches sent by the
+        BigQuery Storage API: "lz4", "zstd" or "none". If not set, the client
+        library default is used. Can be overridden per cell with the
+        ``--bqstorage_compression`` option.
+
+        Example:
+            Compressing downloads with ZSTD:
+
+            >>> from google.cloud.bigquery import magics
+            >>> bigquery_magics.context.bqstorage_compression = "zstd"
+    """
+
+    dtype_backend = None
+    """Optional[str]: Backing data of the columns of DataFrame results.
+        With "pyarrow", the downloaded Arrow table is converted to a
+        DataFrame with :class:`pandas.ArrowDtype` columns, such as
+        pyarrow-backed strings, without copying it. If not set, the client
+        library default NumPy dtypes are used. Can be overridden per cell
+        with the ``--dtype_backend`` option.
+
+        Example:
+            Using pyarrow-backed DataFrames:
+
+            >>> from google.cloud.bigquery import magics
+            >>> bigquery_magics.context.dtype_backend = "pyarrow"
+    """
+
+    optimize_dtypes = False
+    """bool: Whether to convert the columns of DataFrame results to smaller
+        dtypes, and report the memory saved. Low-cardinality string columns
+        become categoricals, other string columns pyarrow-backed strings, and
+        integer and float columns are downcast where all their values fit.
+        Can be enabled per cell with the ``--optimize_dtypes`` option.
+
+        Example:
+            Optimizing the dtypes of all results:
+
+            >>> from google.cloud.bigquery import magics
+            >>> bigquery_magics.context.optimize_dtypes = True
+    """
+
     progress_bar_type = "tqdm_notebook"
     """str: Default progress bar type to use to display progress bar while
         executing queries through IPython magics.
@@ -102,7 +212,365 @@ class Context(object):
             >>> bigquery_magics.context.progress_bar_type = "tqdm_notebook"
     """
 
+    use_query_and_wait = False
+    """bool: Whether to run queries with the stateless jobs.query API by
+        default.
+
+        BigQuery may then skip creating a job for short queries, and the first
+        page of results is returned with the query response, saving several
+        API round trips. Queries that take longer continue as regular query
+        jobs. The results of these queries are not stored in the result
+        cache, since the jobs.query response does not list the tables needed
+        to tell when they become stale. This can also be enabled per cell
+        with the ``--use_query_and_wait`` option.
+
+        Example:
+            Running all queries with jobs.query:
+
+            >>> from google.cloud.bigquery import magics
+            >>> bigquery_magics.context.use_query_and_wait = True
+    """
+
+    _output_format = "pandas"
+
+    @property
+    def output_format(self) -> str:
+        """Format of the query results returned by the ``%%bigquery`` magic,
+        either "pandas", "arrow" or "polars".
+
+        With "pandas", results are returned as a :class:`pandas.DataFrame`.
+        With "arrow", results are returned as the :class:`pyarrow.Table` they
+        are downloaded as, which saves the time and memory of converting them
+        to pandas. With "polars", results are returned as a
+        :class:`polars.DataFrame` sharing the memory of that table. Can be
+        overridden per cell with the ``--output`` option.
+
+        Example:
+            Returning pyarrow Tables by default:
+
+            >>> from google.cloud.bigquery import magics
+            >>> bigquery_magics.context.output_format = "arrow"
+        """
+        return self._output_format
+
+    @output_format.setter
+    def output_format(self, value: str):
+        if value not in ("pandas", "arrow", "polars"):
+            raise ValueError(
+                "output_format must be either 'pandas', 'arrow' or 'polars'"
+            )
+        self._output_format = value
+
+    memory_budget = None
+    """Optional[Union[int, str]]: Maximum estimated memory size of the
+        results downloaded by the ``%%bigquery`` magic, in bytes or as a size
+        such as ``"2GiB"``. Before downloading, the size of the results is
+        estimated from the size and schema of the table holding them, and
+        :attr:`memory_budget_policy` applies if the estimate is larger. If
+        not set, results are downloaded whatever their size. Can be
+        overridden per cell with the ``--memory_budget`` option.
+
+        Example:
+            Guarding against results larger than 2 GiB:
+
+            >>> from google.cloud.bigquery import magics
+            >>> bigquery_magics.context.memory_budget = "2GiB"
+    """
+
+    _memory_budget_policy = "error"
+
+    @property
+    def memory_budget_policy(self) -> str:
+        """What to do with results estimated to exceed the
+        :attr:`memory_budget`: "error", "sample", "stream" or "spill".
+
+        With "error", a
+        :class:`~bigquery_magics.memory_budget.MemoryBudgetExceededError` is
+        raised before anything is downloaded. With "sample", only as many
+        rows as are estimated to fit in the budget are downloaded; these are
+        the first rows read, not a random sample. With "stream", a
+        :class:`~bigquery_magics.result_stream.ResultStream` of
+        :class:`pyarrow.RecordBatch` is returned, as with ``--stream arrow``.
+        With "spill", the results are written to a temporary Arrow IPC file
+        and returned as a memory-mapped :class:`pyarrow.Table` (or a
+        :class:`polars.DataFrame` with the "polars" output format), which the
+        operating system pages in from disk as needed. Can be overridden per
+        cell with the ``--memory_budget_policy`` option.
+
+        Example:
+            Spilling large results to disk:
+
+            >>> from google.cloud.bigquery import magics
+            >>> bigquery_magics.context.memory_budget_policy = "spill"
+        """
+        return self._memory_budget_policy
+
+    @memory_budget_policy.setter
+    def memory_budget_policy(self, value: str):
+        if value not in ("error", "sample", "stream", "spill"):
+            raise ValueError(
+                "memory_budget_policy must be either 'error', 'sample', "
+                "'stream' or 'spill'"
+            )
+        self._memory_budget_policy = value
+
+    stream_prefetch = None
+    """Optional[int]: Maximum number of chunks that ``%%bigquery --stream``
+        downloads ahead of the one being processed. If not set, one chunk per
+        BigQuery Storage API read stream is buffered.
+
+        Example:
+            Buffering at most two chunks:
+
+            >>> from google.cloud.bigquery import magics
+            >>> bigquery_magics.context.stream_prefetch = 2
+    """
+
+    use_client_cache = True
+    """bool: Whether to keep the results of recent queries in memory and reuse
+        them when the same query is run again.
+
+        Results are reused only by the same account, only if none of the
+        tables the query read from were modified since, and only for
+        deterministic ``SELECT`` queries. Results that are no longer cached,
+        for example because they are too large, are read again from the
+        temporary destination table of the previous query job while it
+        exists, instead of running a new job.
+        The cache can be bypassed per cell with the ``--no_client_cache`` and
+        ``--refresh`` options, and its hit and miss counters are available
+        from ``bigquery_magics.result_cache.result_cache.stats()``.
+
+        Example:
+            Disabling the result cache:
+
+            >>> from google.cloud.bigquery import magics
+            >>> bigquery_magics.context.use_client_cache = False
+    """
+
+    client_cache_max_bytes = 512 * 1024 * 1024
+    """int: Maximum total memory footprint of the results in the in-memory
+        result cache, in bytes. The least recently used results are evicted
+        first.
+
+        Example:
+            Allowing up to 2 GiB of cached results:
+
+            >>> from google.cloud.bigquery import magics
+            >>> bigquery_magics.context.client_cache_max_bytes = 2 * 1024 ** 3
+    """
+
+    disk_cache_dir = None
+    """Optional[str]: Directory to keep query results in across kernel
+        restarts. Disabled if not set.
+
+        Results are stored as Arrow IPC files and follow the same rules as the
+        in-memory cache enabled by :attr:`use_client_cache`, which must be
+        enabled as well. Before submitting a query, the magics look for its
+        results in memory first, and then in this directory.
+
+        Example:
+            Keeping query results in a local directory:
+
+            >>> from google.cloud.bigquery import magics
+            >>> bigquery_magics.context.disk_cache_dir = "~/.cache/bigquery_magics"
+    """
+
+    disk_cache_max_bytes = 5 * 1024 * 1024 * 1024
+    """int: Maximum total size of the files in :attr:`disk_cache_dir`, in
+        bytes. The least recently used files are removed first.
+
+        Example:
+            Allowing up to 20 GiB of cached results on disk:
+
+            >>> from google.cloud.bigquery import magics
+            >>> bigquery_magics.context.disk_cache_max_bytes = 20 * 1024 ** 3
+    """
+
+    disk_cache_compression = "lz4"
+    """Optional[str]: Compression codec of the files in
+        :attr:`disk_cache_dir`, either ``"lz4"``, ``"zstd"``, or None to store
+        them uncompressed, which uses more disk space but lets them be read
+        back without copying.
+
+        Example:
+            Compressing cached results with Zstandard:
+
+            >>> from google.cloud.bigquery import magics
+            >>> bigquery_magics.context.disk_cache_compression = "zstd"
+    """
+
+    batch_max_concurrency = 8
+    """int: Default maximum number of queries that ``%%bigquery_batch`` runs
+        at the same time.
+
+        Example:
+            Running up to 16 queries at once:
+
+            >>> from google.cloud.bigquery import magics
+            >>> bigquery_magics.context.batch_max_concurrency = 16
+    """
+
+    reuse_clients = True
+    """bool: Whether to reuse BigQuery and BigQuery Storage API clients across
+        cells.
+
+        When enabled, clients are kept in a session-level pool keyed by
+        project, endpoint, location and credentials, and their connections are
+        closed when the kernel shuts down. When disabled, new clients are
+        created for every cell and closed once the cell finishes.
+
+        Example:
+            Creating new clients for every cell:
+
+            >>> from google.cloud.bigquery import magics
+            >>> bigquery_magics.context.reuse_clients = False
+    """
+
+    warm_up_on_load = False
+    """bool: Whether to prepare credentials and clients in the background when
+        the extension is loaded.
+
+        When enabled, ``%load_ext bigquery_magics`` resolves the context
+        credentials and project, refreshes the access token and, if
+        :attr:`reuse_clients` is set, opens the BigQuery and BigQuery Storage
+        API connections on a background thread, so that the first query does
+        not have to wait for them.
+
+        Example:
+            Warming up before loading the extension:
+
+            >>> import bigquery_magics
+            >>> bigquery_magics.context.warm_up_on_load = True
+            >>> %load_ext bigquery_magics
+    """
+
+    last_run_stats = None
+    """Optional[bigquery_magics.stats.RunStats]: Statistics about the most
+        recent cell run with the ``%%bigquery`` magic: the time spent in each
+        phase, the query job statistics and the size of the downloaded
+        results. Printed after the results with ``--verbose``.
+
+        Example:
+            Checking how many API requests the last query needed:
+
+            >>> bigquery_magics.context.last_run_stats.api_calls
+
+            Checking where the time of the last cell went:
+
+            >>> bigquery_magics.context.last_run_stats.timings
+    """
+
+    _stats_history_size = 100
+
+    @property
+    def stats_history_size(self) -> int:
+        """int: Maximum number of ``%%bigquery`` cells whose statistics are
+        kept for the ``%bigquery_stats`` magic. Once reached, the statistics
+        of the oldest cells are dropped.
+
+        Example:
+            Keeping the statistics of the last 1000 cells:
+
+            >>> from google.cloud.bigquery import magics
+            >>> bigquery_magics.context.stats_history_size = 1000
+        """
+        return self._stats_history_size
+
+    @stats_history_size.setter
+    def stats_history_size(self, value: int):
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            raise ValueError("stats_history_size must be a positive integer")
+        self._stats_history_size = value
+
     _credentials = None
+    _credentials_lock = threading.RLock()
+    _credentials_refresh_lock = threading.Lock()
+    _credentials_refresh_timer = None
+    # The credentials in use when the environment had no default project.
+    _credentials_without_default_project = None
+
+    def _resolve_default_credentials_and_project(self):
+        """Set the credentials and the project, whichever is missing, from a
+        single lookup of the environment defaults.
+
+        The lookup may hit the metadata server or gcloud configuration, so
+        concurrent callers wait for the lookup in progress instead of
+        starting another. If the environment has no default project, the
+        lookup is not repeated for the same credentials.
+        """
+        with self._credentials_lock:
+            if self._credentials is not None and (
+                self._project is not None
+                or self._credentials is self._credentials_without_default_project
+            ):
+                return
+
+            credentials, project = _get_default_credentials_with_project()
+            if self._credentials is None:
+                self._credentials = credentials
+                self._schedule_credentials_refresh(credentials)
+            if self._project is None:
+                self._project = project
+                if project is None:
+                    self._credentials_without_default_project = self._credentials
+
+    def _schedule_credentials_refresh(self, credentials, min_delay=0.0):
+        """Refresh the default credentials on a background thread before they
+        expire, so that queries do not wait for a token refresh.
+        """
+        delay = _seconds_until_refresh(credentials)
+        if delay is None:
+            return
+        delay = max(delay, min_delay)
+
+        with self._credentials_lock:
+            if self._credentials_refresh_timer is not None:
+                self._credentials_refresh_timer.cancel()
+            timer = threading.Timer(
+                delay,
+                self._refresh_credentials,
+                args=(credentials, getattr(credentials, "token", None)),
+            )
+            timer.daemon = True
+            self._credentials_refresh_timer = timer
+            timer.start()
+
+    def _refresh_token(self, credentials, stale_token):
+        """Fetch a new access token for ``credentials``, unless their token
+        is no longer ``stale_token``.
+
+        Refreshes are serialized, so that the background refresh and the
+        warm-up started when the extension is loaded do not both fetch a
+        token: once one of them replaced the stale token, the other does not
+        refresh again.
+        """
+        with self._credentials_refresh_lock:
+            if getattr(credentials, "token", None) is not stale_token:
+                # Already refreshed by another thread.
+                return
+
+            import google.auth.transport.requests
+
+            credentials.refresh(google.auth.transport.requests.Request())
+
+    def _refresh_credentials(self, credentials, stale_token):
+        if credentials is not self._credentials:
+            return
+
+        try:
+            self._refresh_token(credentials, stale_token)
+        except Exception:
+            # Leave it to the next request to refresh the credentials and
+            # report any errors.
+            return
+
+        with self._credentials_lock:
+            if credentials is self._credentials and (
+                getattr(credentials, "token", None) is not None
+            ):
+                self._schedule_credentials_refresh(
+                    credentials, min_delay=_MIN_TOKEN_REFRESH_INTERVAL
+                )
 
     @property
     def credentials(self):
@@ -132,12 +600,16 @@ class Context(object):
             /en/latest/user-guide.html#obtaining-credentials
         """
         if self._credentials is None:
-            self._credentials, _ = _get_default_credentials_with_project()
+            self._resolve_default_credentials_and_project()
         return self._credentials
 
     @credentials.setter
     def credentials(self, value):
-        self._credentials = value
+        with self._credentials_lock:
+            if self._credentials_refresh_timer is not None:
+                self._credentials_refresh_timer.cancel()
+                self._credentials_refresh_timer = None
+            self._credentials = value
 
     _default_variable: Optional[str] = None
 
@@ -172,7 +644,7 @@ class Context(object):
             >>> bigquery_magics.context.project = 'my-project'
         """
         if self._project is None:
-            _, self._project = _get_default_credentials_with_project()
+            self._resolve_default_credentials_and_project()
         return self._project
 
     @project.setter
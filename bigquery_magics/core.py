@@ -13,18 +13,18 @@
 # limitations under the License.
 
 import copy
+import functools
 
-from google.api_core import client_info
-from google.cloud import bigquery
 import IPython  # type: ignore
 
-from bigquery_magics import environment
+from bigquery_magics import environment, stats
 import bigquery_magics.config
 import bigquery_magics.version
 
 context = bigquery_magics.config.context
 
 
+@functools.lru_cache(maxsize=None)
 def _get_user_agent():
     identities = [
         f"ipython-{IPython.__version__}",
@@ -54,6 +54,9 @@ def create_bq_client(*, project: str, bigquery_api_endpoint: str, location: str)
     Returns:
         google.cloud.bigquery.client.Client: The BigQuery client.
     """
+    from google.api_core import client_info
+    from google.cloud import bigquery
+
     bigquery_client_options = copy.deepcopy(context.bigquery_client_options)
     if bigquery_api_endpoint:
         if isinstance(bigquery_client_options, dict):
@@ -71,5 +74,6 @@ def create_bq_client(*, project: str, bigquery_api_endpoint: str, location: str)
     )
     if context._connection:
         bq_client._connection = context._connection
+    stats.count_api_requests(bq_client)
 
     return bq_client
@@ -0,0 +1,243 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Persistent cache of query results, stored as Arrow IPC files."""
+
+import os
+import pathlib
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import bigquery_magics.config
+from bigquery_magics.result_cache import ResultInfo, is_fresh
+
+context = bigquery_magics.config.context
+
+# Key of the ResultInfo JSON in the Arrow schema metadata.
+_METADATA_KEY = b"bigquery_magics.result_info"
+
+_SUFFIX = ".arrow"
+
+
+def _remove(path: pathlib.Path):
+    try:
+        path.unlink()
+    except OSError:
+        pass
+
+
+class DiskCache:
+    """Keeps query results on disk, so that they survive kernel restarts.
+
+    Results are stored under
+    :attr:`~bigquery_magics.config.Context.disk_cache_dir` as Arrow IPC
+    files named after the query fingerprint and job ID, and are memory-mapped
+    when read back. Files are evicted in least recently used order once their
+    total size exceeds
+    :attr:`~bigquery_magics.config.Context.disk_cache_max_bytes`. As in the
+    in-memory cache, results are only reused if none of the tables the query
+    read from were modified since the query ran.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _directory() -> Optional[pathlib.Path]:
+        directory = context.disk_cache_dir
+        if directory is None:
+            return None
+        return pathlib.Path(directory).expanduser()
+
+    @staticmethod
+    def _files(directory: pathlib.Path, pattern: str = "*") -> List[pathlib.Path]:
+        """Returns the cache files matching ``pattern``, most recently used
+        first.
+        """
+        files = []
+        for path in directory.glob(pattern + _SUFFIX):
+            try:
+                files.append((path.stat().st_mtime, path))
+            except OSError:
+                # Removed concurrently.
+                continue
+        return [path for _, path in sorted(files, reverse=True)]
+
+    def get(self, key: str, bq_client: Any) -> Optional[Tuple[Any, ResultInfo]]:
+        """Looks up the results cached for ``key``.
+
+        Args:
+            key: The query fingerprint.
+            bq_client (google.cloud.bigquery.client.Client): Client used to
+                look up the referenced tables.
+
+        Returns:
+            A tuple of the cached results and the description of the job
+            that produced them, or None if there is no valid entry.
+        """
+        directory = self._directory()
+        if directory is None:
+            return None
+        if not directory.is_dir():
+            return self._miss()
+
+        for path in self._files(directory, f"{key}-*"):
+            try:
+                cached = self._read(path, bq_client)
+            except Exception:
+                # Unreadable, for example if written by an interrupted
+                # kernel.
+                cached = None
+
+            if cached is None:
+                _remove(path)
+                continue
+
+            # Mark the file as recently used.
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+            with self._lock:
+                self.hits += 1
+            return cached
+
+        return self._miss()
+
+    def _miss(self):
+        with self._lock:
+            self.misses += 1
+        return None
+
+    @staticmethod
+    def _read(path: pathlib.Path, bq_client: Any) -> Optional[Tuple[Any, ResultInfo]]:
+        import pyarrow
+        import pyarrow.ipc
+
+        with pyarrow.memory_map(str(path)) as source:
+            reader = pyarrow.ipc.open_file(source)
+            info = ResultInfo.from_json(reader.schema.metadata[_METADATA_KEY])
+            if not is_fresh(info, bq_client):
+                return None
+            table = reader.read_all()
+            if table.schema.pandas_metadata is None:
+                # Cached as a pyarrow.Table or a polars.DataFrame.
+                return table, info
+            return table.to_pandas(), info
+
+    def put(self, key: str, result: Any, info: ResultInfo):
+        """Writes the results of a finished query job to the cache directory.
+
+        Results that cannot be converted to Arrow, or that are larger than
+        the cache, are not cached.
+        """
+        directory = self._directory()
+        if directory is None:
+            return
+
+        import pyarrow
+        import pyarrow.ipc
+
+        if isinstance(result, pyarrow.Table):
+            table = result
+        elif hasattr(result, "to_arrow"):
+            # polars.DataFrame
+            table = result.to_arrow()
+        else:
+            try:
+                table = pyarrow.Table.from_pandas(result)
+            except Exception:
+                return
+        metadata = dict(table.schema.metadata or {})
+        metadata[_METADATA_KEY] = info.to_json().encode("utf-8")
+        table = table.replace_schema_metadata(metadata)
+
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{key}-{info.job_id}{_SUFFIX}"
+        options = pyarrow.ipc.IpcWriteOptions(
+            compression=context.disk_cache_compression
+        )
+
+        # Write to a temporary file first, so that readers never see a
+        # partially written file.
+        fd, temp_name = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as sink:
+                with pyarrow.ipc.new_file(
+                    sink, table.schema, options=options
+                ) as writer:
+                    writer.write_table(table)
+            os.replace(temp_name, path)
+        except BaseException:
+            _remove(pathlib.Path(temp_name))
+            raise
+
+        with self._lock:
+            # Results of earlier jobs for the same query are now stale.
+            for other in self._files(directory, f"{key}-*"):
+                if other != path:
+                    _remove(other)
+            self._evict(directory)
+
+    @staticmethod
+    def _evict(directory: pathlib.Path):
+        total_size = 0
+        for path in DiskCache._files(directory):
+            try:
+                size = path.stat().st_size
+            except OSError:
+                continue
+            total_size += size
+            if total_size > context.disk_cache_max_bytes:
+                _remove(path)
+                total_size -= size
+
+    def clear(self):
+        """Removes all cached files and resets the hit and miss counters."""
+        directory = self._directory()
+        with self._lock:
+            if directory is not None and directory.is_dir():
+                for path in self._files(directory):
+                    _remove(path)
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of hits, misses, files and cached bytes."""
+        directory = self._directory()
+        files = []
+        if directory is not None and directory.is_dir():
+            files = self._files(directory)
+
+        size = 0
+        for path in files:
+            try:
+                size += path.stat().st_size
+            except OSError:
+                continue
+
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(files),
+                "bytes": size,
+            }
+
+
+disk_cache = DiskCache()
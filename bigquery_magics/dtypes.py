@@ -0,0 +1,195 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Memory-saving dtypes for downloaded query results."""
+
+from typing import Any, Optional, Tuple
+import warnings
+
+import pandas
+
+# String columns with at most this ratio of distinct values to rows are
+# stored as categoricals.
+_MAX_CATEGORICAL_RATIO = 0.5
+
+_SIGNED_INTEGER_BITS = (8, 16, 32)
+
+# Number of rows converted to estimate the memory footprint of the default
+# dtypes.
+_ESTIMATE_SAMPLE_ROWS = 10_000
+
+
+def arrow_to_pandas(table: Any) -> pandas.DataFrame:
+    """Converts a :class:`pyarrow.Table` to a DataFrame with pyarrow-backed
+    dtypes, without copying the data where possible.
+    """
+    if not hasattr(pandas, "ArrowDtype"):
+        raise ValueError("--dtype_backend pyarrow requires pandas 1.5 or later.")
+    return table.to_pandas(types_mapper=pandas.ArrowDtype)
+
+
+def estimate_default_memory_usage(table: Any) -> int:
+    """Estimates the memory footprint of a :class:`pyarrow.Table` converted
+    to a DataFrame with the default dtypes, in bytes, without converting all
+    of it.
+
+    The first rows are converted, and their footprint is scaled to the
+    number of rows of the table.
+    """
+    if table.num_rows == 0:
+        return 0
+    sample = table.slice(0, _ESTIMATE_SAMPLE_ROWS)
+    sample_usage = memory_usage(sample.to_pandas())
+    return int(sample_usage * table.num_rows / sample.num_rows)
+
+
+def memory_usage(dataframe: pandas.DataFrame) -> int:
+    """Returns the memory footprint of a DataFrame, in bytes."""
+    return int(dataframe.memory_usage(index=True, deep=True).sum())
+
+
+def _is_arrow(series: pandas.Series) -> bool:
+    return hasattr(pandas, "ArrowDtype") and isinstance(series.dtype, pandas.ArrowDtype)
+
+
+def _is_string(series: pandas.Series) -> bool:
+    if _is_arrow(series):
+        import pyarrow
+
+        arrow_type = series.dtype.pyarrow_dtype
+        return pyarrow.types.is_string(arrow_type) or pyarrow.types.is_large_string(
+            arrow_type
+        )
+    if pandas.api.types.is_string_dtype(series.dtype) and not isinstance(
+        series.dtype, pandas.CategoricalDtype
+    ):
+        # Object columns can hold anything, such as lists of REPEATED fields.
+        return series.dropna().map(type).eq(str).all()
+    return False
+
+
+def _string_dtype(series: pandas.Series) -> Optional[Any]:
+    if series.nunique(dropna=True) <= len(series) * _MAX_CATEGORICAL_RATIO:
+        return "category"
+    dtype = series.dtype
+    if _is_arrow(series) or getattr(dtype, "storage", None) == "pyarrow":
+        return None
+    try:
+        return pandas.StringDtype("pyarrow")
+    except (ImportError, TypeError):
+        return None
+
+
+def _integer_dtype(series: pandas.Series) -> Optional[Any]:
+    if series.isna().all():
+        return None
+    minimum, maximum = int(series.min()), int(series.max())
+    for bits in _SIGNED_INTEGER_BITS:
+        if -(2 ** (bits - 1)) <= minimum and maximum < 2 ** (bits - 1):
+            break
+    else:
+        return None
+
+    if _is_arrow(series):
+        import pyarrow
+
+        return pandas.ArrowDtype(getattr(pyarrow, f"int{bits}")())
+    if pandas.api.types.is_extension_array_dtype(series.dtype):
+        return f"Int{bits}"
+    return f"int{bits}"
+
+
+def _float_dtype(series: pandas.Series) -> Optional[Any]:
+    if _is_arrow(series):
+        import pyarrow
+
+        target = pandas.ArrowDtype(pyarrow.float32())
+    elif pandas.api.types.is_extension_array_dtype(series.dtype):
+        target = "Float32"
+    else:
+        target = "float32"
+
+    # Only downcast if no value loses precision. Values out of the float32
+    # range overflow to infinity, so they do not compare equal either.
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        downcast = series.astype(target)
+    if not downcast.astype(series.dtype).equals(series):
+        return None
+    return target
+
+
+def _optimized_dtype(series: pandas.Series) -> Optional[Any]:
+    dtype = series.dtype
+    if _is_string(series):
+        return _string_dtype(series)
+    if _is_arrow(series):
+        import pyarrow
+
+        arrow_type = dtype.pyarrow_dtype
+        if pyarrow.types.is_int64(arrow_type):
+            return _integer_dtype(series)
+        if pyarrow.types.is_float64(arrow_type):
+            return _float_dtype(series)
+        return None
+    if pandas.api.types.is_bool_dtype(dtype):
+        return None
+    if pandas.api.types.is_integer_dtype(dtype) and dtype.itemsize > 1:
+        return _integer_dtype(series)
+    if pandas.api.types.is_float_dtype(dtype) and dtype.itemsize > 4:
+        return _float_dtype(series)
+    return None
+
+
+def optimize(dataframe: pandas.DataFrame) -> Tuple[pandas.DataFrame, int, int]:
+    """Converts the columns of a DataFrame to smaller dtypes.
+
+    Low-cardinality string columns become categoricals and other string
+    columns pyarrow-backed strings. Integer columns are downcast to the
+    smallest signed integer dtype holding their minimum and maximum. Float
+    columns are downcast to float32 only if every value converts back to
+    exactly the same float64, such as 0.5 or whole numbers up to 2**24, so
+    columns of decimal fractions such as 0.1 keep float64.
+
+    Returns:
+        The optimized DataFrame, and its memory footprint before and after
+        optimization, in bytes.
+    """
+    before = memory_usage(dataframe)
+    dtypes = {}
+    for column in dataframe.columns:
+        series = dataframe[column]
+        if not isinstance(series, pandas.Series) or series.empty:
+            # Skip duplicate column names and empty results.
+            continue
+        dtype = _optimized_dtype(series)
+        if dtype is not None:
+            dtypes[column] = dtype
+
+    if dtypes:
+        dataframe = dataframe.astype(dtypes)
+    return dataframe, before, memory_usage(dataframe)
+
+
+def format_bytes(num_bytes: float) -> str:
+    """Formats a number of bytes for display, such as ``"1.5 MiB"``."""
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(num_bytes) < 1024:
+            break
+        num_bytes /= 1024
+    else:
+        unit = "TiB"
+    if unit == "B":
+        return f"{int(num_bytes)} B"
+    return f"{num_bytes:.1f} {unit}"
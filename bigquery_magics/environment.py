@@ -13,7 +13,8 @@
 # limitations under the License.
 
 
-import importlib
+import functools
+import importlib.util
 import json
 import os
 import pathlib
@@ -31,10 +32,13 @@ GOOGLE_CLOUD_CODE_EXTENSION_NAME = "googlecloudtools.cloudcode"
 BIGQUERY_JUPYTER_PLUGIN_NAME = "bigquery_jupyter_plugin"
 
 
+@functools.lru_cache(maxsize=None)
 def _is_vscode_extension_installed(extension_id: str) -> bool:
     """
     Checks if a given Visual Studio Code extension is installed.
 
+    The result is cached, as this walks the extensions directory.
+
     Args:
         extension_id: The ID of the extension (e.g., "ms-python.python").
 
@@ -72,10 +76,13 @@ def _is_vscode_extension_installed(extension_id: str) -> bool:
     return False
 
 
+@functools.lru_cache(maxsize=None)
 def _is_package_installed(package_name: str) -> bool:
     """
     Checks if a Python package is installed.
 
+    The package is located without being imported, and the result is cached.
+
     Args:
         package_name: The name of the package to check (e.g., "requests", "numpy").
 
@@ -83,8 +90,7 @@ def _is_package_installed(package_name: str) -> bool:
         True if the package is installed, False otherwise.
     """
     try:
-        importlib.import_module(package_name)
-        return True
+        return importlib.util.find_spec(package_name) is not None
     except Exception:
         return False
 
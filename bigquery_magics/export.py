@@ -0,0 +1,158 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Writes query results to local files, one record batch at a time."""
+
+import os
+import pathlib
+import tempfile
+from typing import Any, Callable, Iterable, Optional
+
+PARQUET_COMPRESSIONS = ("snappy", "gzip", "brotli", "zstd", "lz4", "none")
+
+ARROW_IPC_COMPRESSIONS = ("lz4", "zstd", "none")
+
+
+def _write_atomically(path: str, write: Callable[[Any], int]) -> int:
+    """Calls ``write`` with a temporary file next to ``path``, then moves it
+    to ``path``, so that an interrupted export never leaves a partial file.
+    """
+    path = pathlib.Path(path).expanduser()
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as sink:
+            num_rows = write(sink)
+        os.replace(temp_name, path)
+    except BaseException:
+        try:
+            os.unlink(temp_name)
+        except OSError:
+            pass
+        raise
+    return num_rows
+
+
+def write_parquet(
+    batches: Iterable[Any],
+    path: str,
+    *,
+    empty_schema: Callable[[], Any],
+    compression: Optional[str] = None,
+    row_group_size: Optional[int] = None,
+) -> int:
+    """Writes record batches to a Parquet file.
+
+    Args:
+        batches (Iterable[pyarrow.RecordBatch]): The results to write.
+        path: Path of the file to write.
+        empty_schema (Callable[[], pyarrow.Schema]): Returns the schema of
+            the results, for results without any batch.
+        compression: Parquet compression codec. Defaults to snappy.
+        row_group_size: Number of rows in each row group. If not set, each
+            batch is written as a row group.
+
+    Returns:
+        The number of rows written.
+    """
+    import pyarrow
+    import pyarrow.parquet
+
+    compression = compression or "snappy"
+
+    def write(sink):
+        writer = None
+        # Rows of a partial row group, kept until there are enough rows for a
+        # full one, so that row groups are not as small as the batches.
+        pending = None
+        num_rows = 0
+
+        try:
+            for batch in batches:
+                if writer is None:
+                    writer = pyarrow.parquet.ParquetWriter(
+                        sink, batch.schema, compression=compression
+                    )
+                num_rows += batch.num_rows
+                table = pyarrow.Table.from_batches([batch])
+                if row_group_size is None:
+                    writer.write_table(table)
+                    continue
+
+                if pending is not None:
+                    table = pyarrow.concat_tables([pending, table])
+                full_rows = table.num_rows - table.num_rows % row_group_size
+                if full_rows:
+                    writer.write_table(
+                        table.slice(0, full_rows), row_group_size=row_group_size
+                    )
+                pending = table.slice(full_rows)
+
+            if writer is None:
+                writer = pyarrow.parquet.ParquetWriter(
+                    sink, empty_schema(), compression=compression
+                )
+            elif pending is not None and pending.num_rows:
+                writer.write_table(pending)
+        finally:
+            if writer is not None:
+                writer.close()
+        return num_rows
+
+    return _write_atomically(path, write)
+
+
+def write_arrow_ipc(
+    batches: Iterable[Any],
+    path: str,
+    *,
+    empty_schema: Callable[[], Any],
+    compression: Optional[str] = None,
+) -> int:
+    """Writes record batches to an Arrow IPC file.
+
+    Args:
+        batches (Iterable[pyarrow.RecordBatch]): The results to write.
+        path: Path of the file to write.
+        empty_schema (Callable[[], pyarrow.Schema]): Returns the schema of
+            the results, for results without any batch.
+        compression: IPC buffer compression codec. Not compressed if not
+            set.
+
+    Returns:
+        The number of rows written.
+    """
+    import pyarrow.ipc
+
+    if compression == "none":
+        compression = None
+    options = pyarrow.ipc.IpcWriteOptions(compression=compression)
+
+    def write(sink):
+        writer = None
+        num_rows = 0
+        try:
+            for batch in batches:
+                if writer is None:
+                    writer = pyarrow.ipc.new_file(sink, batch.schema, options=options)
+                writer.write_batch(batch)
+                num_rows += batch.num_rows
+
+            if writer is None:
+                writer = pyarrow.ipc.new_file(sink, empty_schema(), options=options)
+        finally:
+            if writer is not None:
+                writer.close()
+        return num_rows
+
+    return _write_atomically(path, write)
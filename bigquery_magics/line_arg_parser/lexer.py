@@ -57,7 +57,9 @@ token_types = OrderedDict(
         GOTO_PARSE_PARAMS_OPTION=r"(?P<GOTO_PARSE_PARAMS_OPTION>(?=--params(?:\s|=|--|$)))",  # the --params option
         OPTION_SPEC=r"(?P<OPTION_SPEC>--\w+)",
         OPTION_EQ=r"(?P<OPTION_EQ>=)",
-        OPT_VAL=r"(?P<OPT_VAL>\S+?(?=\s|--|$))",
+        OPT_VAL=r"(?P<OPT_VAL>{}|\S+?(?=\s|--|$))".format(  # quoted values can contain whitespace
+            r"(?:'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\")(?=\s|$)"
+        ),
     ),
     state_parse_params_option=OrderedDict(
         PY_STRING=r"(?P<PY_STRING>(?:{})|(?:{}))".format(  # single and double quoted strings
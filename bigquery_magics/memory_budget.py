@@ -0,0 +1,170 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Estimates of the memory needed to download query results, checked against
+a budget before downloading them.
+"""
+
+import re
+from typing import Any, Iterable, Optional, Union
+
+POLICIES = ("error", "sample", "stream", "spill")
+
+_SIZE_UNITS = {
+    "": 1,
+    "B": 1,
+    "KB": 1000,
+    "MB": 1000**2,
+    "GB": 1000**3,
+    "TB": 1000**4,
+    "KIB": 1024,
+    "MIB": 1024**2,
+    "GIB": 1024**3,
+    "TIB": 1024**4,
+}
+
+_SIZE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d*)?)\s*([a-zA-Z]*)\s*$")
+
+# Size of the Arrow data of a value of each type, in bytes. Variable-width
+# types are assumed to hold short values.
+_FIELD_WIDTHS = {
+    "BOOLEAN": 1,
+    "BOOL": 1,
+    "INTEGER": 8,
+    "INT64": 8,
+    "FLOAT": 8,
+    "FLOAT64": 8,
+    "NUMERIC": 16,
+    "BIGNUMERIC": 32,
+    "DATE": 4,
+    "DATETIME": 8,
+    "TIMESTAMP": 8,
+    "TIME": 8,
+}
+_VARIABLE_WIDTH = 32
+
+# Types stored as Python objects in pandas DataFrames with the default
+# dtypes, which take up much more memory than their Arrow data.
+_OBJECT_TYPES = frozenset(
+    {
+        "STRING",
+        "BYTES",
+        "NUMERIC",
+        "BIGNUMERIC",
+        "JSON",
+        "GEOGRAPHY",
+        "RECORD",
+        "STRUCT",
+        "RANGE",
+        "INTERVAL",
+    }
+)
+
+# Size of a short str or bytes object, plus the pointer to it.
+_PYTHON_OBJECT_BYTES = 57
+
+
+class MemoryBudgetExceededError(Exception):
+    """Raised when the query results are estimated to exceed the memory
+    budget, and the budget policy is "error".
+    """
+
+
+def parse_size(value: Union[int, float, str]) -> int:
+    """Parses a size such as ``1073741824``, ``"500MB"`` or ``"2GiB"`` into
+    a number of bytes.
+    """
+    if isinstance(value, (int, float)):
+        size = value
+    else:
+        match = _SIZE_PATTERN.match(value)
+        unit = match.group(2).upper() if match else None
+        if unit not in _SIZE_UNITS:
+            raise ValueError(
+                f"Invalid memory budget: {value!r}. Use a number of bytes, "
+                "optionally followed by a unit such as MB, GB, MiB or GiB."
+            )
+        size = float(match.group(1)) * _SIZE_UNITS[unit]
+    if size <= 0:
+        raise ValueError("The memory budget must be positive.")
+    return int(size)
+
+
+def _field_width(field: Any) -> int:
+    if field.field_type in ("RECORD", "STRUCT"):
+        width = sum(_field_width(subfield) for subfield in field.fields)
+    else:
+        width = _FIELD_WIDTHS.get(field.field_type, _VARIABLE_WIDTH)
+    if field.mode == "REPEATED":
+        # Assume a few values per row.
+        width *= 4
+    return width
+
+
+def _is_python_object(field: Any) -> bool:
+    return field.mode == "REPEATED" or field.field_type in _OBJECT_TYPES
+
+
+def estimate_size(
+    schema: Iterable[Any],
+    num_rows: int,
+    num_bytes: Optional[int] = None,
+    *,
+    max_rows: Optional[int] = None,
+    selected_fields: Optional[Iterable[Any]] = None,
+    python_objects: bool = True,
+) -> int:
+    """Estimates the memory needed to hold downloaded query results.
+
+    Args:
+        schema (Iterable[google.cloud.bigquery.SchemaField]): Schema of the
+            table holding the results.
+        num_rows: Number of rows in the table.
+        num_bytes: Logical size of the table, in bytes, if known. Otherwise
+            the size of the rows is estimated from the schema.
+        max_rows: Maximum number of rows to download, if not all of them.
+        selected_fields (Optional[Iterable[google.cloud.bigquery.SchemaField]]):
+            The fields to download, if not all of them.
+        python_objects: Whether the results are converted to a DataFrame
+            with the default dtypes, where strings and other values are
+            stored as Python objects.
+
+    Returns:
+        The estimated size, in bytes.
+    """
+    schema = list(schema)
+    fields = list(selected_fields) if selected_fields is not None else schema
+    width = sum(_field_width(field) for field in fields)
+
+    row_size = float(width)
+    if num_bytes is not None and num_rows:
+        # The table size accounts for the actual length of variable-width
+        # values. Only count the share of the selected fields.
+        table_width = sum(_field_width(field) for field in schema)
+        row_size = num_bytes / num_rows * (width / table_width if table_width else 1)
+
+    if python_objects:
+        row_size += _PYTHON_OBJECT_BYTES * sum(map(_is_python_object, fields))
+    if max_rows is not None:
+        num_rows = min(num_rows, max_rows)
+    return int(row_size * num_rows)
+
+
+def rows_within(budget: int, estimated_size: int, num_rows: int) -> int:
+    """Returns the number of rows estimated to fit within ``budget`` bytes,
+    given the estimated size of ``num_rows`` rows.
+    """
+    if estimated_size <= 0:
+        return num_rows
+    return min(num_rows, int(num_rows * budget / estimated_size))
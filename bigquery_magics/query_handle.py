@@ -0,0 +1,172 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Handle to a query running in the background with ``%%bigquery --async``."""
+
+from concurrent import futures
+import threading
+from typing import Any, Callable, List, Optional
+
+
+class QueryHandle:
+    """Handle to a query started with ``%%bigquery --async``.
+
+    The query job is submitted when the cell runs. Waiting for the job, and
+    downloading and converting its results, happen on a background thread,
+    so that the kernel stays usable in the meantime. Once the results are
+    available, they are stored in the cell's destination variable, if any.
+
+    Messages about the results, such as the memory saved by
+    ``--optimize_dtypes``, are printed when the results are retrieved rather
+    than by the background thread, whose output would end up in whichever
+    cell is running.
+
+    The handle can be awaited in a notebook cell, or waited on with
+    :meth:`result`:
+
+    >>> handle = _
+    >>> df = await handle
+    """
+
+    def __init__(self, query_job: Any):
+        self._query_job = query_job
+        self._future: futures.Future = futures.Future()
+        self._lock = threading.Lock()
+        self._messages: List[str] = []
+        self._pending_messages: List[str] = []
+
+    @property
+    def query_job(self) -> Any:
+        """google.cloud.bigquery.job.QueryJob: The query job."""
+        return self._query_job
+
+    @property
+    def job_id(self) -> str:
+        """str: ID of the query job."""
+        return self._query_job.job_id
+
+    @property
+    def messages(self) -> List[str]:
+        """List[str]: Messages about the query results."""
+        with self._lock:
+            return list(self._messages)
+
+    def done(self) -> bool:
+        """Returns True if the results are available, or the query failed or
+        was cancelled.
+        """
+        return self._future.done()
+
+    def cancelled(self) -> bool:
+        """Returns True if the query was cancelled."""
+        return self._future.cancelled()
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        """Waits for the query results.
+
+        Args:
+            timeout: Maximum number of seconds to wait. Waits indefinitely if
+                not set.
+
+        Returns:
+            The query results, as they would have been returned by the cell.
+
+        Raises:
+            concurrent.futures.TimeoutError: If the results are not available
+                before the timeout.
+            concurrent.futures.CancelledError: If the query was cancelled.
+            Exception: Any error raised while running the query or
+                downloading its results.
+        """
+        result = self._future.result(timeout=timeout)
+        self._print_messages()
+        return result
+
+    def exception(self, timeout: Optional[float] = None) -> Optional[BaseException]:
+        """Waits for the query and returns the error it raised, if any."""
+        return self._future.exception(timeout=timeout)
+
+    def cancel(self) -> bool:
+        """Cancels the query job.
+
+        If its results are already being downloaded, the download runs to
+        completion on the background thread, but the results are discarded.
+
+        Returns:
+            False if the results are already available or the query failed,
+            True otherwise.
+        """
+        with self._lock:
+            if not self._future.cancel():
+                return False
+
+        try:
+            self._query_job.cancel()
+        except Exception:
+            # The job may have finished already, and the download is
+            # abandoned either way.
+            pass
+        return True
+
+    def add_done_callback(self, fn: Callable[["QueryHandle"], Any]):
+        """Calls ``fn`` with the handle once the query is done, failed or was
+        cancelled.
+        """
+        self._future.add_done_callback(lambda _: fn(self))
+
+    def __await__(self):
+        import asyncio
+
+        result = yield from asyncio.wrap_future(self._future).__await__()
+        self._print_messages()
+        return result
+
+    def _add_message(self, message: str):
+        with self._lock:
+            self._messages.append(message)
+            self._pending_messages.append(message)
+
+    def _print_messages(self):
+        """Prints the messages not printed yet."""
+        with self._lock:
+            messages, self._pending_messages = self._pending_messages, []
+        for message in messages:
+            print(message)
+
+    def _set_result(self, result: Any, on_result: Callable[[Any], Any]):
+        with self._lock:
+            if self._future.cancelled():
+                return
+            try:
+                on_result(result)
+            except Exception as ex:
+                self._future.set_exception(ex)
+                return
+            self._future.set_result(result)
+
+    def _set_exception(self, error: BaseException):
+        with self._lock:
+            if not self._future.cancelled():
+                self._future.set_exception(error)
+
+    def __repr__(self) -> str:
+        if self._future.cancelled():
+            state = "cancelled"
+        elif not self._future.done():
+            state = "running"
+        elif self._future.exception() is not None:
+            state = "failed"
+        else:
+            state = "done"
+        return f"<QueryHandle job_id={self.job_id!r} state={state!r}>"
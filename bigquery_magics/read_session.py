@@ -0,0 +1,255 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tuning of the BigQuery Storage API read sessions used to download results."""
+
+from dataclasses import dataclass, replace
+import threading
+from typing import Any, Iterator, Optional
+
+COMPRESSIONS = ("lz4", "zstd", "none")
+
+
+@dataclass
+class ReadSessionOptions:
+    """Options of the read sessions created to download query results."""
+
+    max_stream_count: Optional[int] = None
+    """Optional[int]: Maximum number of streams to read in parallel. If 0,
+    the server picks the number of streams. If not set, the client library
+    default is used.
+    """
+
+    preserve_order: Optional[bool] = None
+    """Optional[bool]: If True, results are read from a single stream, so
+    that rows arrive in order. If False, ordered results are read from
+    ``max_stream_count`` streams too, so that rows may arrive out of order.
+    If not set, only the results of queries with an ORDER BY clause are read
+    from a single stream.
+    """
+
+    compression: Optional[str] = None
+    """Optional[str]: Compression codec of the Arrow record batches sent by
+    the server: "lz4", "zstd" or "none". If not set, the client library
+    default is used.
+    """
+
+    row_restriction: Optional[str] = None
+    """Optional[str]: SQL filter the rows must match to be read, such as
+    ``"num > 5"``. If not set, all rows are read.
+    """
+
+    def is_default(self) -> bool:
+        """Whether the read sessions are left as the client library creates
+        them.
+        """
+        return self == ReadSessionOptions()
+
+
+def _compression_codec(compression: str) -> Any:
+    from google.cloud.bigquery_storage_v1.types import ArrowSerializationOptions
+
+    codecs = ArrowSerializationOptions.CompressionCodec
+    return {
+        "lz4": codecs.LZ4_FRAME,
+        "zstd": codecs.ZSTD,
+        "none": codecs.COMPRESSION_UNSPECIFIED,
+    }[compression]
+
+
+class _RowLimit:
+    """Number of rows read from all the streams of a read session, shared by
+    the threads reading them.
+    """
+
+    def __init__(self, max_rows: int):
+        self._lock = threading.Lock()
+        self._max_rows = max_rows
+        self._rows = 0
+
+    def reached(self) -> bool:
+        with self._lock:
+            return self._rows >= self._max_rows
+
+    def add(self, num_rows: int):
+        with self._lock:
+            self._rows += num_rows
+
+
+def _cancel_read_rows(reader: Any):
+    """Cancels the ReadRows call of a stream that is no longer read, so that
+    the server stops sending rows and the gRPC call is released.
+
+    Args:
+        reader (google.cloud.bigquery_storage_v1.reader.ReadRowsStream):
+            The stream. Nothing is done if its call has not started.
+    """
+    call = getattr(reader, "_wrapped", None)
+    if call is not None:
+        call.cancel()
+
+
+class _LimitedRowsIterable:
+    def __init__(self, rows: Any, reader: Any, limit: _RowLimit):
+        self._rows = rows
+        self._reader = reader
+        self._limit = limit
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._rows, name)
+
+    @property
+    def pages(self) -> Iterator[Any]:
+        pages = iter(self._rows.pages)
+        finished = False
+        try:
+            # Stop before requesting more pages once enough rows were read.
+            # Each stream may still yield the page it was reading at that
+            # point.
+            while not self._limit.reached():
+                page = next(pages, None)
+                if page is None:
+                    finished = True
+                    return
+                self._limit.add(page.num_items)
+                yield page
+        finally:
+            # Also reached if the caller stops iterating early.
+            if not finished:
+                if hasattr(pages, "close"):
+                    pages.close()
+                _cancel_read_rows(self._reader)
+
+
+class _LimitedReadRowsStream:
+    def __init__(self, reader: Any, limit: _RowLimit):
+        self._reader = reader
+        self._limit = limit
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._reader, name)
+
+    def rows(self, *args, **kwargs) -> _LimitedRowsIterable:
+        return _LimitedRowsIterable(
+            self._reader.rows(*args, **kwargs), self._reader, self._limit
+        )
+
+
+class TunedReadClient:
+    """Wraps a :class:`~google.cloud.bigquery_storage.BigQueryReadClient` to
+    apply :class:`ReadSessionOptions` to the read sessions it creates.
+
+    The client library downloads results with the wrapped client as it
+    would with the original one, so that the downloaded results are
+    converted exactly the same way. All other calls are passed through.
+
+    If ``max_rows`` is set, the streams of the read session stop being read
+    once that many rows were read from them in total, and their ReadRows
+    calls are cancelled. As each stream stops at a page boundary, slightly
+    more rows than ``max_rows`` may be returned.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        options: ReadSessionOptions,
+        max_rows: Optional[int] = None,
+    ):
+        self._client = client
+        self._options = options
+        self._limit = _RowLimit(max_rows) if max_rows is not None else None
+
+    @property
+    def client(self) -> Any:
+        """google.cloud.bigquery_storage.BigQueryReadClient: The wrapped
+        client.
+        """
+        return self._client
+
+    @property
+    def options(self) -> ReadSessionOptions:
+        """ReadSessionOptions: Options applied to new read sessions."""
+        return self._options
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+    def create_read_session(self, *args, **kwargs):
+        options = self._options
+        read_session = kwargs.get("read_session")
+        if read_session is not None and options.row_restriction is not None:
+            read_session.read_options.row_restriction = options.row_restriction
+        if read_session is not None and options.compression is not None:
+            serialization_options = (
+                read_session.read_options.arrow_serialization_options
+            )
+            serialization_options.buffer_compression = _compression_codec(
+                options.compression
+            )
+
+        # The client library asks for a single stream to preserve the order
+        # of results, and sets no limit otherwise.
+        requested_streams = kwargs.get("max_stream_count")
+        ordered = requested_streams == 1
+        if options.preserve_order:
+            kwargs["max_stream_count"] = 1
+        elif options.preserve_order is False or not ordered:
+            if options.max_stream_count is not None:
+                kwargs["max_stream_count"] = options.max_stream_count
+            elif ordered:
+                kwargs["max_stream_count"] = 0
+
+        return self._client.create_read_session(*args, **kwargs)
+
+    def read_rows(self, *args, **kwargs):
+        reader = self._client.read_rows(*args, **kwargs)
+        if self._limit is None:
+            return reader
+        return _LimitedReadRowsStream(reader, self._limit)
+
+    def __repr__(self) -> str:
+        return f"<TunedReadClient {self._options!r}>"
+
+
+def tune_read_client(client: Any, options: ReadSessionOptions) -> Any:
+    """Returns ``client`` wrapped to apply ``options`` to its read sessions,
+    or ``client`` itself if there is nothing to change.
+    """
+    if client is None or options.is_default():
+        return client
+    return TunedReadClient(client, options)
+
+
+def limit_rows(client: Any, max_rows: int) -> Any:
+    """Returns ``client`` wrapped to stop reading the streams of a read
+    session after about ``max_rows`` rows.
+
+    Each download needs its own wrapper, as the rows are counted across all
+    the streams read with it.
+    """
+    options = ReadSessionOptions()
+    if isinstance(client, TunedReadClient):
+        client, options = client.client, client.options
+    return TunedReadClient(client, options, max_rows=max_rows)
+
+
+def restrict_rows(client: Any, row_restriction: str) -> TunedReadClient:
+    """Returns ``client`` wrapped to only read the rows matching the SQL
+    filter ``row_restriction``.
+    """
+    options = ReadSessionOptions()
+    if isinstance(client, TunedReadClient):
+        client, options = client.client, client.options
+    options = replace(options, row_restriction=row_restriction)
+    return TunedReadClient(client, options)
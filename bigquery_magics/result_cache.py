@@ -0,0 +1,481 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Session-scoped cache of query results, keyed by query fingerprint."""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+import datetime
+import hashlib
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import bigquery_magics.config
+
+context = bigquery_magics.config.context
+
+# String literals, quoted identifiers and comments are kept verbatim when
+# normalizing a query, while other runs of whitespace are collapsed.
+_VERBATIM_OR_WHITESPACE = re.compile(
+    r"""(?P<verbatim>
+        '''.*?(?<!\\)'''
+        |\"\"\".*?(?<!\\)\"\"\"
+        |'(?:\\.|[^'\\\n])*'
+        |"(?:\\.|[^"\\\n])*"
+        |`[^`]*`
+        |--[^\n]*
+        |\#[^\n]*
+        |/\*.*?\*/
+    )
+    |(?P<whitespace>\s+)""",
+    re.VERBOSE | re.DOTALL,
+)
+
+# Query job configuration fields that change the results of a query.
+_RESULT_CONFIG_FIELDS = (
+    "connectionProperties",
+    "defaultDataset",
+    "parameterMode",
+    "queryParameters",
+    "tableDefinitions",
+    "useLegacySql",
+    "userDefinedFunctionResources",
+)
+
+# BigQuery does not cache the results of queries using these functions, and
+# neither do the magics.
+_NONDETERMINISTIC_FUNCTIONS = re.compile(
+    r"\b(CURRENT_(DATE|DATETIME|TIME|TIMESTAMP)|RAND|GENERATE_UUID|SESSION_USER"
+    r"|EXTERNAL_QUERY|NOW)\b",
+    re.IGNORECASE,
+)
+
+# Only tables whose last modification time reflects all changes to their
+# data can be used to validate cached results.
+_VALIDATED_TABLE_TYPES = ("TABLE", "MATERIALIZED_VIEW", "SNAPSHOT")
+
+# Stop reusing anonymous tables holding query results early enough that they
+# do not expire while being read.
+_DESTINATION_TABLE_READ_MARGIN = datetime.timedelta(hours=1)
+
+_MAX_DESTINATION_TABLES = 1000
+
+
+def normalize_query(query: str) -> str:
+    """Normalize the whitespace in a query, outside of string literals,
+    quoted identifiers and comments.
+    """
+
+    def replace(match):
+        if match.group("verbatim") is not None:
+            return match.group("verbatim")
+        return " "
+
+    return _VERBATIM_OR_WHITESPACE.sub(replace, query).strip()
+
+
+def credentials_identity(credentials: Any) -> Optional[str]:
+    """Identifies the account of credentials in a way that stays the same
+    across sessions, as far as the credentials tell.
+
+    Args:
+        credentials (google.auth.credentials.Credentials): The credentials.
+
+    Returns:
+        The email of a service account or user, a hash of the refresh token
+        of user credentials that do not name their account, or None if the
+        account is unknown.
+    """
+    if type(credentials).__module__ == "google.auth.compute_engine.credentials":
+        # These report the "default" service account until they are first
+        # refreshed, and its email afterwards. A VM has a single service
+        # account.
+        return "compute_engine"
+
+    for attribute in ("service_account_email", "account"):
+        account = getattr(credentials, attribute, None)
+        if account and isinstance(account, str):
+            return account
+
+    # User credentials, for example from pydata_google_auth, may not name
+    # their account.
+    refresh_token = getattr(credentials, "refresh_token", None)
+    if refresh_token and isinstance(refresh_token, str):
+        client_id = getattr(credentials, "client_id", None)
+        encoded = json.dumps([client_id, refresh_token], default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+    return None
+
+
+def query_fingerprint(
+    query: str,
+    job_config: Any,
+    *,
+    project: str,
+    location: Optional[str],
+    credentials: Any,
+    **options,
+) -> str:
+    """Fingerprint of a query, identifying queries with the same results.
+
+    Args:
+        query: SQL query text.
+        job_config (google.cloud.bigquery.job.QueryJobConfig): Configuration
+            of the query job, merged with the client defaults.
+        project: Project to run the query in.
+        location: Location to run the query in.
+        credentials (google.auth.credentials.Credentials): Credentials to
+            run the query with. Accounts with different permissions may get
+            different results, or none at all. Credentials whose account is
+            unknown share their fingerprints.
+        options: Other options that change the returned results, such as
+            the maximum number of rows.
+
+    Returns:
+        A hex digest of the fingerprint.
+    """
+    query_config = job_config.to_api_repr().get("query", {})
+    key = {
+        "query": normalize_query(query),
+        "config": {
+            field: query_config[field]
+            for field in _RESULT_CONFIG_FIELDS
+            if field in query_config
+        },
+        "project": project,
+        "location": location,
+        "account": credentials_identity(credentials),
+        "options": options,
+    }
+    encoded = json.dumps(key, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def is_cacheable(query: str, query_job: Any) -> bool:
+    """Whether the results of a finished query job can be reused.
+
+    Like BigQuery's own cache, only deterministic SELECT queries are cached.
+    Queries that do not reference any table are not cached either, as there
+    is nothing to validate the results against.
+    """
+    return (
+        query_job.statement_type == "SELECT"
+        and bool(query_job.referenced_tables)
+        and not _NONDETERMINISTIC_FUNCTIONS.search(query)
+    )
+
+
+@dataclass
+class ResultInfo:
+    """Describes the query job that produced cached results."""
+
+    job_id: str
+    """str: ID of the query job."""
+
+    started: Optional[datetime.datetime]
+    """Optional[datetime.datetime]: When the query job started."""
+
+    referenced_tables: List[str]
+    """List[str]: IDs of the tables the query read from."""
+
+    @classmethod
+    def from_query_job(cls, query_job: Any) -> "ResultInfo":
+        return cls(
+            job_id=query_job.job_id,
+            started=query_job.started or query_job.created,
+            referenced_tables=[str(table) for table in query_job.referenced_tables],
+        )
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "job_id": self.job_id,
+                "started": self.started.isoformat() if self.started else None,
+                "referenced_tables": self.referenced_tables,
+            }
+        )
+
+    @classmethod
+    def from_json(cls, value: Union[str, bytes]) -> "ResultInfo":
+        resource = json.loads(value)
+        started = resource["started"]
+        return cls(
+            job_id=resource["job_id"],
+            started=datetime.datetime.fromisoformat(started) if started else None,
+            referenced_tables=list(resource["referenced_tables"]),
+        )
+
+
+def is_fresh(info: ResultInfo, bq_client: Any) -> bool:
+    """Whether none of the tables a query read from were modified since the
+    query ran.
+
+    Args:
+        info: The query job that produced the results.
+        bq_client (google.cloud.bigquery.client.Client): Client used to look
+            up the referenced tables.
+    """
+    if info.started is None:
+        return False
+
+    for table_id in info.referenced_tables:
+        try:
+            table = bq_client.get_table(table_id)
+        except Exception:
+            return False
+        if table.table_type not in _VALIDATED_TABLE_TYPES:
+            return False
+        if table.modified is None or table.modified >= info.started:
+            return False
+    return True
+
+
+def _memory_usage(result: Any) -> int:
+    if hasattr(result, "memory_usage"):
+        return int(result.memory_usage(index=True, deep=True).sum())
+    if hasattr(result, "estimated_size"):
+        # polars.DataFrame
+        return int(result.estimated_size())
+    # pyarrow.Table
+    return int(result.nbytes)
+
+
+def _copy_on_write() -> bool:
+    import pandas
+
+    if int(pandas.__version__.split(".")[0]) >= 3:
+        return True
+    # The option does not exist before pandas 2.0.
+    return getattr(pandas.options.mode, "copy_on_write", False) is True
+
+
+def _copy(result: Any) -> Any:
+    """Copies mutable results, so that changes to them are not cached."""
+    if hasattr(result, "copy"):
+        # With Copy-on-Write, a shallow copy shares the data with the
+        # original until either of them is modified.
+        return result.copy(deep=not _copy_on_write())
+    if hasattr(result, "clone"):
+        # polars.DataFrame, cloned without copying its data.
+        return result.clone()
+    # pyarrow.Table is immutable.
+    return result
+
+
+@dataclass
+class _Entry:
+    result: Any
+    info: ResultInfo
+    size: int
+
+
+class ResultCache:
+    """Keeps the results of recent queries in memory, so that re-running a
+    cell does not create a new job and download the results again.
+
+    Entries are evicted in least recently used order once their total memory
+    footprint exceeds :attr:`~bigquery_magics.config.Context.client_cache_max_bytes`.
+    Before an entry is reused, it is checked that none of the tables the
+    query read from were modified since the query ran.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def size(self) -> int:
+        """int: Total memory footprint of the cached results, in bytes."""
+        return self._size
+
+    def get(self, key: str, bq_client: Any) -> Optional[Tuple[Any, ResultInfo]]:
+        """Looks up the results cached for ``key``.
+
+        Args:
+            key: The query fingerprint.
+            bq_client (google.cloud.bigquery.client.Client): Client used to
+                look up the referenced tables.
+
+        Returns:
+            A tuple of a copy of the cached results and the description of
+            the job that produced them, or None if there is no valid entry.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is not None and not is_fresh(entry.info, bq_client):
+            self._discard(key, entry)
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return _copy(entry.result), entry.info
+
+    def put(self, key: str, result: Any, info: ResultInfo):
+        """Caches a copy of the results of a finished query job.
+
+        Results larger than the cache are not cached.
+        """
+        size = _memory_usage(result)
+        max_size = context.client_cache_max_bytes
+        if size > max_size:
+            return
+
+        entry = _Entry(result=_copy(result), info=info, size=size)
+        with self._lock:
+            old_entry = self._entries.pop(key, None)
+            if old_entry is not None:
+                self._size -= old_entry.size
+            self._entries[key] = entry
+            self._size += size
+            while self._size > max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+
+    def clear(self):
+        """Removes all entries and resets the hit and miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of hits, misses, entries and cached bytes."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+    def _discard(self, key: str, entry: _Entry):
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+                self._size -= entry.size
+
+
+def is_anonymous_table(table_ref: Any) -> bool:
+    """Whether a table is the anonymous table BigQuery writes query results
+    to when no destination table is set.
+    """
+    return table_ref is not None and table_ref.dataset_id.startswith("_")
+
+
+def expires_soon(table: Any) -> bool:
+    """Whether a table expires before it can safely be read.
+
+    Args:
+        table (google.cloud.bigquery.table.Table): The table, as returned by
+            ``get_table``.
+    """
+    if table.expires is None:
+        return False
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return table.expires <= now + _DESTINATION_TABLE_READ_MARGIN
+
+
+class DestinationTables:
+    """Remembers the anonymous destination tables of recent query jobs, so
+    that their results can be read again without running a new job.
+
+    Tables are only handed out if none of the tables the query read from
+    were modified since the query ran. Callers check that the table has not
+    expired with :func:`expires_soon`.
+    """
+
+    def __init__(self, max_entries: int = _MAX_DESTINATION_TABLES):
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, ResultInfo]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, bq_client: Any) -> Optional[Tuple[str, ResultInfo]]:
+        """Looks up the destination table of a previous run of a query.
+
+        Args:
+            key: The query fingerprint.
+            bq_client (google.cloud.bigquery.client.Client): Client used to
+                look up the referenced tables.
+
+        Returns:
+            A tuple of the destination table ID and the description of the
+            job that wrote it, or None if there is no usable table.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is not None:
+            _, info = entry
+            if not is_fresh(info, bq_client):
+                self.discard(key)
+                entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, destination: str, info: ResultInfo):
+        """Remembers the destination table of a finished query job."""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (destination, info)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: str):
+        """Forgets the destination table of a query, for example because it
+        expired.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Forgets all tables and resets the hit and miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of hits, misses and remembered tables."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+            }
+
+
+result_cache = ResultCache()
+
+destination_tables = DestinationTables()
@@ -0,0 +1,96 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Iterator over query results downloaded with ``%%bigquery --stream``."""
+
+import threading
+from typing import Any, Callable, Iterator, Optional
+
+
+class ResultStream:
+    """Iterator over the chunks of query results, for ``%%bigquery --stream``.
+
+    Each chunk is a :class:`pyarrow.RecordBatch` or a
+    :class:`pandas.DataFrame`, depending on the stream format. Chunks are
+    downloaded from the BigQuery Storage API in the background, a bounded
+    number of chunks ahead of the one being processed, so the results never
+    have to fit in memory at once.
+
+    The stream can be consumed only once. Close it, or use it as a context
+    manager, to stop the download before reaching the end:
+
+    >>> with batches:
+    ...     for batch in batches:
+    ...         process(batch)
+    """
+
+    def __init__(
+        self,
+        chunks: Iterator[Any],
+        *,
+        total_rows: Optional[int] = None,
+        on_close: Optional[Callable[[], Any]] = None,
+    ):
+        self._chunks = chunks
+        self._total_rows = total_rows
+        self._on_close = on_close
+        self._closed = False
+        self._lock = threading.Lock()
+
+    @property
+    def total_rows(self) -> Optional[int]:
+        """Optional[int]: Total number of rows in the results, if known."""
+        return self._total_rows
+
+    @property
+    def closed(self) -> bool:
+        """bool: Whether the stream was consumed or closed."""
+        return self._closed
+
+    def __iter__(self) -> "ResultStream":
+        return self
+
+    def __next__(self) -> Any:
+        if self._closed:
+            raise StopIteration
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        """Stops the download and releases its resources."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+
+        close_chunks = getattr(self._chunks, "close", None)
+        try:
+            if close_chunks is not None:
+                close_chunks()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+
+    def __enter__(self) -> "ResultStream":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self) -> str:
+        state = "closed" if self._closed else "open"
+        return f"<ResultStream total_rows={self._total_rows!r} state={state!r}>"
@@ -0,0 +1,414 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Performance statistics for queries run through the magics."""
+
+import collections
+import contextlib
+from dataclasses import dataclass, field
+import datetime
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from bigquery_magics import telemetry
+
+# The statistics of the cell running on the current thread, if any.
+_current = threading.local()
+
+
+@dataclass
+class RunStats:
+    """Statistics about a query run through the ``%%bigquery`` magic.
+
+    The statistics of the most recent run are available as
+    :attr:`bigquery_magics.config.Context.last_run_stats`.
+    """
+
+    job_id: Optional[str] = None
+    """Optional[str]: ID of the query job."""
+
+    query: Optional[str] = None
+    """Optional[str]: The query the cell ran."""
+
+    cell_number: Optional[int] = None
+    """Optional[int]: IPython execution count of the cell."""
+
+    duration: Optional[float] = None
+    """Optional[float]: Time the whole cell took to run, in seconds."""
+
+    api_calls: Optional[int] = None
+    """Optional[int]: Number of BigQuery REST API requests the cell made,
+    such as ``jobs.insert``, ``jobs.get``, ``jobs.getQueryResults`` and
+    ``tabledata.list``. Retries of a request are not counted separately,
+    and BigQuery Storage API calls are not counted.
+    """
+
+    engine: Optional[str] = None
+    """Optional[str]: Engine the query ran with: "pandas" or "bigframes"."""
+
+    project: Optional[str] = None
+    """Optional[str]: Project the query ran in."""
+
+    location: Optional[str] = None
+    """Optional[str]: Location the query ran in, if set."""
+
+    total_bytes_processed: Optional[int] = None
+    """Optional[int]: Number of bytes the query processed."""
+
+    total_bytes_billed: Optional[int] = None
+    """Optional[int]: Number of bytes the query was billed for."""
+
+    slot_millis: Optional[int] = None
+    """Optional[int]: Slot-milliseconds consumed by the query."""
+
+    cache_hit: Optional[bool] = None
+    """Optional[bool]: Whether the query results came from BigQuery's
+    cache.
+    """
+
+    queued_seconds: Optional[float] = None
+    """Optional[float]: Time the query job waited before it started
+    running, according to BigQuery.
+    """
+
+    execution_seconds: Optional[float] = None
+    """Optional[float]: Time the query job ran for, according to BigQuery."""
+
+    rows_downloaded: Optional[int] = None
+    """Optional[int]: Number of rows downloaded."""
+
+    bytes_downloaded: Optional[int] = None
+    """Optional[int]: Size of the downloaded results in memory: the size of
+    their Arrow data, or of the DataFrame they were converted to, not
+    counting Python objects such as strings.
+    """
+
+    timings: Dict[str, float] = field(default_factory=dict)
+    """Dict[str, float]: Seconds spent in each phase of the cell, in the
+    order they ran: ``parse_args``, ``create_clients``, ``submit``,
+    ``wait``, ``download``, ``convert``, ``graph`` and ``store``. Phases that did not
+    run are absent. ``download`` ends once the results have been downloaded
+    as Arrow data, and ``convert`` covers converting them to the output
+    format and dtypes. ``store`` covers saving the result to the destination
+    variable; IPython displays the result after the cell returns, which is
+    not timed.
+    """
+
+    @property
+    def conversion_seconds(self) -> Optional[float]:
+        """Optional[float]: Time spent converting the downloaded results."""
+        return self.timings.get("convert")
+
+    @contextlib.contextmanager
+    def time(self, phase: str) -> Iterator[None]:
+        """Adds the time spent in the ``with`` block to ``phase``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[phase] = self.timings.get(phase, 0.0) + elapsed
+
+    def record_job(self, job: Any):
+        """Records the statistics of a finished query job, or of the results
+        of a ``jobs.query`` call.
+        """
+        self.job_id = getattr(job, "job_id", None) or self.job_id
+        self.total_bytes_processed = _integer(job, "total_bytes_processed")
+        self.total_bytes_billed = _integer(job, "total_bytes_billed")
+        self.slot_millis = _integer(job, "slot_millis")
+        cache_hit = getattr(job, "cache_hit", None)
+        self.cache_hit = cache_hit if isinstance(cache_hit, bool) else None
+
+        created, started, ended = (
+            getattr(job, name, None) for name in ("created", "started", "ended")
+        )
+        if isinstance(created, datetime.datetime) and isinstance(
+            started, datetime.datetime
+        ):
+            self.queued_seconds = (started - created).total_seconds()
+        if isinstance(started, datetime.datetime) and isinstance(
+            ended, datetime.datetime
+        ):
+            self.execution_seconds = (ended - started).total_seconds()
+
+    def record_result(self, result: Any):
+        """Records the size of downloaded results."""
+        self.rows_downloaded = len(result)
+        if hasattr(result, "memory_usage"):
+            # Measuring Python objects would take as long as a copy.
+            self.bytes_downloaded = int(result.memory_usage(deep=False).sum())
+        elif hasattr(result, "estimated_size"):
+            # polars.DataFrame
+            self.bytes_downloaded = int(result.estimated_size())
+        else:
+            # pyarrow.Table
+            self.bytes_downloaded = int(result.nbytes)
+
+    def summary(self) -> str:
+        """Formats the statistics for display."""
+        lines = []
+        if self.timings:
+            phases = ", ".join(
+                f"{phase} {seconds:.3f}s" for phase, seconds in self.timings.items()
+            )
+            total = sum(self.timings.values())
+            lines.append(f"Timings: {phases} (total {total:.3f}s)")
+
+        job = []
+        if self.job_id is not None:
+            job.append(f"job ID {self.job_id}")
+        if self.queued_seconds is not None:
+            job.append(f"queued {self.queued_seconds:.3f}s")
+        if self.execution_seconds is not None:
+            job.append(f"executed in {self.execution_seconds:.3f}s")
+        if self.total_bytes_processed is not None:
+            job.append(f"{self.total_bytes_processed} bytes processed")
+        if self.total_bytes_billed is not None:
+            job.append(f"{self.total_bytes_billed} bytes billed")
+        if self.slot_millis is not None:
+            job.append(f"{self.slot_millis} slot-ms")
+        if self.cache_hit is not None:
+            job.append("cache hit" if self.cache_hit else "cache miss")
+        if job:
+            lines.append(f"Query: {', '.join(job)}")
+
+        if self.rows_downloaded is not None:
+            lines.append(
+                f"Downloaded: {self.rows_downloaded} rows, "
+                f"{self.bytes_downloaded} bytes"
+            )
+        return "\n".join(lines)
+
+
+def _integer(job: Any, name: str) -> Optional[int]:
+    value = getattr(job, name, None)
+    if isinstance(value, bool) or not isinstance(value, int):
+        return None
+    return value
+
+
+# Keys the slowest or most expensive cells can be sorted by, and the
+# RunStats attribute of each.
+SORT_KEYS = {
+    "duration": "duration",
+    "bytes_processed": "total_bytes_processed",
+    "bytes_billed": "total_bytes_billed",
+    "slot_millis": "slot_millis",
+}
+
+
+class SessionStats:
+    """Statistics of the most recent cells run in the session, kept in a
+    ring buffer of at most ``max_size`` cells.
+    """
+
+    def __init__(self, max_size: int = 100):
+        self._lock = threading.Lock()
+        self._runs: collections.deque = collections.deque(maxlen=max_size)
+        self._total_runs = 0
+
+    @property
+    def max_size(self) -> int:
+        """int: Maximum number of cells kept. Older cells are dropped."""
+        return self._runs.maxlen
+
+    @max_size.setter
+    def max_size(self, value: int):
+        with self._lock:
+            if value != self._runs.maxlen:
+                self._runs = collections.deque(self._runs, maxlen=value)
+
+    def add(self, run_stats: RunStats):
+        """Records the statistics of a cell, dropping the oldest cell if the
+        buffer is full.
+        """
+        with self._lock:
+            self._runs.append(run_stats)
+            self._total_runs += 1
+
+    def clear(self):
+        """Forgets all the cells recorded so far."""
+        with self._lock:
+            self._runs.clear()
+            self._total_runs = 0
+
+    def runs(self) -> List[RunStats]:
+        """Returns the statistics of the cells kept, oldest first."""
+        with self._lock:
+            return list(self._runs)
+
+    def top(self, n: int, sort_by: str = "duration") -> List[RunStats]:
+        """Returns the ``n`` cells with the largest ``sort_by`` value, one of
+        :data:`SORT_KEYS`. Cells without that value are left out.
+        """
+        attribute = SORT_KEYS[sort_by]
+        runs = [
+            run_stats
+            for run_stats in self.runs()
+            if getattr(run_stats, attribute) is not None
+        ]
+        runs.sort(key=lambda run_stats: getattr(run_stats, attribute), reverse=True)
+        return runs[:n]
+
+    def summary(self, top: int = 5, sort_by: str = "duration") -> str:
+        """Formats the totals of the cells kept, and the ``top`` cells with
+        the largest ``sort_by`` value, for display.
+        """
+        with self._lock:
+            runs = list(self._runs)
+            total_runs = self._total_runs
+        if not runs:
+            return "No %%bigquery cells have run in this session."
+
+        lines = [f"Cells: {len(runs)}"]
+        if total_runs > len(runs):
+            lines[0] += (
+                f" (the last {len(runs)} of {total_runs}, "
+                "increase bigquery_magics.context.stats_history_size to keep more)"
+            )
+
+        def total(attribute):
+            values = [getattr(run_stats, attribute) for run_stats in runs]
+            values = [value for value in values if value is not None]
+            return sum(values) if values else None
+
+        query = []
+        for attribute, label in (
+            ("total_bytes_processed", "bytes processed"),
+            ("total_bytes_billed", "bytes billed"),
+            ("slot_millis", "slot-ms"),
+        ):
+            value = total(attribute)
+            if value is not None:
+                query.append(f"{value} {label}")
+        cache_hits = [run_stats.cache_hit for run_stats in runs]
+        cache_hits = [hit for hit in cache_hits if hit is not None]
+        if cache_hits:
+            query.append(
+                f"cache hits {sum(cache_hits)}/{len(cache_hits)} "
+                f"({sum(cache_hits) / len(cache_hits):.0%})"
+            )
+        if query:
+            lines.append(f"Query: {', '.join(query)}")
+
+        timings: Dict[str, float] = {}
+        for run_stats in runs:
+            for phase, seconds in run_stats.timings.items():
+                timings[phase] = timings.get(phase, 0.0) + seconds
+        if timings:
+            phases = ", ".join(
+                f"{phase} {seconds:.3f}s" for phase, seconds in timings.items()
+            )
+            lines.append(f"Timings: {phases} (total {sum(timings.values()):.3f}s)")
+
+        rows = total("rows_downloaded")
+        if rows is not None:
+            lines.append(
+                f"Downloaded: {rows} rows, {total('bytes_downloaded') or 0} bytes"
+            )
+
+        slowest = self.top(top, sort_by) if top > 0 else []
+        if slowest:
+            lines.append(f"Top {len(slowest)} cells by {sort_by}:")
+            lines.extend(f"  {_describe(run_stats)}" for run_stats in slowest)
+        return "\n".join(lines)
+
+
+def _describe(run_stats: RunStats) -> str:
+    if run_stats.cell_number is not None:
+        label = f"In [{run_stats.cell_number}]"
+    else:
+        label = "In [ ]"
+
+    details = []
+    if run_stats.duration is not None:
+        details.append(f"{run_stats.duration:.3f}s")
+    if run_stats.total_bytes_processed is not None:
+        details.append(f"{run_stats.total_bytes_processed} bytes processed")
+    if run_stats.total_bytes_billed is not None:
+        details.append(f"{run_stats.total_bytes_billed} bytes billed")
+    if run_stats.slot_millis is not None:
+        details.append(f"{run_stats.slot_millis} slot-ms")
+    if run_stats.job_id is not None:
+        details.append(f"job ID {run_stats.job_id}")
+
+    description = f"{label} {', '.join(details)}"
+    if run_stats.query:
+        query = " ".join(run_stats.query.split())
+        if len(query) > 60:
+            query = query[:57] + "..."
+        description += f": {query}"
+    return description
+
+
+# The statistics of the cells run in the session.
+session_stats = SessionStats()
+
+
+def count_api_requests(client: Any):
+    """Counts the requests made with a BigQuery client in the statistics of
+    the cell running on the calling thread, if any.
+
+    Args:
+        client (google.cloud.bigquery.client.Client): The client to
+            instrument.
+    """
+    call_api = client._call_api
+
+    def counting_call_api(*args, **kwargs):
+        run_stats = current()
+        if run_stats is not None:
+            run_stats.api_calls = (run_stats.api_calls or 0) + 1
+        return call_api(*args, **kwargs)
+
+    client._call_api = counting_call_api
+
+
+def current() -> Optional[RunStats]:
+    """Returns the statistics of the cell running on the current thread, if
+    any.
+    """
+    return getattr(_current, "stats", None)
+
+
+@contextlib.contextmanager
+def recording(stats: RunStats) -> Iterator[RunStats]:
+    """Makes ``stats`` the statistics of the cell running on the current
+    thread in the ``with`` block.
+    """
+    previous = current()
+    _current.stats = stats
+    try:
+        yield stats
+    finally:
+        _current.stats = previous
+
+
+@contextlib.contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """Adds the time spent in the ``with`` block to ``phase`` in the
+    statistics of the current cell, if any, and traces it as an
+    OpenTelemetry span.
+
+    Results downloaded on background threads are not recorded, as their
+    cell has finished running.
+    """
+    stats = current()
+    if stats is None:
+        yield
+        return
+    with telemetry.span(phase), stats.time(phase):
+        yield
@@ -0,0 +1,164 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Optional OpenTelemetry instrumentation of the magics.
+
+Spans and metrics are emitted through the global tracer and meter providers
+of the ``opentelemetry-api`` package. Without that package, or until the
+application configures providers, all of this is a no-op.
+"""
+
+import contextlib
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional
+
+import bigquery_magics.version
+
+if TYPE_CHECKING:
+    from bigquery_magics.stats import RunStats
+
+_INSTRUMENTATION_NAME = "bigquery_magics"
+
+# Histograms of the current meter provider, created once per provider.
+_instruments: Optional[Dict[str, Any]] = None
+_instruments_provider: Any = None
+
+
+def _trace() -> Any:
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        return None
+    return trace
+
+
+def _metrics() -> Any:
+    try:
+        from opentelemetry import metrics
+    except ImportError:
+        return None
+    return metrics
+
+
+@contextlib.contextmanager
+def span(name: str, attributes: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+    """Runs the ``with`` block in a span named ``bigquery_magics.<name>``,
+    child of the current span.
+
+    Yields:
+        The span, or None if OpenTelemetry is not installed.
+    """
+    trace = _trace()
+    if trace is None:
+        yield None
+        return
+
+    tracer = trace.get_tracer(
+        _INSTRUMENTATION_NAME, bigquery_magics.version.__version__
+    )
+    # Exceptions are recorded on the span and set its status to error.
+    with tracer.start_as_current_span(
+        f"{_INSTRUMENTATION_NAME}.{name}", attributes=attributes
+    ) as current_span:
+        yield current_span
+
+
+def _histograms() -> Optional[Dict[str, Any]]:
+    global _instruments, _instruments_provider
+
+    metrics = _metrics()
+    if metrics is None:
+        return None
+
+    provider = metrics.get_meter_provider()
+    if _instruments is None or provider is not _instruments_provider:
+        meter = metrics.get_meter(
+            _INSTRUMENTATION_NAME,
+            bigquery_magics.version.__version__,
+            meter_provider=provider,
+        )
+        _instruments = {
+            "cell": meter.create_histogram(
+                "bigquery_magics.cell.duration",
+                unit="s",
+                description="Duration of %%bigquery cells.",
+            ),
+            "phase": meter.create_histogram(
+                "bigquery_magics.phase.duration",
+                unit="s",
+                description="Duration of each phase of %%bigquery cells.",
+            ),
+            "bytes": meter.create_histogram(
+                "bigquery_magics.download.throughput",
+                unit="By/s",
+                description="Bytes of query results downloaded per second.",
+            ),
+            "rows": meter.create_histogram(
+                "bigquery_magics.download.row_throughput",
+                unit="{row}/s",
+                description="Rows of query results downloaded per second.",
+            ),
+        }
+        _instruments_provider = provider
+    return _instruments
+
+
+def _attributes(run_stats: "RunStats") -> Dict[str, Any]:
+    attributes = {
+        "bigquery_magics.engine": run_stats.engine,
+        "bigquery_magics.project": run_stats.project,
+        "bigquery_magics.location": run_stats.location,
+    }
+    # Attribute values cannot be None.
+    return {key: value for key, value in attributes.items() if value is not None}
+
+
+def record_run(current_span: Any, run_stats: "RunStats", duration: float):
+    """Tags the span of a cell with its statistics, and records its latency
+    and download throughput in histograms.
+
+    Args:
+        current_span (Optional[opentelemetry.trace.Span]): Span of the cell.
+        run_stats: Statistics of the cell.
+        duration: Time the cell took to run, in seconds.
+    """
+    attributes = _attributes(run_stats)
+
+    if current_span is not None and current_span.is_recording():
+        current_span.set_attributes(attributes)
+        result_attributes = {
+            "bigquery_magics.job_id": run_stats.job_id,
+            "bigquery_magics.rows": run_stats.rows_downloaded,
+            "bigquery_magics.bytes": run_stats.bytes_downloaded,
+            "bigquery_magics.bytes_processed": run_stats.total_bytes_processed,
+        }
+        current_span.set_attributes(
+            {key: value for key, value in result_attributes.items() if value}
+        )
+
+    histograms = _histograms()
+    if histograms is None:
+        return
+
+    histograms["cell"].record(duration, attributes)
+    for phase, seconds in run_stats.timings.items():
+        histograms["phase"].record(seconds, {**attributes, "phase": phase})
+
+    download_seconds = run_stats.timings.get("download")
+    if download_seconds and run_stats.rows_downloaded is not None:
+        histograms["rows"].record(
+            run_stats.rows_downloaded / download_seconds, attributes
+        )
+        histograms["bytes"].record(
+            run_stats.bytes_downloaded / download_seconds, attributes
+        )
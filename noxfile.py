@@ -56,6 +56,8 @@ UNIT_TEST_EXTRAS_BY_PYTHON: Dict[str, List[str]] = {
         "bqstorage",
         "bigframes",
         "geopandas",
+        "polars",
+        "opentelemetry",
     ],
     "3.11": [],
     "3.12": [
@@ -66,11 +68,15 @@ UNIT_TEST_EXTRAS_BY_PYTHON: Dict[str, List[str]] = {
         "bqstorage",
         "bigframes",
         "geopandas",
+        "polars",
+        "opentelemetry",
     ],
     "3.14": [
         "bqstorage",
         "bigframes",
         "geopandas",
+        "polars",
+        "opentelemetry",
     ],
 }
 
@@ -93,6 +99,8 @@ SYSTEM_TEST_EXTRAS_BY_PYTHON: Dict[str, List[str]] = {
         "bqstorage",
         "bigframes",
         "geopandas",
+        "polars",
+        "opentelemetry",
     ],
     "3.11": [],
     "3.12": [
@@ -103,11 +111,15 @@ SYSTEM_TEST_EXTRAS_BY_PYTHON: Dict[str, List[str]] = {
         "bqstorage",
         "bigframes",
         "geopandas",
+        "polars",
+        "opentelemetry",
     ],
     "3.14": [
         "bqstorage",
         "bigframes",
         "geopandas",
+        "polars",
+        "opentelemetry",
     ],
 }
 
@@ -329,6 +341,23 @@ def system(session):
         )
 
 
+@nox.session(python=DEFAULT_PYTHON_VERSION)
+def benchmark(session):
+    """Run the performance benchmarks."""
+    constraints_path = str(
+        CURRENT_DIRECTORY / "testing" / f"constraints-{session.python}.txt"
+    )
+    install_unittest_dependencies(session, "-c", constraints_path)
+
+    session.run(
+        "py.test",
+        "--quiet",
+        f"--junitxml=benchmark_{session.python}_sponge_log.xml",
+        os.path.join("tests", "benchmark"),
+        *session.posargs,
+    )
+
+
 @nox.session(python=DEFAULT_PYTHON_VERSION)
 def cover(session):
     """Run the final coverage report.
@@ -57,6 +57,11 @@ extras = {
     ],
     "bigframes": ["bigframes >= 1.17.0"],
     "geopandas": ["geopandas >= 1.0.1"],
+    "polars": ["polars >= 0.20.0"],
+    "opentelemetry": [
+        "opentelemetry-api >= 1.16.0",
+        "opentelemetry-sdk >= 1.16.0",
+    ],
     "spanner-graph-notebook": [
         "spanner-graph-notebook >= 1.1.7",
         "portpicker",
@@ -0,0 +1,370 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Local stand-ins for the BigQuery REST API and the BigQuery Storage API,
+serving synthetic query results, for benchmarks that run offline.
+
+Every query returns the same synthetic table, with as many rows as the
+``num_rows`` of the server. Each API request is counted by method.
+"""
+
+import collections
+from concurrent import futures
+import http.server
+import json
+import re
+import threading
+import urllib.parse
+import uuid
+
+import pyarrow
+import pyarrow.compute
+
+PROJECT = "bench-project"
+DATASET = "_anonymous"
+
+SCHEMA = pyarrow.schema(
+    [
+        ("num", pyarrow.int64()),
+        ("name", pyarrow.string()),
+        ("value", pyarrow.float64()),
+    ]
+)
+REST_SCHEMA = {
+    "fields": [
+        {"name": "num", "type": "INTEGER", "mode": "NULLABLE"},
+        {"name": "name", "type": "STRING", "mode": "NULLABLE"},
+        {"name": "value", "type": "FLOAT", "mode": "NULLABLE"},
+    ]
+}
+
+# Rows of each REST page and of each Arrow record batch.
+REST_PAGE_SIZE = 10_000
+ARROW_BATCH_SIZE = 10_000
+MAX_STREAMS = 4
+
+
+def make_batch(start: int, stop: int) -> pyarrow.RecordBatch:
+    """Returns the synthetic rows ``start`` to ``stop``."""
+    num = pyarrow.array(range(start, stop), pyarrow.int64())
+    name = pyarrow.array([f"name-{i % 1000}" for i in range(start, stop)])
+    value = pyarrow.compute.multiply(num.cast(pyarrow.float64()), 0.5)
+    return pyarrow.record_batch([num, name, value], schema=SCHEMA)
+
+
+def _rest_rows(start: int, stop: int):
+    batch = make_batch(start, stop)
+    columns = [batch.column(index).to_pylist() for index in range(3)]
+    return [{"f": [{"v": str(value)} for value in values]} for values in zip(*columns)]
+
+
+class FakeBigQuery:
+    """Serves the REST API on ``rest_endpoint`` and the Storage API on
+    ``grpc_address``, until :meth:`stop` is called.
+    """
+
+    def __init__(self):
+        self.num_rows = 0
+        self.calls = collections.Counter()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._http_server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0), _make_handler(self)
+        )
+        self._http_server.daemon_threads = True
+        self._http_thread = threading.Thread(
+            target=self._http_server.serve_forever, daemon=True
+        )
+        self._grpc_server = _make_grpc_server(self)
+        self._grpc_port = self._grpc_server.add_insecure_port("127.0.0.1:0")
+
+    @property
+    def rest_endpoint(self) -> str:
+        host, port = self._http_server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def grpc_address(self) -> str:
+        return f"127.0.0.1:{self._grpc_port}"
+
+    def start(self):
+        self._http_thread.start()
+        self._grpc_server.start()
+
+    def stop(self):
+        self._http_server.shutdown()
+        self._http_server.server_close()
+        self._grpc_server.stop(grace=None)
+
+    def count(self, method: str):
+        with self._lock:
+            self.calls[method] += 1
+
+    def reset(self, num_rows: int):
+        """Serves ``num_rows`` rows from now on, and resets the call counts."""
+        with self._lock:
+            self.num_rows = num_rows
+            self.calls.clear()
+
+    def new_job(self, query: str) -> dict:
+        job_id = f"job_{uuid.uuid4().hex}"
+        table_id = f"anon_{job_id}"
+        resource = {
+            "kind": "bigquery#job",
+            "id": f"{PROJECT}:US.{job_id}",
+            "jobReference": {
+                "projectId": PROJECT,
+                "jobId": job_id,
+                "location": "US",
+            },
+            "configuration": {
+                "jobType": "QUERY",
+                "query": {
+                    "query": query,
+                    "useLegacySql": False,
+                    "destinationTable": {
+                        "projectId": PROJECT,
+                        "datasetId": DATASET,
+                        "tableId": table_id,
+                    },
+                },
+            },
+            "status": {"state": "DONE"},
+            "statistics": {
+                "creationTime": "1767225600000",
+                "startTime": "1767225600100",
+                "endTime": "1767225600500",
+                "query": {
+                    "totalBytesProcessed": str(self.num_rows * 24),
+                    "totalSlotMs": "100",
+                    "cacheHit": False,
+                    "statementType": "SELECT",
+                },
+            },
+        }
+        with self._lock:
+            self._jobs[job_id] = (resource, self.num_rows)
+        return resource
+
+    def job(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def query_results(self, job_id: str, params: dict) -> dict:
+        resource, num_rows = self._jobs[job_id]
+        start = int(params.get("pageToken", ["0"])[0])
+        max_results = int(params.get("maxResults", [REST_PAGE_SIZE])[0])
+        stop = min(num_rows, start + min(max_results, REST_PAGE_SIZE))
+        response = {
+            "kind": "bigquery#getQueryResultsResponse",
+            "jobReference": resource["jobReference"],
+            "jobComplete": True,
+            "totalRows": str(num_rows),
+            "schema": REST_SCHEMA,
+            "cacheHit": False,
+            "totalBytesProcessed": resource["statistics"]["query"][
+                "totalBytesProcessed"
+            ],
+        }
+        if max_results:
+            response["rows"] = _rest_rows(start, stop)
+        if max_results and stop < num_rows:
+            response["pageToken"] = str(stop)
+        return response
+
+    def table(self, table_id: str) -> dict:
+        job_id = table_id[len("anon_") :]
+        _, num_rows = self._jobs[job_id]
+        return {
+            "kind": "bigquery#table",
+            "tableReference": {
+                "projectId": PROJECT,
+                "datasetId": DATASET,
+                "tableId": table_id,
+            },
+            "schema": REST_SCHEMA,
+            "numRows": str(num_rows),
+            "numBytes": str(num_rows * 24),
+            "type": "TABLE",
+        }
+
+    def table_rows(self, table_id: str) -> int:
+        return self._jobs[table_id[len("anon_") :]][1]
+
+
+def _make_handler(fake: FakeBigQuery):
+    routes = [
+        ("POST", re.compile(r"/bigquery/v2/projects/[^/]+/jobs$"), "jobs.insert"),
+        ("POST", re.compile(r"/bigquery/v2/projects/[^/]+/queries$"), "jobs.query"),
+        (
+            "GET",
+            re.compile(r"/bigquery/v2/projects/[^/]+/queries/([^/]+)$"),
+            "jobs.getQueryResults",
+        ),
+        ("GET", re.compile(r"/bigquery/v2/projects/[^/]+/jobs/([^/]+)$"), "jobs.get"),
+        (
+            "GET",
+            re.compile(r"/bigquery/v2/projects/[^/]+/datasets/[^/]+/tables/([^/]+)$"),
+            "tables.get",
+        ),
+    ]
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _respond(self, status, body):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _handle(self, http_method):
+            url = urllib.parse.urlsplit(self.path)
+            params = urllib.parse.parse_qs(url.query)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+
+            for route_method, pattern, api_method in routes:
+                match = pattern.match(url.path)
+                if route_method == http_method and match:
+                    break
+            else:
+                fake.count(f"{http_method} {url.path}")
+                return self._respond(404, {"error": {"code": 404}})
+
+            fake.count(api_method)
+            if api_method == "jobs.insert":
+                query = body["configuration"]["query"]["query"]
+                return self._respond(200, fake.new_job(query))
+            if api_method == "jobs.query":
+                job_id = fake.new_job(body["query"])["jobReference"]["jobId"]
+                if "maxResults" in body:
+                    params["maxResults"] = [str(body["maxResults"])]
+                return self._respond(200, fake.query_results(job_id, params))
+
+            (resource_id,) = match.groups()
+            if api_method == "tables.get":
+                return self._respond(200, fake.table(resource_id))
+            job = fake.job(resource_id)
+            if job is None:
+                return self._respond(404, {"error": {"code": 404}})
+            if api_method == "jobs.get":
+                return self._respond(200, job[0])
+            return self._respond(200, fake.query_results(resource_id, params))
+
+        def do_GET(self):
+            self._handle("GET")
+
+        def do_POST(self):
+            self._handle("POST")
+
+    return Handler
+
+
+def _make_grpc_server(fake: FakeBigQuery):
+    import grpc
+    from google.cloud.bigquery_storage_v1 import types
+
+    def create_read_session(request, context):
+        fake.count("CreateReadSession")
+        read_session = request.read_session
+        table_id = read_session.table.rsplit("/", 1)[-1]
+        num_rows = fake.table_rows(table_id)
+        num_batches = -(-num_rows // ARROW_BATCH_SIZE)
+        max_streams = request.max_stream_count or MAX_STREAMS
+        num_streams = max(1, min(max_streams, MAX_STREAMS, num_batches))
+        session_name = f"projects/{PROJECT}/locations/us/sessions/{table_id}"
+        return types.ReadSession(
+            name=session_name,
+            table=read_session.table,
+            data_format=types.DataFormat.ARROW,
+            arrow_schema=types.ArrowSchema(
+                serialized_schema=SCHEMA.serialize().to_pybytes()
+            ),
+            streams=[
+                types.ReadStream(name=f"{session_name}/streams/{index}/{num_streams}")
+                for index in range(num_streams)
+            ],
+            estimated_row_count=num_rows,
+        )
+
+    def read_rows(request, context):
+        fake.count("ReadRows")
+        session_name, stream = request.read_stream.split("/streams/")
+        index, num_streams = map(int, stream.split("/"))
+        num_rows = fake.table_rows(session_name.rsplit("/", 1)[-1])
+        # Streams take turns serving the batches, skipping the rows that were
+        # already read when resuming at an offset.
+        skip = request.offset
+        # Like the real API, the first response carries the schema.
+        arrow_schema = types.ArrowSchema(
+            serialized_schema=SCHEMA.serialize().to_pybytes()
+        )
+        for start in range(
+            index * ARROW_BATCH_SIZE, num_rows, num_streams * ARROW_BATCH_SIZE
+        ):
+            batch = make_batch(start, min(num_rows, start + ARROW_BATCH_SIZE))
+            if skip >= batch.num_rows:
+                skip -= batch.num_rows
+                continue
+            batch, skip = batch.slice(skip), 0
+            yield types.ReadRowsResponse(
+                arrow_record_batch=types.ArrowRecordBatch(
+                    serialized_record_batch=batch.serialize().to_pybytes(),
+                    row_count=batch.num_rows,
+                ),
+                row_count=batch.num_rows,
+                arrow_schema=arrow_schema,
+            )
+            arrow_schema = None
+
+    def handler(method, request_type, response_type, streaming=False):
+        make_handler = (
+            grpc.unary_stream_rpc_method_handler
+            if streaming
+            else grpc.unary_unary_rpc_method_handler
+        )
+        return make_handler(
+            method,
+            request_deserializer=request_type.deserialize,
+            response_serializer=response_type.serialize,
+        )
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=16))
+    server.add_generic_rpc_handlers(
+        (
+            grpc.method_handlers_generic_handler(
+                "google.cloud.bigquery.storage.v1.BigQueryRead",
+                {
+                    "CreateReadSession": handler(
+                        create_read_session,
+                        types.CreateReadSessionRequest,
+                        types.ReadSession,
+                    ),
+                    "ReadRows": handler(
+                        read_rows,
+                        types.ReadRowsRequest,
+                        types.ReadRowsResponse,
+                        streaming=True,
+                    ),
+                },
+            ),
+        )
+    )
+    return server
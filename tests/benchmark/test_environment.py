@@ -0,0 +1,94 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Overhead benchmarks for environment detection.
+
+Environment detection runs every time a client is created, so it must stay
+cheap after the first probe.
+"""
+
+import time
+from unittest import mock
+
+import pytest
+
+from bigquery_magics import core, environment
+
+# Generous upper bounds, to catch regressions rather than to measure noise.
+MAX_COLD_PROBE_SECONDS = 0.5
+MAX_WARM_CALL_SECONDS = 20e-6
+WARM_CALLS = 10_000
+
+
+def _clear_cache():
+    core._get_user_agent.cache_clear()
+    environment._is_vscode_extension_installed.cache_clear()
+    environment._is_package_installed.cache_clear()
+
+
+@pytest.fixture
+def vscode_home(tmp_path, monkeypatch):
+    """A home directory with many VS Code extensions installed."""
+    extensions_dir = tmp_path / ".vscode" / "extensions"
+    for index in range(200):
+        extension_dir = extensions_dir / f"publisher{index}.extension-1.0.{index}"
+        extension_dir.mkdir(parents=True)
+        (extension_dir / "package.json").write_text("{}")
+
+    monkeypatch.setenv("VSCODE_PID", "1234")
+    monkeypatch.delenv("JPY_PARENT_PID", raising=False)
+    with mock.patch("pathlib.Path.home", return_value=tmp_path):
+        _clear_cache()
+        yield tmp_path
+    _clear_cache()
+
+
+@pytest.fixture
+def jupyter_env(monkeypatch):
+    monkeypatch.setenv("JPY_PARENT_PID", "1234")
+    monkeypatch.delenv("VSCODE_PID", raising=False)
+    _clear_cache()
+    yield
+    _clear_cache()
+
+
+def _time_user_agent(record_property):
+    start = time.perf_counter()
+    core._get_user_agent()
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(WARM_CALLS):
+        core._get_user_agent()
+    warm = (time.perf_counter() - start) / WARM_CALLS
+
+    record_property("cold_probe_seconds", cold)
+    record_property("warm_call_seconds", warm)
+    return cold, warm
+
+
+@pytest.mark.usefixtures("vscode_home")
+def test_user_agent_overhead_vscode(record_property):
+    cold, warm = _time_user_agent(record_property)
+
+    assert cold < MAX_COLD_PROBE_SECONDS
+    assert warm < MAX_WARM_CALL_SECONDS
+
+
+@pytest.mark.usefixtures("jupyter_env")
+def test_user_agent_overhead_jupyter(record_property):
+    cold, warm = _time_user_agent(record_property)
+
+    assert cold < MAX_COLD_PROBE_SECONDS
+    assert warm < MAX_WARM_CALL_SECONDS
@@ -0,0 +1,67 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Import time benchmarks for ``%load_ext bigquery_magics``."""
+
+import statistics
+import subprocess
+import sys
+
+# Generous upper bound on the time loading the extension adds to a kernel
+# where IPython is already imported.
+MAX_LOAD_EXTENSION_SECONDS = 0.25
+RUNS = 5
+
+PRELOAD_CODE = "import IPython.core.interactiveshell"
+LOAD_EXTENSION_CODE = """
+from IPython.core.interactiveshell import InteractiveShell
+
+ip = InteractiveShell.instance()
+ip.extension_manager.load_extension("bigquery_magics")
+"""
+
+
+def _cumulative_import_seconds(code):
+    """Returns the cumulative import time per top-level module, using
+    ``python -X importtime``.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit() or name.startswith("  "):
+            # Skip the header, and modules imported by other modules.
+            continue
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def _load_extension_seconds():
+    preloaded = _cumulative_import_seconds(PRELOAD_CODE)
+    loaded = _cumulative_import_seconds(PRELOAD_CODE + LOAD_EXTENSION_CODE)
+    return sum(seconds for name, seconds in loaded.items() if name not in preloaded)
+
+
+def test_load_extension_import_time(record_property):
+    seconds = statistics.median(_load_extension_seconds() for _ in range(RUNS))
+    record_property("load_extension_import_seconds", seconds)
+
+    assert seconds < MAX_LOAD_EXTENSION_SECONDS
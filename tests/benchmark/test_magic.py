@@ -0,0 +1,193 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""End-to-end benchmarks of ``%%bigquery`` against a local fake BigQuery.
+
+Each case runs a query returning a number of synthetic rows, downloaded with
+the BigQuery Storage API or the REST API, and measures the time the cell
+takes, its throughput, its peak memory and the API requests it makes.
+
+Wall time depends too much on the machine and its load to be asserted, so the
+timings are only reported, together with the time relative to a one-row query
+with the same options in the same run, which discounts the speed of the
+machine. The API requests and the peak memory are compared to the baselines
+in ``baselines.json``. Record new baselines with::
+
+    nox -s benchmark -- --update-baselines
+"""
+
+import gc
+import json
+import pathlib
+import statistics
+import time
+import tracemalloc
+
+from IPython.testing import globalipapp
+from google.auth.credentials import AnonymousCredentials
+import pytest
+
+import bigquery_magics
+
+pytest.importorskip("google.cloud.bigquery_storage_v1")
+pytest.importorskip("pyarrow")
+
+from . import fake_bigquery  # noqa: E402
+
+BASELINES_PATH = pathlib.Path(__file__).parent / "baselines.json"
+
+# A generous bound, to catch regressions rather than to measure noise.
+MAX_MEMORY_GROWTH = 1.5
+RUNS = 3
+
+CASES = [
+    pytest.param("", 1, id="bqstorage-1"),
+    pytest.param("", 10_000, id="bqstorage-10k"),
+    pytest.param("", 100_000, id="bqstorage-100k"),
+    pytest.param("", 1_000_000, id="bqstorage-1m"),
+    pytest.param("--use_rest_api", 1, id="rest-1"),
+    pytest.param("--use_rest_api", 10_000, id="rest-10k"),
+    pytest.param("--use_rest_api", 100_000, id="rest-100k"),
+    pytest.param("--output arrow", 1_000_000, id="bqstorage-arrow-1m"),
+]
+
+
+@pytest.fixture(scope="module")
+def fake():
+    import grpc
+    from google.cloud.bigquery_storage_v1.services.big_query_read.transports import (
+        grpc as read_transports,
+    )
+
+    server = fake_bigquery.FakeBigQuery()
+    server.start()
+
+    def create_channel(cls, host=None, **kwargs):
+        # The fake server does not use TLS.
+        return grpc.insecure_channel(
+            server.grpc_address,
+            options=[("grpc.max_receive_message_length", -1)],
+        )
+
+    context = bigquery_magics.context
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(
+            read_transports.BigQueryReadGrpcTransport,
+            "create_channel",
+            classmethod(create_channel),
+        )
+        monkeypatch.setattr(context, "_credentials", AnonymousCredentials())
+        monkeypatch.setattr(context, "_project", fake_bigquery.PROJECT)
+        monkeypatch.setattr(context, "progress_bar_type", None)
+        monkeypatch.setattr(context, "use_client_cache", False)
+        yield server
+    server.stop()
+
+
+@pytest.fixture(scope="module")
+def ip():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    return ip
+
+
+@pytest.fixture(scope="module")
+def reference_seconds(ip, fake):
+    """Returns the median time of a one-row query with the given options,
+    measured once per module.
+    """
+    measured = {}
+
+    def measure(line):
+        if line not in measured:
+            _run_cell(ip, fake, line, 1)
+            measured[line] = _median_seconds(ip, fake, line, 1)
+        return measured[line]
+
+    return measure
+
+
+@pytest.fixture(scope="module")
+def baselines(request):
+    stored = json.loads(BASELINES_PATH.read_text()) if BASELINES_PATH.exists() else {}
+    measured = {}
+    yield stored, measured
+    if request.config.getoption("--update-baselines"):
+        BASELINES_PATH.write_text(
+            json.dumps({**stored, **measured}, indent=2, sort_keys=True) + "\n"
+        )
+
+
+def _run_cell(ip, fake, line, num_rows):
+    fake.reset(num_rows)
+    line = f"{line} --bigquery_api_endpoint {fake.rest_endpoint}"
+    start = time.perf_counter()
+    result = ip.run_cell_magic("bigquery", line, "SELECT * FROM benchmark")
+    seconds = time.perf_counter() - start
+    assert len(result) == num_rows
+    return seconds, dict(fake.calls)
+
+
+def _median_seconds(ip, fake, line, num_rows):
+    return statistics.median(
+        _run_cell(ip, fake, line, num_rows)[0] for _ in range(RUNS)
+    )
+
+
+@pytest.mark.parametrize(("line", "num_rows"), CASES)
+def test_magic(
+    request,
+    ip,
+    fake,
+    baselines,
+    reference_seconds,
+    record_property,
+    line,
+    num_rows,
+):
+    reference = reference_seconds(line)
+    # Warm up, so that imports and client creation are not measured.
+    _run_cell(ip, fake, line, num_rows)
+    seconds = _median_seconds(ip, fake, line, num_rows)
+    api_calls = dict(fake.calls)
+
+    # Collect the garbage of the earlier runs, which is not part of the peak.
+    gc.collect()
+    tracemalloc.start()
+    try:
+        _run_cell(ip, fake, line, num_rows)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    measurements = {
+        "seconds": seconds,
+        "rows_per_second": num_rows / seconds,
+        "relative_seconds": seconds / reference,
+        "peak_memory_bytes": peak_memory,
+        "api_calls": api_calls,
+    }
+    for name, value in measurements.items():
+        record_property(name, value)
+
+    stored, measured = baselines
+    case_id = request.node.callspec.id
+    measured[case_id] = measurements
+    baseline = stored.get(case_id)
+    if baseline is None or request.config.getoption("--update-baselines"):
+        return
+
+    assert api_calls == baseline["api_calls"]
+    assert peak_memory <= baseline["peak_memory_bytes"] * MAX_MEMORY_GROWTH
@@ -19,6 +19,38 @@ import pytest
 import test_utils.imports  # google-cloud-testutils
 
 import bigquery_magics
+from bigquery_magics import core, environment
+from bigquery_magics.client_pool import client_pool
+from bigquery_magics.disk_cache import disk_cache
+from bigquery_magics.result_cache import destination_tables, result_cache
+
+
+@pytest.fixture(autouse=True)
+def reset_client_pool():
+    """Make sure that pooled clients do not leak mocks between tests."""
+    client_pool.close()
+    yield
+    client_pool.close()
+
+
+@pytest.fixture(autouse=True)
+def clear_result_cache():
+    """Make sure that each test runs its queries instead of reusing results."""
+    result_cache.clear()
+    disk_cache.clear()
+    destination_tables.clear()
+    yield
+    result_cache.clear()
+    disk_cache.clear()
+    destination_tables.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_environment_cache():
+    """Make sure that each test detects the environment it sets up."""
+    core._get_user_agent.cache_clear()
+    environment._is_vscode_extension_installed.cache_clear()
+    environment._is_package_installed.cache_clear()
 
 
 @pytest.fixture()
@@ -15,12 +15,15 @@
 from concurrent import futures
 import contextlib
 import copy
+import datetime
 import json
 import os
 import pathlib
 import re
 import sys
 import tempfile
+import threading
+import time
 from unittest import mock
 import warnings
 
@@ -36,11 +39,17 @@ import google.cloud.bigquery._http
 import google.cloud.bigquery.exceptions
 from google.cloud.bigquery.retry import DEFAULT_TIMEOUT
 import pandas
+import pyarrow
+import pyarrow.ipc
+import pyarrow.parquet
 import pytest
 
 import bigquery_magics
 import bigquery_magics.bigquery as magics
+from bigquery_magics import stats
 import bigquery_magics.graph_server as graph_server
+from bigquery_magics.disk_cache import disk_cache
+from bigquery_magics.result_cache import destination_tables, result_cache
 
 try:
     import google.cloud.bigquery_storage as bigquery_storage
@@ -143,7 +152,6 @@ def test_context_with_default_connection():
         path=f"/projects/{PROJECT_ID}/queries/{JOB_ID}",
         query_params=mock.ANY,
         timeout=mock.ANY,
-        headers=mock.ANY,
     )
     default_conn.api_request.assert_has_calls([begin_call, query_results_call])
 
@@ -177,6 +185,9 @@ def test_context_with_custom_connection():
 
     list_rows.assert_called()
     default_conn.api_request.assert_not_called()
+    # Every request made through the client is counted.
+    run_stats = bigquery_magics.context.last_run_stats
+    assert run_stats.api_calls == context_conn.api_request.call_count
     begin_call = mock.call(
         method="POST",
         path="/projects/project-from-env/jobs",
@@ -188,7 +199,6 @@ def test_context_with_custom_connection():
         path=f"/projects/{PROJECT_ID}/queries/{JOB_ID}",
         query_params=mock.ANY,
         timeout=mock.ANY,
-        headers=mock.ANY,
     )
     context_conn.api_request.assert_has_calls([begin_call, query_results_call])
 
@@ -198,13 +208,9 @@ def test__run_query():
 
     job_id = "job_1234"
     sql = "SELECT 17"
-    responses = [
-        futures.TimeoutError,
-        futures.TimeoutError,
-        [table.Row((17,), {"num": 0})],
-    ]
+    responses = [[table.Row((17,), {"num": 0})]]
 
-    client_patch = mock.patch("bigquery_magics.bigquery.bigquery.Client", autospec=True)
+    client_patch = mock.patch("google.cloud.bigquery.Client", autospec=True)
     with client_patch as client_mock, io.capture_output() as captured:
         client_mock().query(sql).result.side_effect = responses
         client_mock().query(sql).job_id = job_id
@@ -219,17 +225,83 @@ def test__run_query():
     expected_first_line = "Executing query with job ID: {}".format(job_id)
     assert updates[0] == expected_first_line
     execution_updates = updates[1:-1]
-    assert len(execution_updates) == 3  # one update per API response
+    # Updates are printed on a timer rather than once per API response.
+    assert len(execution_updates) >= 1
     for line in execution_updates:
         assert re.match("Query executing: .*s", line)
 
 
+def test__run_query_waits_with_server_long_polls(monkeypatch):
+    bigquery_magics.context._credentials = None
+    monkeypatch.setattr(bigquery_magics.context, "last_run_stats", None)
+
+    sql = "SELECT 17"
+
+    client_patch = mock.patch("google.cloud.bigquery.Client", autospec=True)
+    with client_patch as client_mock, io.capture_output():
+        query_job = client_mock().query(sql)
+        query_job.result.return_value = [table.Row((17,), {"num": 0})]
+        query_job.job_id = "job_1234"
+
+        magics._run_query(client_mock(), sql)
+
+    # A client-side timeout would abort the long polls of the client library.
+    query_job.result.assert_called_once_with()
+    # Statistics are only recorded for cells.
+    assert bigquery_magics.context.last_run_stats is None
+
+
+def test__run_query_records_job_of_current_cell():
+    bigquery_magics.context._credentials = None
+
+    sql = "SELECT 17"
+
+    client_patch = mock.patch("google.cloud.bigquery.Client", autospec=True)
+    run_stats = stats.RunStats()
+    with client_patch as client_mock, io.capture_output():
+        query_job = client_mock().query(sql)
+        query_job.result.return_value = [table.Row((17,), {"num": 0})]
+        query_job.job_id = "job_1234"
+
+        with stats.recording(run_stats):
+            magics._run_query(client_mock(), sql)
+
+    assert run_stats.job_id == "job_1234"
+    assert list(run_stats.timings) == ["submit", "wait"]
+
+
+def test__run_query_updates_status_while_polling(monkeypatch):
+    bigquery_magics.context._credentials = None
+    monkeypatch.setattr(magics, "_STATUS_UPDATE_INTERVAL", 0.01)
+    monkeypatch.setattr(bigquery_magics.context, "last_run_stats", None)
+
+    sql = "SELECT 17"
+
+    def slow_result(timeout=None):
+        time.sleep(0.1)
+        return [table.Row((17,), {"num": 0})]
+
+    client_patch = mock.patch("google.cloud.bigquery.Client", autospec=True)
+    with client_patch as client_mock, io.capture_output() as captured:
+        query_job = client_mock().query(sql)
+        query_job.result.side_effect = slow_result
+        query_job.job_id = "job_1234"
+
+        magics._run_query(client_mock(), sql)
+
+    lines = re.split("\n|\r", captured.stdout)
+    execution_updates = [line for line in lines if line.startswith("Query executing")]
+    # A single long poll, but the elapsed time kept being updated.
+    assert query_job.result.call_count == 1
+    assert len(execution_updates) > 2
+
+
 def test__run_query_dry_run_without_errors_is_silent():
     bigquery_magics.context._credentials = None
 
     sql = "SELECT 17"
 
-    client_patch = mock.patch("bigquery_magics.bigquery.bigquery.Client", autospec=True)
+    client_patch = mock.patch("google.cloud.bigquery.Client", autospec=True)
 
     job_config = job.QueryJobConfig()
     job_config.dry_run = True
@@ -332,7 +404,7 @@ def test__create_dataset_if_necessary_exists():
     dataset_id = "dataset_id"
     dataset_reference = bigquery.dataset.DatasetReference(project, dataset_id)
     dataset = bigquery.Dataset(dataset_reference)
-    client_patch = mock.patch("bigquery_magics.bigquery.bigquery.Client", autospec=True)
+    client_patch = mock.patch("google.cloud.bigquery.Client", autospec=True)
     with client_patch as client_mock:
         client = client_mock()
         client.project = project
@@ -344,7 +416,7 @@ def test__create_dataset_if_necessary_exists():
 def test__create_dataset_if_necessary_not_exist():
     project = "project_id"
     dataset_id = "dataset_id"
-    client_patch = mock.patch("bigquery_magics.bigquery.bigquery.Client", autospec=True)
+    client_patch = mock.patch("google.cloud.bigquery.Client", autospec=True)
     with client_patch as client_mock:
         client = client_mock()
         client.location = "us"
@@ -368,6 +440,97 @@ def test_extension_load(magic_name):
     assert magic.__module__ == "bigquery_magics.bigquery"
 
 
+def test_extension_load_does_not_warm_up_by_default():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+
+    with mock.patch(
+        "bigquery_magics.bigquery._start_warm_up", autospec=True
+    ) as start_warm_up:
+        bigquery_magics.load_ipython_extension(ip)
+
+    start_warm_up.assert_not_called()
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_extension_load_with_warm_up_creates_pooled_clients(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    monkeypatch.setattr(bigquery_magics.context, "warm_up_on_load", True)
+    monkeypatch.setattr(magics, "_is_bigquery_storage_installed", lambda: False)
+
+    bigquery_magics.load_ipython_extension(ip)
+    magics.warm_up_thread.join(timeout=10)
+    assert not magics.warm_up_thread.is_alive()
+
+    run_query_patch = mock.patch("bigquery_magics.bigquery._run_query", autospec=True)
+    client_patch = mock.patch("google.cloud.bigquery.Client", autospec=True)
+    with run_query_patch as run_query_mock, client_patch as client_mock:
+        ip.run_cell_magic("bigquery", "", "SELECT 17 as num")
+
+    # The client created during warm up is used by the first query.
+    client_mock.assert_not_called()
+    client_used = run_query_mock.call_args_list[0][0][0]
+    assert isinstance(client_used, bigquery.Client)
+    assert client_used.project == "test-project"
+
+
+def test__warm_up_refreshes_invalid_credentials(monkeypatch):
+    credentials = mock.create_autospec(
+        google.auth.credentials.Credentials, instance=True
+    )
+    credentials.valid = False
+    monkeypatch.setattr(bigquery_magics.context, "_project", "test-project")
+    monkeypatch.setattr(bigquery_magics.context, "_credentials", credentials)
+    monkeypatch.setattr(bigquery_magics.context, "reuse_clients", False)
+
+    with mock.patch(
+        "bigquery_magics.bigquery._create_clients", autospec=True
+    ) as create_clients:
+        magics._warm_up()
+
+    credentials.refresh.assert_called_once()
+    create_clients.assert_not_called()
+
+
+def test__warm_up_and_background_refresh_fetch_one_token(monkeypatch):
+    credentials = mock.Mock(spec=["token", "expiry", "valid", "refresh"])
+    credentials.token = None
+    credentials.expiry = None
+    credentials.valid = False
+
+    def slow_refresh(request):
+        time.sleep(0.1)
+        credentials.token = "token"
+        credentials.valid = True
+
+    credentials.refresh.side_effect = slow_refresh
+    monkeypatch.setattr(bigquery_magics.context, "_project", "test-project")
+    monkeypatch.setattr(bigquery_magics.context, "_credentials", credentials)
+    monkeypatch.setattr(bigquery_magics.context, "reuse_clients", False)
+
+    # The background refresh of new default credentials starts right away.
+    refresh = threading.Thread(
+        target=bigquery_magics.context._refresh_token, args=(credentials, None)
+    )
+    refresh.start()
+    magics._warm_up()
+    refresh.join()
+
+    credentials.refresh.assert_called_once()
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test__warm_up_ignores_errors():
+    create_clients_patch = mock.patch(
+        "bigquery_magics.bigquery._create_clients", autospec=True, side_effect=OSError
+    )
+    with create_clients_patch as create_clients:
+        magics._warm_up()
+
+    create_clients.assert_called_once()
+
+
 @pytest.mark.skipif(
     bigquery_storage is None, reason="Requires `google-cloud-bigquery-storage`"
 )
@@ -1443,26 +1606,28 @@ def test_bigquery_magic_default_connection_user_agent_jupyter_plugin():
     conn_patch = mock.patch("google.cloud.bigquery.client.Connection", autospec=True)
     env_patch = mock.patch.dict(os.environ, {"JPY_PARENT_PID": "1234"}, clear=True)
 
-    def custom_import_module_side_effect(name, package=None):
+    import importlib.util
+
+    find_spec = importlib.util.find_spec
+
+    def custom_find_spec_side_effect(name, package=None):
         if name == "bigquery_jupyter_plugin":
             return mock.MagicMock()
         else:
-            import importlib
-
-            return importlib.import_module(name, package)
+            return find_spec(name, package)
 
     assert isinstance(
-        custom_import_module_side_effect("bigquery_jupyter_plugin"), mock.MagicMock
+        custom_find_spec_side_effect("bigquery_jupyter_plugin"), mock.MagicMock
     )
-    assert custom_import_module_side_effect("bigquery_magics") is bigquery_magics
+    assert custom_find_spec_side_effect("bigquery_magics") is not None
 
-    extension_import_patch = mock.patch(
-        "importlib.import_module", side_effect=custom_import_module_side_effect
+    extension_find_spec_patch = mock.patch(
+        "importlib.util.find_spec", side_effect=custom_find_spec_side_effect
     )
 
     with conn_patch as conn, (
         run_query_patch
-    ), default_patch, env_patch, extension_import_patch:
+    ), default_patch, env_patch, extension_find_spec_patch:
         ip.run_cell_magic("bigquery", "", "SELECT 17 as num")
 
     client_info_arg = conn.call_args[1].get("client_info")
@@ -1771,229 +1936,2430 @@ def test_bigquery_magic_with_use_geodataframe():
     assert isinstance(return_value, gpd.GeoDataFrame)
 
 
-def test_bigquery_magic_w_max_results_query_job_results_fails():
+@pytest.mark.usefixtures("mock_credentials")
+@pytest.mark.parametrize(
+    ("line", "max_results"),
+    [
+        pytest.param("--use_query_and_wait", None, id="cell-flag"),
+        pytest.param("--use_query_and_wait --max_results=5", 5, id="max-results"),
+    ],
+)
+def test_bigquery_magic_with_use_query_and_wait(line, max_results):
     globalipapp.start_ipython()
     ip = globalipapp.get_ipython()
     ip.extension_manager.load_extension("bigquery_magics")
-    bigquery_magics.context._project = None
 
-    credentials_mock = mock.create_autospec(
-        google.auth.credentials.Credentials, instance=True
-    )
-    default_patch = mock.patch(
-        "google.auth.default", return_value=(credentials_mock, "general-project")
-    )
-    client_query_patch = mock.patch(
-        "google.cloud.bigquery.client.Client.query", autospec=True
-    )
-    close_transports_patch = mock.patch(
-        "bigquery_magics.bigquery._close_transports",
+    rows_mock = mock.create_autospec(table.RowIterator, instance=True)
+    rows_mock.job_id = None
+    rows_mock.query_id = "some-query-id"
+    result = pandas.DataFrame([17], columns=["num"])
+    rows_mock.to_dataframe.return_value = result
+
+    job_creation_modes = []
+
+    def query_and_wait(client, query, **kwargs):
+        job_creation_modes.append(client.default_job_creation_mode)
+        return rows_mock
+
+    query_and_wait_patch = mock.patch(
+        "google.cloud.bigquery.Client.query_and_wait",
         autospec=True,
+        side_effect=query_and_wait,
     )
+    client_query_patch = mock.patch("google.cloud.bigquery.Client.query", autospec=True)
 
     sql = "SELECT 17 AS num"
+    with query_and_wait_patch as query_and_wait, (
+        client_query_patch
+    ) as client_query, io.capture_output() as captured_io:
+        return_value = ip.run_cell_magic("bigquery", line, sql)
 
-    query_job_mock = mock.create_autospec(
-        google.cloud.bigquery.job.QueryJob, instance=True
+    client_query.assert_not_called()
+    query_and_wait.assert_called_once_with(
+        mock.ANY, sql, job_config=mock.ANY, max_results=max_results
     )
-    query_job_mock.result.side_effect = [[], OSError]
-
-    with pytest.raises(
-        OSError
-    ), client_query_patch as client_query_mock, (
-        default_patch
-    ), close_transports_patch as close_transports:
-        client_query_mock.return_value = query_job_mock
-        ip.run_cell_magic("bigquery", "--max_results=5", sql)
-
-    assert close_transports.called
+    assert job_creation_modes == ["JOB_CREATION_OPTIONAL"]
+    # The setting is not left on the client, which may be used by other cells.
+    client_used = query_and_wait.call_args[0][0]
+    assert client_used.default_job_creation_mode is None
+    assert "some-query-id" in captured_io.stdout
+    assert return_value is result
 
 
-def test_bigquery_magic_w_table_id_invalid():
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_with_use_query_and_wait_not_cached():
     globalipapp.start_ipython()
     ip = globalipapp.get_ipython()
     ip.extension_manager.load_extension("bigquery_magics")
-    bigquery_magics.context._project = None
 
-    credentials_mock = mock.create_autospec(
-        google.auth.credentials.Credentials, instance=True
-    )
-    default_patch = mock.patch(
-        "google.auth.default", return_value=(credentials_mock, "general-project")
+    rows_mock = mock.create_autospec(table.RowIterator, instance=True)
+    rows_mock.job_id = "job_1234"
+    rows_mock.to_dataframe.return_value = pandas.DataFrame([17], columns=["num"])
+    query_and_wait_patch = mock.patch(
+        "google.cloud.bigquery.Client.query_and_wait",
+        autospec=True,
+        return_value=rows_mock,
     )
+    with query_and_wait_patch as query_and_wait, io.capture_output():
+        ip.run_cell_magic("bigquery", "--use_query_and_wait", "SELECT num FROM ds.t")
+        ip.run_cell_magic("bigquery", "--use_query_and_wait", "SELECT num FROM ds.t")
 
-    list_rows_patch = mock.patch(
-        "bigquery_magics.bigquery.bigquery.Client.list_rows",
+    # The response does not list the referenced tables needed to validate
+    # cached results.
+    assert query_and_wait.call_count == 2
+    assert result_cache.stats()["entries"] == 0
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_with_use_query_and_wait_from_context(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "use_query_and_wait", True)
+
+    rows_mock = mock.create_autospec(table.RowIterator, instance=True)
+    rows_mock.job_id = JOB_ID
+    query_and_wait_patch = mock.patch(
+        "google.cloud.bigquery.Client.query_and_wait",
         autospec=True,
-        side_effect=exceptions.BadRequest("Not a valid table ID"),
+        return_value=rows_mock,
     )
+    run_query_patch = mock.patch("bigquery_magics.bigquery._run_query", autospec=True)
 
-    table_id = "not-a-real-table"
-
-    with list_rows_patch, default_patch, io.capture_output() as captured_io:
-        ip.run_cell_magic("bigquery", "df", table_id)
+    with query_and_wait_patch as query_and_wait, run_query_patch as run_query:
+        ip.run_cell_magic("bigquery", "", "SELECT 17 AS num")
 
-    output = captured_io.stderr
-    assert "Could not save output to variable" in output
-    assert "400 Not a valid table ID" in output
-    assert "Traceback (most recent call last)" not in output
+    query_and_wait.assert_called_once()
+    run_query.assert_not_called()
+    rows_mock.to_dataframe.assert_called_once()
 
 
-def test_bigquery_magic_w_missing_query():
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_with_use_query_and_wait_dry_run_uses_job(monkeypatch):
     globalipapp.start_ipython()
     ip = globalipapp.get_ipython()
     ip.extension_manager.load_extension("bigquery_magics")
-    bigquery_magics.context._project = None
+    monkeypatch.setattr(bigquery_magics.context, "use_query_and_wait", True)
 
-    credentials_mock = mock.create_autospec(
-        google.auth.credentials.Credentials, instance=True
-    )
-    default_patch = mock.patch(
-        "google.auth.default", return_value=(credentials_mock, "general-project")
+    query_and_wait_patch = mock.patch(
+        "google.cloud.bigquery.Client.query_and_wait", autospec=True
     )
+    run_query_patch = mock.patch("bigquery_magics.bigquery._run_query", autospec=True)
 
-    cell_body = "   \n    \n   \t\t  \n  "
-
-    with io.capture_output() as captured_io, default_patch:
-        ip.run_cell_magic("bigquery", "df", cell_body)
+    with query_and_wait_patch as query_and_wait, run_query_patch as run_query:
+        ip.run_cell_magic("bigquery", "--dry_run", "SELECT 17 AS num")
 
-    output = captured_io.stderr
-    assert "Could not save output to variable" in output
-    assert "Query is missing" in output
-    assert "Traceback (most recent call last)" not in output
+    query_and_wait.assert_not_called()
+    run_query.assert_called_once()
 
 
-def test_bigquery_magic_w_table_id_and_default_variable(
-    ipython_ns_cleanup, monkeypatch
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_with_use_query_and_wait_without_job_creation_mode(
+    monkeypatch,
 ):
     globalipapp.start_ipython()
     ip = globalipapp.get_ipython()
     ip.extension_manager.load_extension("bigquery_magics")
-    bigquery_magics.context._project = None
-    monkeypatch.setattr(bigquery_magics.context, "default_variable", "_bq_df")
-
-    ipython_ns_cleanup.append((ip, "df"))
-
-    credentials_mock = mock.create_autospec(
-        google.auth.credentials.Credentials, instance=True
-    )
-    default_patch = mock.patch(
-        "google.auth.default", return_value=(credentials_mock, "general-project")
-    )
+    monkeypatch.setattr(bigquery_magics.context, "use_query_and_wait", True)
 
-    row_iterator_mock = mock.create_autospec(
-        google.cloud.bigquery.table.RowIterator, instance=True
+    # Like google-cloud-bigquery versions before job creation modes.
+    bq_client = mock.create_autospec(bigquery.Client, instance=True)
+    del bq_client.default_job_creation_mode
+    create_clients_patch = mock.patch(
+        "bigquery_magics.bigquery._create_clients",
+        return_value=(bq_client, None),
     )
+    run_query_patch = mock.patch("bigquery_magics.bigquery._run_query", autospec=True)
 
-    client_patch = mock.patch("bigquery_magics.bigquery.bigquery.Client", autospec=True)
-
-    table_id = "bigquery-public-data.samples.shakespeare"
-    result = pandas.DataFrame([17], columns=["num"])
-
-    with client_patch as client_mock, default_patch:
-        client_mock().list_rows.return_value = row_iterator_mock
-        row_iterator_mock.to_dataframe.return_value = result
+    with create_clients_patch, run_query_patch as run_query, io.capture_output():
+        ip.run_cell_magic("bigquery", "--no_client_cache", "SELECT 17 AS num")
 
-        ip.run_cell_magic("bigquery", "", table_id)
+    bq_client.query_and_wait.assert_not_called()
+    run_query.assert_called_once()
 
-    assert "_bq_df" in ip.user_ns
-    df = ip.user_ns["_bq_df"]
 
-    assert isinstance(df, pandas.DataFrame)
+def _async_query_job(result=None):
+    query_job = mock.create_autospec(google.cloud.bigquery.job.QueryJob, instance=True)
+    query_job.job_id = JOB_ID
+    query_job.to_dataframe.return_value = result
+    return query_job
 
 
-def test_bigquery_magic_w_table_id_and_destination_var(ipython_ns_cleanup):
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_async_pushes_variable_on_completion():
     globalipapp.start_ipython()
     ip = globalipapp.get_ipython()
     ip.extension_manager.load_extension("bigquery_magics")
-    bigquery_magics.context._project = None
+    ip.user_ns.pop("df", None)
 
-    ipython_ns_cleanup.append((ip, "df"))
+    result = pandas.DataFrame([17], columns=["num"])
+    query_job = _async_query_job(result)
+    downloaded = threading.Event()
+    query_job.result.side_effect = lambda timeout=None: downloaded.wait(5)
 
-    credentials_mock = mock.create_autospec(
-        google.auth.credentials.Credentials, instance=True
-    )
-    default_patch = mock.patch(
-        "google.auth.default", return_value=(credentials_mock, "general-project")
+    client_query_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.query",
+        autospec=True,
+        return_value=query_job,
     )
+    with client_query_patch, io.capture_output() as captured_io:
+        handle = ip.run_cell_magic("bigquery", "df --async --use_rest_api", "SELECT 17")
 
-    row_iterator_mock = mock.create_autospec(
-        google.cloud.bigquery.table.RowIterator, instance=True
-    )
+        # The cell returns before the job is done.
+        assert isinstance(handle, magics.QueryHandle)
+        assert not handle.done()
+        assert "df" not in ip.user_ns
 
-    client_patch = mock.patch("bigquery_magics.bigquery.bigquery.Client", autospec=True)
+        downloaded.set()
+        assert handle.result(timeout=5) is result
 
-    table_id = "bigquery-public-data.samples.shakespeare"
-    result = pandas.DataFrame([17], columns=["num"])
+    assert ip.user_ns["df"] is result
+    assert JOB_ID in captured_io.stdout
+    query_job.to_dataframe.assert_called_once_with(
+        bqstorage_client=None, create_bqstorage_client=False, progress_bar_type=None
+    )
 
-    with client_patch as client_mock, default_patch:
-        client_mock().list_rows.return_value = row_iterator_mock
-        row_iterator_mock.to_dataframe.return_value = result
 
-        ip.run_cell_magic("bigquery", "df", table_id)
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_async_with_max_results():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
 
-    assert "df" in ip.user_ns
-    df = ip.user_ns["df"]
+    query_job = _async_query_job()
+    rows = mock.create_autospec(table.RowIterator, instance=True)
+    query_job.result.side_effect = lambda timeout=None, max_results=None: rows
+    client_query_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.query",
+        autospec=True,
+        return_value=query_job,
+    )
+    with client_query_patch, io.capture_output():
+        handle = ip.run_cell_magic("bigquery", "--async --max_results=5", "SELECT 17")
+        handle.result(timeout=5)
 
-    assert isinstance(df, pandas.DataFrame)
+    query_job.result.assert_called_with(max_results=5)
+    rows.to_dataframe.assert_called_once()
 
 
-@pytest.mark.skipif(
-    bigquery_storage is None, reason="Requires `google-cloud-bigquery-storage`"
-)
-def test_bigquery_magic_w_table_id_and_bqstorage_client():
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_async_error_is_stored_in_handle():
     globalipapp.start_ipython()
     ip = globalipapp.get_ipython()
     ip.extension_manager.load_extension("bigquery_magics")
-    bigquery_magics.context._project = None
-
-    credentials_mock = mock.create_autospec(
-        google.auth.credentials.Credentials, instance=True
-    )
-    default_patch = mock.patch(
-        "google.auth.default", return_value=(credentials_mock, "general-project")
-    )
 
-    row_iterator_mock = mock.create_autospec(
-        google.cloud.bigquery.table.RowIterator, instance=True
+    query_job = _async_query_job()
+    query_job.result.side_effect = exceptions.BadRequest("Syntax error in SQL query")
+    client_query_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.query",
+        autospec=True,
+        return_value=query_job,
     )
+    with client_query_patch, io.capture_output():
+        handle = ip.run_cell_magic("bigquery", "--async", "SELECT 17")
 
-    client_patch = mock.patch("bigquery_magics.bigquery.bigquery.Client", autospec=True)
+        with pytest.raises(exceptions.BadRequest):
+            handle.result(timeout=5)
 
-    bqstorage_mock = mock.create_autospec(bigquery_storage.BigQueryReadClient)
-    bqstorage_instance_mock = mock.create_autospec(
-        bigquery_storage.BigQueryReadClient, instance=True
-    )
-    bqstorage_instance_mock._transport = mock.Mock()
-    bqstorage_mock.return_value = bqstorage_instance_mock
-    bqstorage_client_patch = mock.patch(
-        "google.cloud.bigquery_storage.BigQueryReadClient", bqstorage_mock
-    )
 
-    table_id = "bigquery-public-data.samples.shakespeare"
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_async_reports_messages_with_result():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
 
-    with default_patch, client_patch as client_mock, bqstorage_client_patch:
-        client_mock()._ensure_bqstorage_client.return_value = bqstorage_instance_mock
-        client_mock().list_rows.return_value = row_iterator_mock
+    query_job = _async_query_job(pandas.DataFrame({"num": [1, 2, 3]}))
+    downloaded = threading.Event()
+    query_job.result.side_effect = lambda timeout=None: downloaded.wait(5)
+    client_query_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.query",
+        autospec=True,
+        return_value=query_job,
+    )
+    with client_query_patch, io.capture_output() as cell_output:
+        handle = ip.run_cell_magic("bigquery", "--async --optimize_dtypes", "SELECT 1")
+        downloaded.set()
+        handle.exception(timeout=5)
 
-        ip.run_cell_magic("bigquery", "--max_results=5", table_id)
-        row_iterator_mock.to_dataframe.assert_called_once_with(
-            bqstorage_client=bqstorage_instance_mock,
-            create_bqstorage_client=mock.ANY,
-        )
+    assert "Optimized dtypes" not in cell_output.stdout
+    assert handle.messages[0].startswith("Optimized dtypes")
+    with io.capture_output() as result_output:
+        handle.result(timeout=5)
+    assert "Optimized dtypes" in result_output.stdout
 
 
-def test_bigquery_magic_dryrun_option_sets_job_config():
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_async_result_handling_error_fails_handle():
     globalipapp.start_ipython()
     ip = globalipapp.get_ipython()
     ip.extension_manager.load_extension("bigquery_magics")
-    bigquery_magics.context.credentials = mock.create_autospec(
-        google.auth.credentials.Credentials, instance=True
+
+    query_job = _async_query_job(pandas.DataFrame({"num": [1]}))
+    client_query_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.query",
+        autospec=True,
+        return_value=query_job,
+    )
+    push_patch = mock.patch.object(
+        ip, "push", side_effect=RuntimeError("cannot store df")
     )
+    with client_query_patch, push_patch, io.capture_output():
+        handle = ip.run_cell_magic("bigquery", "df --async", "SELECT 1")
 
-    run_query_patch = mock.patch("bigquery_magics.bigquery._run_query", autospec=True)
+        with pytest.raises(RuntimeError, match="cannot store df"):
+            handle.result(timeout=5)
+    assert "state='failed'" in repr(handle)
 
-    sql = "SELECT 17 AS num"
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_async_cancel():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    ip.user_ns.pop("df", None)
+
+    query_job = _async_query_job(pandas.DataFrame())
+    cancelled = threading.Event()
+    query_job.cancel.side_effect = lambda: cancelled.set()
+
+    def result(timeout=None):
+        if not cancelled.wait(timeout):
+            raise futures.TimeoutError()
+
+    query_job.result.side_effect = result
+    client_query_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.query",
+        autospec=True,
+        return_value=query_job,
+    )
+    with client_query_patch, io.capture_output():
+        handle = ip.run_cell_magic("bigquery", "df --async", "SELECT 17")
+        assert handle.cancel()
+
+        with pytest.raises(futures.CancelledError):
+            handle.result(timeout=5)
+
+    query_job.cancel.assert_called_once_with()
+    assert "df" not in ip.user_ns
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_async_closes_transports_when_done(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "reuse_clients", False)
+
+    query_job = _async_query_job()
+    downloaded = threading.Event()
+    query_job.result.side_effect = lambda timeout=None: downloaded.wait(5)
+    client_query_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.query",
+        autospec=True,
+        return_value=query_job,
+    )
+    close_transports_patch = mock.patch(
+        "bigquery_magics.bigquery._close_transports", autospec=True
+    )
+    with (
+        client_query_patch
+    ), close_transports_patch as close_transports, io.capture_output():
+        handle = ip.run_cell_magic("bigquery", "--async", "SELECT 17")
+        close_transports.assert_not_called()
+
+        downloaded.set()
+        handle.result(timeout=5)
+
+    close_transports.assert_called_once()
+
+
+@pytest.mark.parametrize("option", ["--dry_run", "--graph"])
+def test_bigquery_magic_async_with_incompatible_option(option):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    with pytest.raises(ValueError, match="--async cannot be used"):
+        ip.run_cell_magic("bigquery", f"--async {option}", "SELECT 17")
+
+
+def test__split_batch_queries():
+    cell = """
+        -- name: df_a
+        SELECT 1;
+        -- name:df_b
+        SELECT 2
+        FROM t
+        --name: df_c
+        my_project.my_dataset.my_table
+    """
+
+    assert magics._split_batch_queries(cell) == {
+        "df_a": "SELECT 1;",
+        "df_b": "SELECT 2\n        FROM t",
+        "df_c": "my_project.my_dataset.my_table",
+    }
+
+
+@pytest.mark.parametrize(
+    ("cell", "message"),
+    [
+        ("SELECT 1\n-- name: df\nSELECT 2", "must be preceded"),
+        ("-- name: 1df\nSELECT 1", "Invalid variable name"),
+        ("-- name:\nSELECT 1", "Invalid variable name"),
+        ("-- name: df\nSELECT 1\n-- name: df\nSELECT 2", "Duplicate"),
+        ("-- name: df\n   \n", "Query for df is missing"),
+        ("  \n", "Query is missing"),
+    ],
+)
+def test__split_batch_queries_invalid(cell, message):
+    with pytest.raises(ValueError, match=message):
+        magics._split_batch_queries(cell)
+
+
+def _batch_query_patch(make_result):
+    """Patch Client.query to return a job whose result depends on the SQL."""
+
+    def query(client, sql, job_config=None):
+        query_job = mock.create_autospec(
+            google.cloud.bigquery.job.QueryJob, instance=True
+        )
+        query_job.job_id = f"job_{sql.split()[-1]}"
+        query_job.result.side_effect = lambda timeout=None, max_results=None: (
+            make_result(sql) if max_results is None else query_job
+        )
+        query_job.to_dataframe.return_value = pandas.DataFrame(
+            {"num": [int(sql.split()[-1])]}
+        )
+        return query_job
+
+    return mock.patch(
+        "google.cloud.bigquery.client.Client.query", autospec=True, side_effect=query
+    )
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_batch_magic_runs_queries_concurrently():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    # Every query waits for all the others to be running.
+    barrier = threading.Barrier(3, timeout=5)
+    cell = """
+        -- name: df_1
+        SELECT 1
+        -- name: df_2
+        SELECT 2
+        -- name: df_3
+        SELECT 3
+    """
+
+    with _batch_query_patch(lambda sql: barrier.wait()), io.capture_output() as out:
+        ip.run_cell_magic("bigquery_batch", "--use_rest_api", cell)
+
+    for num in (1, 2, 3):
+        assert ip.user_ns[f"df_{num}"]["num"].tolist() == [num]
+        assert f"df_{num}: 1 rows from job ID job_{num}" in out.stdout
+    assert "Executing 3 queries" in out.stdout
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_batch_magic_limits_concurrency():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    lock = threading.Lock()
+    running = []
+    max_running = []
+
+    def make_result(sql):
+        with lock:
+            running.append(sql)
+            max_running.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.remove(sql)
+
+    cell = "\n".join(f"-- name: df_{num}\nSELECT {num}" for num in range(6))
+    with _batch_query_patch(make_result), io.capture_output():
+        ip.run_cell_magic("bigquery_batch", "--max_concurrency=2", cell)
+
+    assert max(max_running) == 2
+    assert all(f"df_{num}" in ip.user_ns for num in range(6))
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_batch_magic_records_stats_per_query():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    stats.session_stats.clear()
+
+    cell = "-- name: df_1\nSELECT 1\n-- name: df_2\nSELECT 2"
+    with _batch_query_patch(lambda sql: None), io.capture_output():
+        ip.run_cell_magic("bigquery_batch", "--use_rest_api", cell)
+
+    runs = {run.job_id: run for run in stats.session_stats.runs()}
+    assert set(runs) == {"job_1", "job_2"}
+    for num in (1, 2):
+        run_stats = runs[f"job_{num}"]
+        assert run_stats.query == f"SELECT {num}"
+        assert run_stats.engine == "pandas"
+        assert run_stats.duration is not None
+        assert {"submit", "wait", "download"} <= set(run_stats.timings)
+
+
+def test_bigquery_batch_magic_emits_opentelemetry_spans(monkeypatch):
+    sdk_trace = pytest.importorskip("opentelemetry.sdk.trace")
+    from opentelemetry import trace
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+        InMemorySpanExporter,
+    )
+
+    exporter = InMemorySpanExporter()
+    provider = sdk_trace.TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    monkeypatch.setattr(trace, "get_tracer_provider", lambda: provider)
+
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    bq_client = mock.create_autospec(bigquery.Client, instance=True)
+    bq_client.project = "my-project"
+    bq_client.location = "EU"
+
+    def query(sql, job_config=None):
+        query_job = mock.create_autospec(
+            google.cloud.bigquery.job.QueryJob, instance=True
+        )
+        query_job.job_id = f"job_{sql.split()[-1]}"
+        query_job.to_dataframe.return_value = pandas.DataFrame({"num": [1]})
+        return query_job
+
+    bq_client.query.side_effect = query
+    create_clients_patch = mock.patch(
+        "bigquery_magics.bigquery._create_clients",
+        return_value=(bq_client, None),
+    )
+    cell = "-- name: df_1\nSELECT 1\n-- name: df_2\nSELECT 2"
+    with create_clients_patch, io.capture_output():
+        ip.run_cell_magic("bigquery_batch", "", cell)
+
+    spans = exporter.get_finished_spans()
+    (batch_span,) = [span for span in spans if span.name == "bigquery_magics.batch"]
+    query_spans = [span for span in spans if span.name == "bigquery_magics.batch_query"]
+    assert sorted(
+        span.attributes["bigquery_magics.job_id"] for span in query_spans
+    ) == ["job_1", "job_2"]
+    for span in query_spans:
+        assert span.parent.span_id == batch_span.context.span_id
+    for span in spans:
+        if span.name in ("bigquery_magics.submit", "bigquery_magics.wait"):
+            assert span.parent.span_id in {
+                query_span.context.span_id for query_span in query_spans
+            }
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_batch_magic_reports_errors_per_query():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    ip.user_ns.pop("df_bad", None)
+
+    def make_result(sql):
+        if "2" in sql:
+            raise exceptions.BadRequest("Syntax error in SQL query")
+
+    cell = "-- name: df_good\nSELECT 1\n-- name: df_bad\nSELECT 2"
+    with _batch_query_patch(make_result), io.capture_output() as out:
+        ip.run_cell_magic("bigquery_batch", "", cell)
+
+    assert ip.user_ns["df_good"]["num"].tolist() == [1]
+    assert "df_bad" not in ip.user_ns
+    assert "Syntax error in SQL query" in out.stderr
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_batch_magic_passes_options(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "reuse_clients", False)
+
+    rows = mock.create_autospec(table.RowIterator, instance=True)
+    rows.to_dataframe.return_value = pandas.DataFrame({"num": [1, 2]})
+    list_rows_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.list_rows",
+        autospec=True,
+        return_value=rows,
+    )
+    close_transports_patch = mock.patch(
+        "bigquery_magics.bigquery._close_transports", autospec=True
+    )
+    with _batch_query_patch(
+        lambda sql: None
+    ) as client_query, (
+        list_rows_patch
+    ) as list_rows, close_transports_patch as close_transports, io.capture_output():
+        ip.run_cell_magic(
+            "bigquery_batch",
+            "--project=other-project --no_query_cache --max_results=2",
+            "-- name: df_query\nSELECT 1\n-- name: df_table\nds.table",
+        )
+
+    client, _ = client_query.call_args[0]
+    assert client.project == "other-project"
+    assert client_query.call_args.kwargs["job_config"].use_query_cache is False
+    list_rows.assert_called_once_with(mock.ANY, "ds.table", max_results=2)
+    assert ip.user_ns["df_query"]["num"].tolist() == [1]
+    assert len(ip.user_ns["df_table"]) == 2
+    close_transports.assert_called_once()
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_batch_magic_memory_budget(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    ip.user_ns.pop("df_query", None)
+    monkeypatch.setattr(bigquery_magics.context, "memory_budget", 1000)
+    monkeypatch.setattr(bigquery_magics.context, "memory_budget_policy", "sample")
+
+    rows = mock.create_autospec(table.RowIterator, instance=True)
+    rows.to_dataframe.return_value = pandas.DataFrame({"num": range(125)})
+    list_rows_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.list_rows",
+        autospec=True,
+        return_value=rows,
+    )
+    get_table_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.get_table",
+        autospec=True,
+        return_value=_budget_table_resource(),
+    )
+    with _batch_query_patch(
+        lambda sql: None
+    ) as client_query, (
+        list_rows_patch
+    ) as list_rows, get_table_patch, io.capture_output() as captured:
+        ip.run_cell_magic(
+            "bigquery_batch", "", "-- name: df_query\nSELECT 1\n-- name: df_table\nds.t"
+        )
+
+    list_rows.assert_called_once_with(mock.ANY, mock.ANY, max_results=125)
+    assert len(ip.user_ns["df_table"]) == 125
+    assert "df_query" in ip.user_ns
+    assert client_query.call_count == 1
+    assert captured.stdout.count("Downloading the first 125 rows only") == 2
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_batch_magic_memory_budget_error(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    ip.user_ns.pop("df", None)
+    monkeypatch.setattr(bigquery_magics.context, "memory_budget", "1KB")
+
+    get_table_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.get_table",
+        autospec=True,
+        return_value=_budget_table_resource(),
+    )
+    with _batch_query_patch(
+        lambda sql: None
+    ), get_table_patch, io.capture_output() as captured:
+        ip.run_cell_magic("bigquery_batch", "", "-- name: df\nSELECT 1")
+
+    assert "more than the budget" in captured.stderr
+    # The query job is stored instead of the results, as for query errors.
+    assert ip.user_ns["df"].job_id == "job_1"
+
+
+def test_bigquery_batch_magic_memory_budget_stream_policy(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "memory_budget", "1GB")
+    monkeypatch.setattr(bigquery_magics.context, "memory_budget_policy", "stream")
+
+    with pytest.raises(ValueError, match="cannot stream results"):
+        ip.run_cell_magic("bigquery_batch", "", "-- name: df\nSELECT 1")
+
+
+def test_bigquery_batch_magic_invalid_max_concurrency():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    with pytest.raises(ValueError, match="--max_concurrency"):
+        ip.run_cell_magic(
+            "bigquery_batch", "--max_concurrency=-1", "-- name: df\nSELECT 1"
+        )
+
+
+def _cacheable_query_patch():
+    job_ids = iter(range(1, 100))
+
+    def query(client, sql, job_config=None):
+        query_job = mock.create_autospec(
+            google.cloud.bigquery.job.QueryJob, instance=True
+        )
+        query_job.job_id = f"job_{next(job_ids)}"
+        query_job.statement_type = "SELECT"
+        query_job.started = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+        query_job.referenced_tables = [
+            table.TableReference.from_string("test-project.ds.t")
+        ]
+        query_job.destination = table.TableReference.from_string(
+            "test-project._anon.results"
+        )
+        query_job.to_dataframe.return_value = pandas.DataFrame({"num": [17]})
+        query_job.to_arrow.return_value = pyarrow.table({"num": [17]})
+        query_job.result.return_value = query_job
+        return query_job
+
+    return mock.patch(
+        "google.cloud.bigquery.client.Client.query", autospec=True, side_effect=query
+    )
+
+
+def _get_table_patch(modified):
+    return mock.patch(
+        "google.cloud.bigquery.client.Client.get_table",
+        autospec=True,
+        return_value=mock.Mock(table_type="TABLE", modified=modified, expires=None),
+    )
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_reuses_cached_results():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    modified = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+    with _cacheable_query_patch() as client_query, _get_table_patch(
+        modified
+    ), io.capture_output() as captured_io:
+        first = ip.run_cell_magic("bigquery", "", "SELECT num FROM ds.t")
+        second = ip.run_cell_magic("bigquery", "--verbose", "SELECT num\nFROM ds.t")
+
+    assert client_query.call_count == 1
+    assert second is not first
+    pandas.testing.assert_frame_equal(second, first)
+    assert "Using cached results of job ID job_1" in captured_io.stdout
+    assert result_cache.stats()["hits"] == 1
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_reruns_query_if_table_modified():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    modified = datetime.datetime(2026, 2, 1, tzinfo=datetime.timezone.utc)
+
+    with _cacheable_query_patch() as client_query, _get_table_patch(
+        modified
+    ), io.capture_output():
+        ip.run_cell_magic("bigquery", "", "SELECT num FROM ds.t")
+        ip.run_cell_magic("bigquery", "", "SELECT num FROM ds.t")
+
+    assert client_query.call_count == 2
+    assert result_cache.stats()["misses"] == 2
+
+
+@pytest.mark.parametrize(
+    ("second_line", "hits"),
+    [
+        pytest.param("--refresh", 1, id="refresh"),
+        pytest.param("--no_client_cache", 0, id="no-client-cache"),
+        pytest.param("--no_query_cache", 0, id="no-query-cache"),
+    ],
+)
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_bypasses_result_cache(second_line, hits):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    modified = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+    with _cacheable_query_patch() as client_query, _get_table_patch(
+        modified
+    ), io.capture_output():
+        ip.run_cell_magic("bigquery", "", "SELECT num FROM ds.t")
+        ip.run_cell_magic("bigquery", second_line, "SELECT num FROM ds.t")
+        # --refresh caches the new results, the other options leave the cache
+        # as it was.
+        ip.run_cell_magic("bigquery", "", "SELECT num FROM ds.t")
+
+    assert client_query.call_count == 2
+    assert result_cache.stats()["hits"] == 1
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_reuses_results_from_disk_cache(tmp_path, monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "disk_cache_dir", str(tmp_path))
+    modified = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+    with _cacheable_query_patch() as client_query, _get_table_patch(
+        modified
+    ), io.capture_output() as captured_io:
+        first = ip.run_cell_magic("bigquery", "", "SELECT num FROM ds.t")
+        # As if the kernel had restarted.
+        result_cache.clear()
+        second = ip.run_cell_magic("bigquery", "--verbose", "SELECT num FROM ds.t")
+        third = ip.run_cell_magic("bigquery", "", "SELECT num FROM ds.t")
+
+    assert client_query.call_count == 1
+    pandas.testing.assert_frame_equal(second, first)
+    pandas.testing.assert_frame_equal(third, first)
+    assert "Using cached results of job ID job_1" in captured_io.stdout
+    assert disk_cache.stats()["hits"] == 1
+    # The results read from disk are kept in memory for the next run.
+    assert result_cache.stats()["hits"] == 1
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_disk_cache_write_error_warns(tmp_path, monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    not_a_directory = tmp_path / "file"
+    not_a_directory.write_text("")
+    monkeypatch.setattr(bigquery_magics.context, "disk_cache_dir", str(not_a_directory))
+    modified = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+    with _cacheable_query_patch(), _get_table_patch(modified), io.capture_output():
+        with pytest.warns(UserWarning, match="disk cache"):
+            result = ip.run_cell_magic("bigquery", "", "SELECT num FROM ds.t")
+
+    assert result["num"].tolist() == [17]
+
+
+def _recent_cacheable_query_patch():
+    patch = _cacheable_query_patch()
+    make_job = patch.kwargs["side_effect"]
+
+    def query(client, sql, job_config=None):
+        query_job = make_job(client, sql, job_config=job_config)
+        query_job.started = datetime.datetime.now(
+            datetime.timezone.utc
+        ) - datetime.timedelta(hours=1)
+        return query_job
+
+    patch.kwargs["side_effect"] = query
+    return patch
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_reads_previous_destination_table(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    # Too large for the in-memory cache.
+    monkeypatch.setattr(bigquery_magics.context, "client_cache_max_bytes", 1)
+    modified = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+    rows = mock.create_autospec(table.RowIterator, instance=True)
+    rows.to_dataframe.return_value = pandas.DataFrame({"num": [17]})
+    list_rows_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.list_rows",
+        autospec=True,
+        return_value=rows,
+    )
+    with _recent_cacheable_query_patch() as client_query, _get_table_patch(
+        modified
+    ) as get_table, list_rows_patch as list_rows, io.capture_output() as captured_io:
+        ip.run_cell_magic("bigquery", "--max_results=5", "SELECT num FROM ds.t")
+        result = ip.run_cell_magic(
+            "bigquery", "--verbose --max_results=5", "SELECT num FROM ds.t"
+        )
+
+    assert client_query.call_count == 1
+    assert result["num"].tolist() == [17]
+    get_table.assert_any_call(mock.ANY, "test-project._anon.results")
+    list_rows.assert_called_once_with(mock.ANY, get_table.return_value, max_results=5)
+    assert "Reading the results of job ID job_1 from" in captured_io.stdout
+    assert destination_tables.stats()["hits"] == 1
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_reruns_query_if_destination_table_expired(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "client_cache_max_bytes", 1)
+    fresh_table = mock.Mock(
+        table_type="TABLE",
+        modified=datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc),
+    )
+
+    def get_table(client, table_id):
+        if table_id == "test-project._anon.results":
+            raise exceptions.NotFound("expired")
+        return fresh_table
+
+    get_table_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.get_table",
+        autospec=True,
+        side_effect=get_table,
+    )
+    with _recent_cacheable_query_patch() as client_query, (
+        get_table_patch
+    ), io.capture_output() as captured_io:
+        ip.run_cell_magic("bigquery", "", "SELECT num FROM ds.t")
+        result = ip.run_cell_magic("bigquery", "--verbose", "SELECT num FROM ds.t")
+
+    assert client_query.call_count == 2
+    assert result["num"].tolist() == [17]
+    assert (
+        "Could not read the results from test-project._anon.results: 404 expired"
+        in captured_io.stdout
+    )
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_reruns_query_if_destination_table_expires_soon(
+    monkeypatch,
+):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "client_cache_max_bytes", 1)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    expiring_table = mock.Mock(
+        table_type="TABLE",
+        modified=datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc),
+        expires=now + datetime.timedelta(minutes=10),
+    )
+    get_table_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.get_table",
+        autospec=True,
+        return_value=expiring_table,
+    )
+    list_rows_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.list_rows", autospec=True
+    )
+    with _recent_cacheable_query_patch() as client_query, (
+        get_table_patch
+    ), list_rows_patch as list_rows, io.capture_output():
+        ip.run_cell_magic("bigquery", "", "SELECT num FROM ds.t")
+        ip.run_cell_magic("bigquery", "", "SELECT num FROM ds.t")
+
+    assert client_query.call_count == 2
+    list_rows.assert_not_called()
+    assert destination_tables.stats()["entries"] == 1
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_destination_table_read_errors_propagate(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "client_cache_max_bytes", 1)
+    modified = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+    list_rows_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.list_rows",
+        autospec=True,
+        side_effect=exceptions.InternalServerError("backend error"),
+    )
+    with _recent_cacheable_query_patch() as client_query, _get_table_patch(
+        modified
+    ), list_rows_patch, io.capture_output() as captured_io:
+        ip.run_cell_magic("bigquery", "", "SELECT num FROM ds.t")
+        ip.run_cell_magic("bigquery", "", "SELECT num FROM ds.t")
+
+    # Only expired or unreadable tables fall back to running the query again.
+    assert client_query.call_count == 1
+    assert "backend error" in captured_io.stderr
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_result_cache_disabled_in_context(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "use_client_cache", False)
+    modified = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+    with _cacheable_query_patch() as client_query, _get_table_patch(
+        modified
+    ), io.capture_output():
+        ip.run_cell_magic("bigquery", "", "SELECT num FROM ds.t")
+        ip.run_cell_magic("bigquery", "", "SELECT num FROM ds.t")
+
+    assert client_query.call_count == 2
+    assert result_cache.stats()["entries"] == 0
+
+
+@pytest.mark.parametrize(
+    ("line", "iterable_method", "iterable_kwargs"),
+    [
+        pytest.param("batches --stream arrow", "to_arrow_iterable", {}, id="arrow"),
+        pytest.param(
+            "batches --stream pandas", "to_dataframe_iterable", {}, id="pandas"
+        ),
+        pytest.param(
+            "batches --stream arrow --stream_prefetch 3",
+            "to_arrow_iterable",
+            {"max_queue_size": 3},
+            id="prefetch",
+        ),
+    ],
+)
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_stream(line, iterable_method, iterable_kwargs):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    rows = mock.create_autospec(table.RowIterator, instance=True)
+    rows.total_rows = 2
+    getattr(rows, iterable_method).return_value = iter(["chunk_1", "chunk_2"])
+    query_job = mock.create_autospec(google.cloud.bigquery.job.QueryJob, instance=True)
+    query_job.job_id = JOB_ID
+    query_job.result.return_value = rows
+    client_query_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.query",
+        autospec=True,
+        return_value=query_job,
+    )
+    with client_query_patch, io.capture_output():
+        ip.run_cell_magic("bigquery", line, "SELECT 17")
+
+    stream = ip.user_ns["batches"]
+    assert isinstance(stream, magics.ResultStream)
+    assert stream.total_rows == 2
+    assert list(stream) == ["chunk_1", "chunk_2"]
+    getattr(rows, iterable_method).assert_called_once_with(
+        bqstorage_client=mock.ANY, **iterable_kwargs
+    )
+    query_job.to_dataframe.assert_not_called()
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_stream_prefetch_from_context(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "stream_prefetch", 2)
+
+    rows = mock.create_autospec(table.RowIterator, instance=True)
+    list_rows_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.list_rows",
+        autospec=True,
+        return_value=rows,
+    )
+    with list_rows_patch as list_rows, io.capture_output():
+        stream = ip.run_cell_magic(
+            "bigquery", "--stream arrow --max_results=10", "ds.table"
+        )
+
+    assert isinstance(stream, magics.ResultStream)
+    list_rows.assert_called_once_with(mock.ANY, "ds.table", max_results=10)
+    rows.to_arrow_iterable.assert_called_once_with(
+        bqstorage_client=mock.ANY, max_queue_size=2
+    )
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_stream_closes_transports_when_consumed(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "reuse_clients", False)
+
+    rows = mock.create_autospec(table.RowIterator, instance=True)
+    rows.to_arrow_iterable.return_value = iter(["chunk"])
+    list_rows_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.list_rows",
+        autospec=True,
+        return_value=rows,
+    )
+    close_transports_patch = mock.patch(
+        "bigquery_magics.bigquery._close_transports", autospec=True
+    )
+    with (
+        list_rows_patch
+    ), close_transports_patch as close_transports, io.capture_output():
+        stream = ip.run_cell_magic("bigquery", "--stream arrow", "ds.table")
+        close_transports.assert_not_called()
+
+        assert list(stream) == ["chunk"]
+
+    close_transports.assert_called_once()
+
+
+@pytest.mark.parametrize(
+    ("line", "message"),
+    [
+        ("--stream arrow --dry_run", "--stream cannot be used"),
+        ("--stream arrow --async", "--stream cannot be used"),
+        ("--stream pandas --use_geodataframe geo", "--stream cannot be used"),
+        ("--stream arrow --stream_prefetch 0", "--stream_prefetch must be"),
+    ],
+)
+def test_bigquery_magic_stream_invalid_options(line, message):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    with pytest.raises(ValueError, match=message):
+        ip.run_cell_magic("bigquery", line, "SELECT 17")
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_output_arrow():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    result = pyarrow.table({"num": [17]})
+    query_job = mock.create_autospec(google.cloud.bigquery.job.QueryJob, instance=True)
+    query_job.to_arrow.return_value = result
+    client_query_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.query",
+        autospec=True,
+        return_value=query_job,
+    )
+    with client_query_patch, io.capture_output():
+        return_value = ip.run_cell_magic("bigquery", "--output arrow", "SELECT 17")
+
+    assert return_value is result
+    query_job.to_arrow.assert_called_once_with(
+        bqstorage_client=mock.ANY,
+        create_bqstorage_client=False,
+        progress_bar_type=mock.ANY,
+    )
+    query_job.to_dataframe.assert_not_called()
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_output_arrow_from_context_w_table_id(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "output_format", "arrow")
+
+    result = pyarrow.table({"num": [17]})
+    rows = mock.create_autospec(table.RowIterator, instance=True)
+    rows.to_arrow.return_value = result
+    list_rows_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.list_rows",
+        autospec=True,
+        return_value=rows,
+    )
+    with list_rows_patch, io.capture_output():
+        return_value = ip.run_cell_magic("bigquery", "", "ds.table")
+
+    assert return_value is result
+    rows.to_arrow.assert_called_once_with(
+        bqstorage_client=mock.ANY, create_bqstorage_client=False
+    )
+    rows.to_dataframe.assert_not_called()
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_output_pandas_overrides_context(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "output_format", "arrow")
+
+    query_job = mock.create_autospec(google.cloud.bigquery.job.QueryJob, instance=True)
+    query_job.to_dataframe.return_value = pandas.DataFrame({"num": [17]})
+    client_query_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.query",
+        autospec=True,
+        return_value=query_job,
+    )
+    with client_query_patch, io.capture_output():
+        return_value = ip.run_cell_magic("bigquery", "--output pandas", "SELECT 17")
+
+    assert isinstance(return_value, pandas.DataFrame)
+    query_job.to_arrow.assert_not_called()
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_output_arrow_caches_results_separately():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    modified = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+    with _cacheable_query_patch() as client_query, _get_table_patch(
+        modified
+    ), io.capture_output():
+        first = ip.run_cell_magic("bigquery", "--output arrow", "SELECT num FROM ds.t")
+        second = ip.run_cell_magic("bigquery", "--output arrow", "SELECT num FROM ds.t")
+        dataframe = ip.run_cell_magic("bigquery", "", "SELECT num FROM ds.t")
+
+    assert isinstance(first, pyarrow.Table)
+    assert second is first
+    assert isinstance(dataframe, pandas.DataFrame)
+    assert client_query.call_count == 2
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_output_polars():
+    polars = pytest.importorskip("polars")
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    query_job = mock.create_autospec(google.cloud.bigquery.job.QueryJob, instance=True)
+    query_job.to_arrow.return_value = pyarrow.table({"num": [17]})
+    client_query_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.query",
+        autospec=True,
+        return_value=query_job,
+    )
+    with client_query_patch, io.capture_output():
+        return_value = ip.run_cell_magic("bigquery", "--output polars", "SELECT 17")
+
+    assert isinstance(return_value, polars.DataFrame)
+    assert return_value["num"].to_list() == [17]
+    query_job.to_dataframe.assert_not_called()
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_output_polars_w_table_id():
+    polars = pytest.importorskip("polars")
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    rows = mock.create_autospec(table.RowIterator, instance=True)
+    rows.to_arrow.return_value = pyarrow.table({"num": [17]})
+    list_rows_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.list_rows",
+        autospec=True,
+        return_value=rows,
+    )
+    with list_rows_patch, io.capture_output():
+        return_value = ip.run_cell_magic("bigquery", "--output polars", "ds.table")
+
+    assert isinstance(return_value, polars.DataFrame)
+    rows.to_dataframe.assert_not_called()
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_output_polars_not_installed(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setitem(sys.modules, "polars", None)
+
+    query_job = mock.create_autospec(google.cloud.bigquery.job.QueryJob, instance=True)
+    query_job.to_arrow.return_value = pyarrow.table({"num": [17]})
+    client_query_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.query",
+        autospec=True,
+        return_value=query_job,
+    )
+    with client_query_patch, pytest.raises(
+        ImportError, match="requires the polars package"
+    ), io.capture_output():
+        ip.run_cell_magic("bigquery", "--output polars", "SELECT 17")
+
+
+@pytest.mark.parametrize(
+    "line",
+    ["--output arrow --use_geodataframe geo", "--output arrow --graph"],
+)
+def test_bigquery_magic_output_arrow_invalid_options(line):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    with pytest.raises(ValueError, match="require the 'pandas' output format"):
+        ip.run_cell_magic("bigquery", line, "SELECT 17")
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_dtype_backend_pyarrow():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    query_job = mock.create_autospec(google.cloud.bigquery.job.QueryJob, instance=True)
+    query_job.to_arrow.return_value = pyarrow.table({"name": ["a"], "num": [17]})
+    client_query_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.query",
+        autospec=True,
+        return_value=query_job,
+    )
+    with client_query_patch, io.capture_output():
+        return_value = ip.run_cell_magic(
+            "bigquery", "--dtype_backend pyarrow", "SELECT 'a' AS name, 17 AS num"
+        )
+
+    assert return_value["name"].dtype == pandas.ArrowDtype(pyarrow.string())
+    assert return_value["num"].dtype == pandas.ArrowDtype(pyarrow.int64())
+    query_job.to_dataframe.assert_not_called()
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_dtype_backend_pyarrow_reports_bytes_saved():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    query_job = mock.create_autospec(google.cloud.bigquery.job.QueryJob, instance=True)
+    query_job.to_arrow.return_value = pyarrow.table(
+        {"country": ["US", "FR"] * 500, "num": range(1000)}
+    )
+    client_query_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.query",
+        autospec=True,
+        return_value=query_job,
+    )
+    with client_query_patch, io.capture_output() as captured:
+        ip.run_cell_magic(
+            "bigquery", "--dtype_backend pyarrow", "SELECT country, num FROM ds.t"
+        )
+
+    assert re.search(r"pyarrow dtypes: ~.+ -> .+ \(~.+ saved\)", captured.stdout)
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_dtype_backend_from_context_w_table_id(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "dtype_backend", "pyarrow")
+
+    rows = mock.create_autospec(table.RowIterator, instance=True)
+    rows.to_arrow.return_value = pyarrow.table({"num": [17]})
+    list_rows_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.list_rows",
+        autospec=True,
+        return_value=rows,
+    )
+    with list_rows_patch, io.capture_output():
+        return_value = ip.run_cell_magic("bigquery", "", "ds.table")
+
+    assert return_value["num"].dtype == pandas.ArrowDtype(pyarrow.int64())
+    rows.to_dataframe.assert_not_called()
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_optimize_dtypes_reports_bytes_saved():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    query_job = mock.create_autospec(google.cloud.bigquery.job.QueryJob, instance=True)
+    query_job.to_dataframe.return_value = pandas.DataFrame(
+        {"country": ["US", "FR"] * 500, "num": range(1000)}
+    )
+    client_query_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.query",
+        autospec=True,
+        return_value=query_job,
+    )
+    with client_query_patch, io.capture_output() as captured:
+        return_value = ip.run_cell_magic(
+            "bigquery", "--optimize_dtypes", "SELECT country, num FROM ds.t"
+        )
+
+    assert isinstance(return_value["country"].dtype, pandas.CategoricalDtype)
+    assert return_value["num"].dtype == "int16"
+    assert re.search(r"Optimized dtypes: .+ -> .+ \(.+ saved\)", captured.stdout)
+
+
+@pytest.mark.parametrize(
+    ("line", "message"),
+    [
+        ("--output arrow --optimize_dtypes", "require the 'pandas' output format"),
+        ("--output polars --dtype_backend pyarrow", "require the 'pandas' output"),
+        (
+            "--dtype_backend pyarrow --use_geodataframe geo",
+            "cannot be used with --use_geodataframe",
+        ),
+    ],
+)
+def test_bigquery_magic_dtype_invalid_options(line, message):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    with pytest.raises(ValueError, match=message):
+        ip.run_cell_magic("bigquery", line, "SELECT 17")
+
+
+def _budget_table_resource(num_rows=1000, num_bytes=8000):
+    table_resource = table.Table(
+        "test-project.ds.table", schema=[bigquery.SchemaField("num", "INTEGER")]
+    )
+    table_resource._properties["numRows"] = str(num_rows)
+    table_resource._properties["numBytes"] = str(num_bytes)
+    return table_resource
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_memory_budget_within_budget():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    rows = mock.create_autospec(table.RowIterator, instance=True)
+    rows.to_dataframe.return_value = pandas.DataFrame({"num": range(1000)})
+    bq_client = mock.create_autospec(bigquery.Client, instance=True)
+    bq_client.get_table.return_value = _budget_table_resource()
+    bq_client.list_rows.return_value = rows
+    create_clients_patch = mock.patch(
+        "bigquery_magics.bigquery._create_clients",
+        return_value=(bq_client, None),
+    )
+    with create_clients_patch, io.capture_output():
+        result = ip.run_cell_magic("bigquery", "--memory_budget 1MiB", "ds.table")
+
+    assert len(result) == 1000
+    bq_client.list_rows.assert_called_once_with(
+        bq_client.get_table.return_value, max_results=None
+    )
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_memory_budget_error(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "memory_budget", "1KB")
+
+    bq_client = mock.create_autospec(bigquery.Client, instance=True)
+    bq_client.get_table.return_value = _budget_table_resource()
+    create_clients_patch = mock.patch(
+        "bigquery_magics.bigquery._create_clients",
+        return_value=(bq_client, None),
+    )
+    with create_clients_patch, io.capture_output() as captured:
+        result = ip.run_cell_magic("bigquery", "", "ds.table")
+
+    assert result is None
+    assert "7.8 KiB" in captured.stderr
+    bq_client.list_rows.assert_not_called()
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_memory_budget_error_w_query_stores_job(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    ip.user_ns.pop("df", None)
+    monkeypatch.setattr(bigquery_magics.context, "memory_budget", "1KB")
+
+    query_job = mock.create_autospec(google.cloud.bigquery.job.QueryJob, instance=True)
+    bq_client = mock.create_autospec(bigquery.Client, instance=True)
+    bq_client.query.return_value = query_job
+    bq_client.get_table.return_value = _budget_table_resource()
+    create_clients_patch = mock.patch(
+        "bigquery_magics.bigquery._create_clients",
+        return_value=(bq_client, None),
+    )
+    with create_clients_patch, io.capture_output() as captured:
+        ip.run_cell_magic("bigquery", "df --no_client_cache", "SELECT num FROM t")
+
+    assert "more than the budget" in captured.stderr
+    assert ip.user_ns["df"] is query_job
+    query_job.to_dataframe.assert_not_called()
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_memory_budget_w_async(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "memory_budget_policy", "sample")
+
+    query_job = _async_query_job()
+    rows = mock.create_autospec(table.RowIterator, instance=True)
+    rows.to_dataframe.return_value = pandas.DataFrame({"num": range(125)})
+    query_job.result.side_effect = lambda max_results=None: rows
+    client_query_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.query",
+        autospec=True,
+        return_value=query_job,
+    )
+    get_table_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.get_table",
+        autospec=True,
+        return_value=_budget_table_resource(),
+    )
+    with client_query_patch, get_table_patch, io.capture_output():
+        handle = ip.run_cell_magic(
+            "bigquery", "--async --memory_budget 1000", "SELECT num FROM t"
+        )
+        result = handle.result(timeout=5)
+
+    assert len(result) == 125
+    query_job.result.assert_called_with(max_results=125)
+    assert "Downloading the first 125 rows only" in handle.messages[0]
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_memory_budget_w_previous_destination_table(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "client_cache_max_bytes", 1)
+    large_table = mock.Mock(
+        table_type="TABLE",
+        modified=datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc),
+        expires=None,
+        schema=[bigquery.SchemaField("num", "INTEGER")],
+        num_rows=1000,
+        num_bytes=8000,
+    )
+    get_table_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.get_table",
+        autospec=True,
+        return_value=large_table,
+    )
+    list_rows_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.list_rows", autospec=True
+    )
+    with _recent_cacheable_query_patch() as client_query, (
+        get_table_patch
+    ), list_rows_patch as list_rows, io.capture_output():
+        ip.run_cell_magic("bigquery", "", "SELECT num FROM ds.t")
+        ip.run_cell_magic(
+            "bigquery",
+            "--memory_budget 1000 --memory_budget_policy sample",
+            "SELECT num FROM ds.t",
+        )
+
+    # The query ran again to apply the budget, instead of reading the whole
+    # destination table.
+    assert client_query.call_count == 2
+    list_rows.assert_not_called()
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_memory_budget_sample():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    rows = mock.create_autospec(table.RowIterator, instance=True)
+    rows.to_dataframe.return_value = pandas.DataFrame({"num": range(125)})
+    bq_client = mock.create_autospec(bigquery.Client, instance=True)
+    bq_client.get_table.return_value = _budget_table_resource()
+    bq_client.list_rows.return_value = rows
+    create_clients_patch = mock.patch(
+        "bigquery_magics.bigquery._create_clients",
+        return_value=(bq_client, None),
+    )
+    with create_clients_patch, io.capture_output() as captured:
+        ip.run_cell_magic(
+            "bigquery",
+            "--memory_budget 1000 --memory_budget_policy sample",
+            "ds.table",
+        )
+
+    bq_client.list_rows.assert_called_once_with(
+        bq_client.get_table.return_value, max_results=125
+    )
+    assert "Downloading the first 125 rows only" in captured.stdout
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_memory_budget_sample_w_query(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "memory_budget_policy", "sample")
+
+    query_job = mock.create_autospec(google.cloud.bigquery.job.QueryJob, instance=True)
+    query_job.result.return_value.to_dataframe.return_value = pandas.DataFrame(
+        {"num": range(125)}
+    )
+    bq_client = mock.create_autospec(bigquery.Client, instance=True)
+    bq_client.query.return_value = query_job
+    bq_client.get_table.return_value = _budget_table_resource()
+    create_clients_patch = mock.patch(
+        "bigquery_magics.bigquery._create_clients",
+        return_value=(bq_client, None),
+    )
+    with create_clients_patch, io.capture_output():
+        result = ip.run_cell_magic(
+            "bigquery",
+            "--memory_budget 1000 --no_client_cache",
+            "SELECT num FROM ds.table",
+        )
+
+    assert len(result) == 125
+    bq_client.get_table.assert_called_once_with(query_job.destination)
+    query_job.result.assert_called_with(max_results=125)
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_memory_budget_stream():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    batch = pyarrow.record_batch([pyarrow.array([1, 2, 3])], names=["num"])
+    rows = mock.create_autospec(table.RowIterator, instance=True)
+    rows.to_arrow_iterable.return_value = iter([batch])
+    bq_client = mock.create_autospec(bigquery.Client, instance=True)
+    bq_client.get_table.return_value = _budget_table_resource()
+    bq_client.list_rows.return_value = rows
+    create_clients_patch = mock.patch(
+        "bigquery_magics.bigquery._create_clients",
+        return_value=(bq_client, None),
+    )
+    with create_clients_patch, io.capture_output():
+        result = ip.run_cell_magic(
+            "bigquery",
+            "--memory_budget 1000 --memory_budget_policy stream",
+            "ds.table",
+        )
+
+    assert isinstance(result, magics.ResultStream)
+    assert list(result) == [batch]
+    rows.to_dataframe.assert_not_called()
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_memory_budget_spill():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    batch = pyarrow.record_batch([pyarrow.array([1, 2, 3])], names=["num"])
+    rows = mock.create_autospec(table.RowIterator, instance=True)
+    rows.to_arrow_iterable.return_value = iter([batch, batch])
+    bq_client = mock.create_autospec(bigquery.Client, instance=True)
+    bq_client.get_table.return_value = _budget_table_resource()
+    bq_client.list_rows.return_value = rows
+    create_clients_patch = mock.patch(
+        "bigquery_magics.bigquery._create_clients",
+        return_value=(bq_client, None),
+    )
+    with create_clients_patch, io.capture_output() as captured:
+        result = ip.run_cell_magic(
+            "bigquery",
+            "--memory_budget 1000 --memory_budget_policy spill",
+            "ds.table",
+        )
+
+    assert isinstance(result, pyarrow.Table)
+    assert result.column("num").to_pylist() == [1, 2, 3, 1, 2, 3]
+    assert "Spilling them to a temporary file" in captured.stdout
+    rows.to_dataframe.assert_not_called()
+
+
+def test_bigquery_magic_memory_budget_invalid():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    with pytest.raises(ValueError, match="Invalid memory budget"):
+        ip.run_cell_magic("bigquery", "--memory_budget lots", "SELECT 17")
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_records_run_stats(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "last_run_stats", None)
+
+    created = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+    query_job = mock.create_autospec(google.cloud.bigquery.job.QueryJob, instance=True)
+    query_job.job_id = "job_1234"
+    query_job.total_bytes_processed = 2048
+    query_job.slot_millis = 100
+    query_job.cache_hit = False
+    query_job.created = created
+    query_job.started = created + datetime.timedelta(seconds=2)
+    query_job.ended = created + datetime.timedelta(seconds=5)
+    query_job.to_arrow.return_value = pyarrow.table({"num": [1, 2, 3]})
+    bq_client = mock.create_autospec(bigquery.Client, instance=True)
+    bq_client.query.return_value = query_job
+    create_clients_patch = mock.patch(
+        "bigquery_magics.bigquery._create_clients",
+        return_value=(bq_client, None),
+    )
+    with create_clients_patch, io.capture_output() as captured:
+        ip.run_cell_magic(
+            "bigquery",
+            "--dtype_backend pyarrow --no_client_cache --verbose",
+            "SELECT num FROM t",
+        )
+
+    run_stats = bigquery_magics.context.last_run_stats
+    assert run_stats.job_id == "job_1234"
+    assert run_stats.total_bytes_processed == 2048
+    assert run_stats.slot_millis == 100
+    assert run_stats.cache_hit is False
+    assert run_stats.queued_seconds == 2.0
+    assert run_stats.execution_seconds == 3.0
+    assert run_stats.rows_downloaded == 3
+    assert run_stats.bytes_downloaded == 24
+    assert list(run_stats.timings) == [
+        "parse_args",
+        "create_clients",
+        "submit",
+        "wait",
+        "download",
+        "convert",
+        "store",
+    ]
+    assert "Timings: parse_args" in captured.stdout
+    assert "2048 bytes processed, 100 slot-ms, cache miss" in captured.stdout
+    assert "Downloaded: 3 rows, 24 bytes" in captured.stdout
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_run_stats_not_printed_without_verbose():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    query_job = mock.create_autospec(google.cloud.bigquery.job.QueryJob, instance=True)
+    query_job.to_dataframe.return_value = pandas.DataFrame({"num": [17]})
+    client_query_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.query",
+        autospec=True,
+        return_value=query_job,
+    )
+    with client_query_patch, io.capture_output() as captured:
+        ip.run_cell_magic("bigquery", "", "SELECT 17")
+
+    assert "Timings:" not in captured.stdout
+    run_stats = bigquery_magics.context.last_run_stats
+    assert run_stats.rows_downloaded == 1
+    assert "download" in run_stats.timings
+    assert "convert" not in run_stats.timings
+
+
+class _ArrowRows:
+    """Downloads rows like the client library: to_dataframe() converts the
+    Arrow data downloaded by to_arrow().
+    """
+
+    def __init__(self, arrow_table):
+        self.arrow_table = arrow_table
+
+    def to_arrow(self, **kwargs):
+        time.sleep(0.01)
+        return self.arrow_table
+
+    def to_dataframe(self, **kwargs):
+        return self.to_arrow(**kwargs).to_pandas()
+
+
+class _ArrowQueryJob:
+    """Creates a row iterator with result(), like a QueryJob."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def result(self, **kwargs):
+        return self.rows
+
+    def to_dataframe(self, **kwargs):
+        return self.result().to_dataframe(**kwargs)
+
+
+@pytest.mark.parametrize("make_rows", [_ArrowRows, _ArrowQueryJob])
+def test__convert_rows_times_download_and_convert_separately(make_rows):
+    rows = _ArrowRows(pyarrow.table({"num": [1, 2, 3]}))
+    source = rows if make_rows is _ArrowRows else _ArrowQueryJob(rows)
+    args = mock.Mock(output="pandas", dtype_backend=None, use_geodataframe=None)
+    run_stats = stats.RunStats()
+
+    with stats.recording(run_stats):
+        result = magics._convert_rows(source, args)
+
+    assert result["num"].tolist() == [1, 2, 3]
+    assert list(run_stats.timings) == ["download", "convert"]
+    assert run_stats.timings["download"] >= 0.01
+    assert run_stats.timings["convert"] < run_stats.timings["download"]
+    # The methods are restored after the download.
+    assert "to_arrow" not in vars(rows)
+    assert "result" not in vars(source)
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_emits_opentelemetry_spans(monkeypatch):
+    sdk_trace = pytest.importorskip("opentelemetry.sdk.trace")
+    from opentelemetry import trace
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+        InMemorySpanExporter,
+    )
+
+    exporter = InMemorySpanExporter()
+    provider = sdk_trace.TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    monkeypatch.setattr(trace, "get_tracer_provider", lambda: provider)
+
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    query_job = mock.create_autospec(google.cloud.bigquery.job.QueryJob, instance=True)
+    query_job.job_id = "job_1234"
+    query_job.to_dataframe.return_value = pandas.DataFrame({"num": [17]})
+    bq_client = mock.create_autospec(bigquery.Client, instance=True)
+    bq_client.project = "my-project"
+    bq_client.location = "EU"
+    bq_client.query.return_value = query_job
+    create_clients_patch = mock.patch(
+        "bigquery_magics.bigquery._create_clients",
+        return_value=(bq_client, None),
+    )
+    with create_clients_patch, io.capture_output():
+        ip.run_cell_magic("bigquery", "--no_client_cache", "SELECT 17")
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    assert set(spans) == {
+        "bigquery_magics.cell",
+        "bigquery_magics.parse_args",
+        "bigquery_magics.create_clients",
+        "bigquery_magics.submit",
+        "bigquery_magics.wait",
+        "bigquery_magics.download",
+        "bigquery_magics.store",
+    }
+    cell_span = spans["bigquery_magics.cell"]
+    assert cell_span.attributes["bigquery_magics.job_id"] == "job_1234"
+    assert cell_span.attributes["bigquery_magics.project"] == "my-project"
+    assert cell_span.attributes["bigquery_magics.location"] == "EU"
+    assert cell_span.attributes["bigquery_magics.engine"] == "pandas"
+    assert cell_span.attributes["bigquery_magics.rows"] == 1
+    for name, span in spans.items():
+        if span is not cell_span:
+            assert span.parent.span_id == cell_span.context.span_id, name
+
+
+def _run_stats_query(ip, job_id, total_bytes_billed, query):
+    query_job = mock.create_autospec(google.cloud.bigquery.job.QueryJob, instance=True)
+    query_job.job_id = job_id
+    query_job.total_bytes_processed = total_bytes_billed
+    query_job.total_bytes_billed = total_bytes_billed
+    query_job.slot_millis = 10
+    query_job.cache_hit = False
+    query_job.to_dataframe.return_value = pandas.DataFrame({"num": [17]})
+    client_query_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.query",
+        autospec=True,
+        return_value=query_job,
+    )
+    with client_query_patch, io.capture_output():
+        ip.run_cell_magic("bigquery", "", query)
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_stats_magic(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(
+        bigquery_magics.stats, "session_stats", bigquery_magics.stats.SessionStats()
+    )
+
+    _run_stats_query(ip, "job_cheap", 100, "SELECT 1")
+    _run_stats_query(ip, "job_costly", 5000, "SELECT 2")
+
+    with io.capture_output() as captured:
+        ip.run_line_magic("bigquery_stats", "--top 1 --sort_by bytes_billed")
+
+    lines = captured.stdout.splitlines()
+    assert lines[0] == "Cells: 2"
+    assert lines[1].startswith("Query: 5100 bytes processed, 5100 bytes billed")
+    assert "cache hits 0/2 (0%)" in lines[1]
+    assert "Downloaded: 2 rows" in captured.stdout
+    assert "Top 1 cells by bytes_billed:" in captured.stdout
+    assert "job ID job_costly: SELECT 2" in captured.stdout
+    assert "job_cheap" not in captured.stdout
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_stats_magic_keeps_last_cells(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(
+        bigquery_magics.stats, "session_stats", bigquery_magics.stats.SessionStats()
+    )
+    monkeypatch.setattr(bigquery_magics.context, "stats_history_size", 2)
+
+    for index in range(3):
+        _run_stats_query(ip, f"job_{index}", 100, f"SELECT {index}")
+
+    job_ids = [run.job_id for run in bigquery_magics.stats.session_stats.runs()]
+    assert job_ids == ["job_1", "job_2"]
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_stats_magic_reset(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(
+        bigquery_magics.stats, "session_stats", bigquery_magics.stats.SessionStats()
+    )
+    _run_stats_query(ip, "job_1234", 100, "SELECT 1")
+
+    ip.run_line_magic("bigquery_stats", "--reset")
+
+    with io.capture_output() as captured:
+        ip.run_line_magic("bigquery_stats", "")
+    assert "No %%bigquery cells have run" in captured.stdout
+
+
+def test_bigquery_stats_magic_invalid_top():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    with pytest.raises(ValueError, match="--top must be"):
+        ip.run_line_magic("bigquery_stats", "--top -1")
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_to_parquet(tmp_path):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    batch = pyarrow.record_batch([pyarrow.array([1, 2, 3])], names=["num"])
+    rows = mock.create_autospec(table.RowIterator, instance=True)
+    rows.to_arrow_iterable.return_value = iter([batch, batch])
+    query_job = mock.create_autospec(google.cloud.bigquery.job.QueryJob, instance=True)
+    query_job.result.return_value = rows
+    client_query_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.query",
+        autospec=True,
+        return_value=query_job,
+    )
+    path = tmp_path / "results.parquet"
+    line = f"--to_parquet {path} --export_compression zstd --row_group_size 4"
+    with client_query_patch, io.capture_output() as captured_io:
+        return_value = ip.run_cell_magic("bigquery", line, "SELECT 17")
+
+    assert return_value is None
+    assert f"Wrote 6 rows to {path}" in captured_io.stdout
+    assert pyarrow.parquet.read_table(path).column("num").to_pylist() == [1, 2, 3] * 2
+    assert pyarrow.parquet.ParquetFile(path).metadata.num_row_groups == 2
+    query_job.to_dataframe.assert_not_called()
+    rows.to_dataframe.assert_not_called()
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_to_arrow_ipc_w_table_id(tmp_path):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    batch = pyarrow.record_batch([pyarrow.array([1, 2, 3])], names=["num"])
+    rows = mock.create_autospec(table.RowIterator, instance=True)
+    rows.to_arrow_iterable.return_value = iter([batch])
+    list_rows_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.list_rows",
+        autospec=True,
+        return_value=rows,
+    )
+    path = tmp_path / "results.arrow"
+    with list_rows_patch, io.capture_output():
+        ip.run_cell_magic("bigquery", f"--to_arrow_ipc {path}", "ds.table")
+
+    with pyarrow.ipc.open_file(str(path)) as reader:
+        assert reader.read_all().column("num").to_pylist() == [1, 2, 3]
+    rows.to_arrow_iterable.assert_called_once_with(bqstorage_client=mock.ANY)
+    rows.to_dataframe.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    ("line", "message"),
+    [
+        ("--to_parquet a --to_arrow_ipc b", "cannot be used with --to_arrow_ipc"),
+        ("--to_parquet a --dry_run", "cannot be used with --dry_run"),
+        ("--to_parquet a --stream arrow", "cannot be used with --dry_run"),
+        ("--to_parquet a --export_compression bz2", "Invalid --export_compression"),
+        ("--to_arrow_ipc a --export_compression gzip", "Invalid --export_compression"),
+        ("--to_arrow_ipc a --row_group_size 10", "--row_group_size requires"),
+        ("--to_parquet a --row_group_size 0", "--row_group_size must be"),
+        ("--export_compression zstd", "require --to_parquet or --to_arrow_ipc"),
+    ],
+)
+def test_bigquery_magic_export_invalid_options(line, message):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    with pytest.raises(ValueError, match=message):
+        ip.run_cell_magic("bigquery", line, "SELECT 17")
+
+
+@pytest.mark.parametrize(
+    ("line", "context_options", "expected"),
+    [
+        pytest.param(
+            "--max_stream_count 16 --no_preserve_order --bqstorage_compression zstd",
+            {},
+            magics.read_session.ReadSessionOptions(
+                max_stream_count=16, preserve_order=False, compression="zstd"
+            ),
+            id="args",
+        ),
+        pytest.param(
+            "",
+            {"bqstorage_max_stream_count": 8, "bqstorage_compression": "lz4"},
+            magics.read_session.ReadSessionOptions(
+                max_stream_count=8, compression="lz4"
+            ),
+            id="context",
+        ),
+        pytest.param(
+            "--max_stream_count 2 --preserve_order",
+            {"bqstorage_max_stream_count": 8, "bqstorage_preserve_order": False},
+            magics.read_session.ReadSessionOptions(
+                max_stream_count=2, preserve_order=True
+            ),
+            id="args-override-context",
+        ),
+    ],
+)
+def test_bigquery_magic_tunes_read_sessions(
+    monkeypatch, line, context_options, expected
+):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    for name, value in context_options.items():
+        monkeypatch.setattr(bigquery_magics.context, name, value)
+
+    bqstorage_client = mock.Mock()
+    create_clients_patch = mock.patch(
+        "bigquery_magics.bigquery._create_clients",
+        return_value=(mock.Mock(), bqstorage_client),
+    )
+    make_bq_query_patch = mock.patch(
+        "bigquery_magics.bigquery._make_bq_query", autospec=True
+    )
+    with create_clients_patch, make_bq_query_patch as make_bq_query:
+        ip.run_cell_magic("bigquery", line, "SELECT 17")
+
+    tuned_client = make_bq_query.call_args.kwargs["bqstorage_client"]
+    assert isinstance(tuned_client, magics.read_session.TunedReadClient)
+    assert tuned_client.client is bqstorage_client
+    assert tuned_client.options == expected
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_w_max_results_uses_bqstorage():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    query_job = mock.create_autospec(google.cloud.bigquery.job.QueryJob, instance=True)
+    query_job.to_dataframe.return_value = pandas.DataFrame({"num": range(12_000)})
+    bq_client = mock.create_autospec(bigquery.Client, instance=True)
+    bq_client.query.return_value = query_job
+    bqstorage_client = mock.Mock()
+    create_clients_patch = mock.patch(
+        "bigquery_magics.bigquery._create_clients",
+        return_value=(bq_client, bqstorage_client),
+    )
+    with create_clients_patch, io.capture_output():
+        result = ip.run_cell_magic(
+            "bigquery", "--max_results 10000 --no_client_cache", "SELECT num FROM t"
+        )
+
+    assert result["num"].tolist() == list(range(10_000))
+    for call in query_job.result.call_args_list:
+        assert call.kwargs.get("max_results") is None
+    tuned_client = query_job.to_dataframe.call_args.kwargs["bqstorage_client"]
+    assert isinstance(tuned_client, magics.read_session.TunedReadClient)
+    assert tuned_client.client is bqstorage_client
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_w_table_id_and_max_results_uses_bqstorage():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    rows = mock.create_autospec(table.RowIterator, instance=True)
+    rows.to_arrow.return_value = pyarrow.table({"num": range(12_000)})
+    bq_client = mock.create_autospec(bigquery.Client, instance=True)
+    bq_client.list_rows.return_value = rows
+    create_clients_patch = mock.patch(
+        "bigquery_magics.bigquery._create_clients",
+        return_value=(bq_client, mock.Mock()),
+    )
+    with create_clients_patch, io.capture_output():
+        result = ip.run_cell_magic(
+            "bigquery", "--max_results 10000 --output arrow", "ds.table"
+        )
+
+    assert result.num_rows == 10_000
+    bq_client.list_rows.assert_called_once_with("ds.table", max_results=None)
+    tuned_client = rows.to_arrow.call_args.kwargs["bqstorage_client"]
+    assert isinstance(tuned_client, magics.read_session.TunedReadClient)
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_w_table_id_and_columns():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    table_resource = table.Table(
+        "test-project.ds.table",
+        schema=[
+            bigquery.SchemaField("name", "STRING"),
+            bigquery.SchemaField("num", "INTEGER"),
+            bigquery.SchemaField("payload", "BYTES"),
+        ],
+    )
+    bq_client = mock.create_autospec(bigquery.Client, instance=True)
+    bq_client.get_table.return_value = table_resource
+    create_clients_patch = mock.patch(
+        "bigquery_magics.bigquery._create_clients",
+        return_value=(bq_client, None),
+    )
+    with create_clients_patch, io.capture_output():
+        ip.run_cell_magic("bigquery", "--columns NUM,name", "ds.table")
+
+    bq_client.list_rows.assert_called_once_with(
+        table_resource,
+        max_results=None,
+        selected_fields=[table_resource.schema[1], table_resource.schema[0]],
+    )
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_w_table_id_and_unknown_column():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    bq_client = mock.create_autospec(bigquery.Client, instance=True)
+    bq_client.get_table.return_value = table.Table(
+        "test-project.ds.table", schema=[bigquery.SchemaField("num", "INTEGER")]
+    )
+    create_clients_patch = mock.patch(
+        "bigquery_magics.bigquery._create_clients",
+        return_value=(bq_client, None),
+    )
+    with create_clients_patch, io.capture_output() as captured_io:
+        ip.run_cell_magic("bigquery", "--columns missing", "ds.table")
+
+    assert "Unknown column in --columns: missing" in captured_io.stderr
+    bq_client.list_rows.assert_not_called()
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_w_table_id_and_where():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    rows = mock.create_autospec(table.RowIterator, instance=True)
+    rows.to_dataframe.return_value = pandas.DataFrame({"num": range(8)})
+    bq_client = mock.create_autospec(bigquery.Client, instance=True)
+    bq_client.list_rows.return_value = rows
+    bqstorage_client = mock.Mock()
+    create_clients_patch = mock.patch(
+        "bigquery_magics.bigquery._create_clients",
+        return_value=(bq_client, bqstorage_client),
+    )
+    with create_clients_patch, io.capture_output():
+        result = ip.run_cell_magic(
+            "bigquery", '--where "num > 5" --max_results 5', "ds.table"
+        )
+
+    assert len(result) == 5
+    bq_client.list_rows.assert_called_once_with("ds.table", max_results=None)
+    tuned_client = rows.to_dataframe.call_args.kwargs["bqstorage_client"]
+    assert tuned_client.client is bqstorage_client
+    assert tuned_client.options.row_restriction == "num > 5"
+
+
+@pytest.mark.parametrize(
+    ("line", "cell", "bqstorage_client", "message"),
+    [
+        ('--where "num > 5"', "ds.table", None, "requires the BigQuery Storage"),
+        ("--columns num", "SELECT 17 AS num", mock.Mock(), "only be used with"),
+        ('--where "num > 5"', "SELECT 17 AS num", mock.Mock(), "only be used with"),
+        (
+            '--where "num > 5" --max_results 5 --stream arrow',
+            "ds.table",
+            mock.Mock(),
+            "cannot be used with --stream",
+        ),
+    ],
+)
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_columns_and_where_invalid(
+    line, cell, bqstorage_client, message
+):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    create_clients_patch = mock.patch(
+        "bigquery_magics.bigquery._create_clients",
+        return_value=(mock.create_autospec(bigquery.Client), bqstorage_client),
+    )
+    with create_clients_patch, pytest.raises(ValueError, match=message):
+        ip.run_cell_magic("bigquery", line, cell)
+
+
+def test_bigquery_magic_invalid_max_stream_count():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    create_clients_patch = mock.patch(
+        "bigquery_magics.bigquery._create_clients",
+        return_value=(mock.Mock(), mock.Mock()),
+    )
+    with create_clients_patch, pytest.raises(ValueError, match="--max_stream_count"):
+        ip.run_cell_magic("bigquery", "--max_stream_count=-1", "SELECT 17")
+
+
+def test_bigquery_magic_w_max_results_query_job_results_fails(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    bigquery_magics.context._project = None
+    monkeypatch.setattr(bigquery_magics.context, "reuse_clients", False)
+
+    credentials_mock = mock.create_autospec(
+        google.auth.credentials.Credentials, instance=True
+    )
+    default_patch = mock.patch(
+        "google.auth.default", return_value=(credentials_mock, "general-project")
+    )
+    client_query_patch = mock.patch(
+        "google.cloud.bigquery.client.Client.query", autospec=True
+    )
+    close_transports_patch = mock.patch(
+        "bigquery_magics.bigquery._close_transports",
+        autospec=True,
+    )
+
+    sql = "SELECT 17 AS num"
+
+    query_job_mock = mock.create_autospec(
+        google.cloud.bigquery.job.QueryJob, instance=True
+    )
+    query_job_mock.result.side_effect = [[], OSError]
+
+    with pytest.raises(
+        OSError
+    ), client_query_patch as client_query_mock, (
+        default_patch
+    ), close_transports_patch as close_transports:
+        client_query_mock.return_value = query_job_mock
+        ip.run_cell_magic("bigquery", "--max_results=5", sql)
+
+    assert close_transports.called
+
+
+def test_bigquery_magic_w_table_id_invalid():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    bigquery_magics.context._project = None
+
+    credentials_mock = mock.create_autospec(
+        google.auth.credentials.Credentials, instance=True
+    )
+    default_patch = mock.patch(
+        "google.auth.default", return_value=(credentials_mock, "general-project")
+    )
+
+    list_rows_patch = mock.patch(
+        "google.cloud.bigquery.Client.list_rows",
+        autospec=True,
+        side_effect=exceptions.BadRequest("Not a valid table ID"),
+    )
+
+    table_id = "not-a-real-table"
+
+    with list_rows_patch, default_patch, io.capture_output() as captured_io:
+        ip.run_cell_magic("bigquery", "df", table_id)
+
+    output = captured_io.stderr
+    assert "Could not save output to variable" in output
+    assert "400 Not a valid table ID" in output
+    assert "Traceback (most recent call last)" not in output
+
+
+def test_bigquery_magic_w_missing_query():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    bigquery_magics.context._project = None
+
+    credentials_mock = mock.create_autospec(
+        google.auth.credentials.Credentials, instance=True
+    )
+    default_patch = mock.patch(
+        "google.auth.default", return_value=(credentials_mock, "general-project")
+    )
+
+    cell_body = "   \n    \n   \t\t  \n  "
+
+    with io.capture_output() as captured_io, default_patch:
+        ip.run_cell_magic("bigquery", "df", cell_body)
+
+    output = captured_io.stderr
+    assert "Could not save output to variable" in output
+    assert "Query is missing" in output
+    assert "Traceback (most recent call last)" not in output
+
+
+def test_bigquery_magic_w_table_id_and_default_variable(
+    ipython_ns_cleanup, monkeypatch
+):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    bigquery_magics.context._project = None
+    monkeypatch.setattr(bigquery_magics.context, "default_variable", "_bq_df")
+
+    ipython_ns_cleanup.append((ip, "df"))
+
+    credentials_mock = mock.create_autospec(
+        google.auth.credentials.Credentials, instance=True
+    )
+    default_patch = mock.patch(
+        "google.auth.default", return_value=(credentials_mock, "general-project")
+    )
+
+    row_iterator_mock = mock.create_autospec(
+        google.cloud.bigquery.table.RowIterator, instance=True
+    )
+
+    client_patch = mock.patch("google.cloud.bigquery.Client", autospec=True)
+
+    table_id = "bigquery-public-data.samples.shakespeare"
+    result = pandas.DataFrame([17], columns=["num"])
+
+    with client_patch as client_mock, default_patch:
+        client_mock().list_rows.return_value = row_iterator_mock
+        row_iterator_mock.to_dataframe.return_value = result
+
+        ip.run_cell_magic("bigquery", "", table_id)
+
+    assert "_bq_df" in ip.user_ns
+    df = ip.user_ns["_bq_df"]
+
+    assert isinstance(df, pandas.DataFrame)
+
+
+def test_bigquery_magic_w_table_id_and_destination_var(ipython_ns_cleanup):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    bigquery_magics.context._project = None
+
+    ipython_ns_cleanup.append((ip, "df"))
+
+    credentials_mock = mock.create_autospec(
+        google.auth.credentials.Credentials, instance=True
+    )
+    default_patch = mock.patch(
+        "google.auth.default", return_value=(credentials_mock, "general-project")
+    )
+
+    row_iterator_mock = mock.create_autospec(
+        google.cloud.bigquery.table.RowIterator, instance=True
+    )
+
+    client_patch = mock.patch("google.cloud.bigquery.Client", autospec=True)
+
+    table_id = "bigquery-public-data.samples.shakespeare"
+    result = pandas.DataFrame([17], columns=["num"])
+
+    with client_patch as client_mock, default_patch:
+        client_mock().list_rows.return_value = row_iterator_mock
+        row_iterator_mock.to_dataframe.return_value = result
+
+        ip.run_cell_magic("bigquery", "df", table_id)
+
+    assert "df" in ip.user_ns
+    df = ip.user_ns["df"]
+
+    assert isinstance(df, pandas.DataFrame)
+
+
+@pytest.mark.skipif(
+    bigquery_storage is None, reason="Requires `google-cloud-bigquery-storage`"
+)
+def test_bigquery_magic_w_table_id_and_bqstorage_client():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    bigquery_magics.context._project = None
+
+    credentials_mock = mock.create_autospec(
+        google.auth.credentials.Credentials, instance=True
+    )
+    default_patch = mock.patch(
+        "google.auth.default", return_value=(credentials_mock, "general-project")
+    )
+
+    row_iterator_mock = mock.create_autospec(
+        google.cloud.bigquery.table.RowIterator, instance=True
+    )
+
+    client_patch = mock.patch("google.cloud.bigquery.Client", autospec=True)
+
+    bqstorage_mock = mock.create_autospec(bigquery_storage.BigQueryReadClient)
+    bqstorage_instance_mock = mock.create_autospec(
+        bigquery_storage.BigQueryReadClient, instance=True
+    )
+    bqstorage_instance_mock._transport = mock.Mock()
+    bqstorage_mock.return_value = bqstorage_instance_mock
+    bqstorage_client_patch = mock.patch(
+        "google.cloud.bigquery_storage.BigQueryReadClient", bqstorage_mock
+    )
+
+    table_id = "bigquery-public-data.samples.shakespeare"
+
+    with default_patch, client_patch as client_mock, bqstorage_client_patch:
+        client_mock()._ensure_bqstorage_client.return_value = bqstorage_instance_mock
+        client_mock().list_rows.return_value = row_iterator_mock
+
+        ip.run_cell_magic("bigquery", "--max_results=5", table_id)
+        row_iterator_mock.to_dataframe.assert_called_once_with(
+            bqstorage_client=bqstorage_instance_mock,
+            create_bqstorage_client=mock.ANY,
+        )
+
+
+def test_bigquery_magic_dryrun_option_sets_job_config():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    bigquery_magics.context.credentials = mock.create_autospec(
+        google.auth.credentials.Credentials, instance=True
+    )
+
+    run_query_patch = mock.patch("bigquery_magics.bigquery._run_query", autospec=True)
+
+    sql = "SELECT 17 AS num"
 
     with run_query_patch as run_query_mock:
         ip.run_cell_magic("bigquery", "--dry_run", sql)
@@ -2391,6 +4757,53 @@ def test_bigquery_magic_with_project():
         assert bigquery_magics.context.project == "general-project"
 
 
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_reuses_clients_across_cells():
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    run_query_patch = mock.patch("bigquery_magics.bigquery._run_query", autospec=True)
+    close_transports_patch = mock.patch(
+        "bigquery_magics.bigquery._close_transports", autospec=True
+    )
+    with run_query_patch as run_query_mock, close_transports_patch as close_transports:
+        ip.run_cell_magic("bigquery", "--use_rest_api", "SELECT 17 as num")
+        ip.run_cell_magic("bigquery", "--use_rest_api", "SELECT 18 as num")
+        ip.run_cell_magic(
+            "bigquery", "--use_rest_api --project=other-project", "SELECT 19 as num"
+        )
+
+    first_client = run_query_mock.call_args_list[0][0][0]
+    second_client = run_query_mock.call_args_list[1][0][0]
+    other_project_client = run_query_mock.call_args_list[2][0][0]
+    assert first_client is second_client
+    assert other_project_client is not first_client
+    assert other_project_client.project == "other-project"
+    close_transports.assert_not_called()
+
+
+@pytest.mark.usefixtures("mock_credentials")
+def test_bigquery_magic_without_reuse_clients_creates_clients_per_cell(monkeypatch):
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "reuse_clients", False)
+
+    run_query_patch = mock.patch("bigquery_magics.bigquery._run_query", autospec=True)
+    close_transports_patch = mock.patch(
+        "bigquery_magics.bigquery._close_transports", autospec=True
+    )
+    with run_query_patch as run_query_mock, close_transports_patch as close_transports:
+        ip.run_cell_magic("bigquery", "--use_rest_api", "SELECT 17 as num")
+        ip.run_cell_magic("bigquery", "--use_rest_api", "SELECT 18 as num")
+
+    first_client = run_query_mock.call_args_list[0][0][0]
+    second_client = run_query_mock.call_args_list[1][0][0]
+    assert first_client is not second_client
+    assert close_transports.call_count == 2
+
+
 def test_bigquery_magic_with_bigquery_api_endpoint(ipython_ns_cleanup):
     globalipapp.start_ipython()
     ip = globalipapp.get_ipython()
@@ -2916,7 +5329,7 @@ def test_bigquery_magic_w_destination_table_invalid_format():
     ip = globalipapp.get_ipython()
     ip.extension_manager.load_extension("bigquery_magics")
 
-    client_patch = mock.patch("bigquery_magics.bigquery.bigquery.Client", autospec=True)
+    client_patch = mock.patch("google.cloud.bigquery.Client", autospec=True)
 
     with client_patch, pytest.raises(ValueError) as exc_context:
         ip.run_cell_magic(
@@ -2958,10 +5371,11 @@ def test_bigquery_magic_w_destination_table():
 
 
 @pytest.mark.usefixtures("mock_credentials")
-def test_bigquery_magic_create_dataset_fails():
+def test_bigquery_magic_create_dataset_fails(monkeypatch):
     globalipapp.start_ipython()
     ip = globalipapp.get_ipython()
     ip.extension_manager.load_extension("bigquery_magics")
+    monkeypatch.setattr(bigquery_magics.context, "reuse_clients", False)
 
     create_dataset_if_necessary_patch = mock.patch(
         "bigquery_magics.bigquery._create_dataset_if_necessary",
@@ -3191,6 +5605,21 @@ def test_bigquery_magic_bigframes_with_dry_run__should_fail():
         ip.run_cell_magic("bigquery", "--dry_run", sql)
 
 
+@pytest.mark.usefixtures("mock_credentials", "set_bigframes_engine_in_context")
+def test_bigquery_magic_bigframes_with_output__should_fail():
+    if bpd is None:
+        pytest.skip("BigFrames not installed")
+
+    globalipapp.start_ipython()
+    ip = globalipapp.get_ipython()
+    ip.extension_manager.load_extension("bigquery_magics")
+
+    bf_patch = mock.patch("bigframes.pandas.read_gbq_query", autospec=True)
+
+    with bf_patch, pytest.raises(ValueError, match="--output"):
+        ip.run_cell_magic("bigquery", "--output arrow", "SELECT 17")
+
+
 def test_test_bigquery_magic__extension_not_loaded__is_registered():
     globalipapp.start_ipython()
     ip = globalipapp.get_ipython()
@@ -32,3 +32,19 @@ def test_empy_input(lexer_class):
     tokens = list(lexer)
 
     assert tokens == [Token(TokenType.EOL, lexeme="", pos=0)]
+
+
+def test_quoted_option_value(lexer_class):
+    from bigquery_magics.line_arg_parser import TokenType
+    from bigquery_magics.line_arg_parser.lexer import Token
+
+    lexer = lexer_class('--where "num > 5" --max_results 5')
+    tokens = [token for token in lexer if token.type_ != TokenType.WS]
+
+    assert tokens == [
+        Token(TokenType.OPTION_SPEC, lexeme="--where", pos=0),
+        Token(TokenType.OPT_VAL, lexeme='"num > 5"', pos=8),
+        Token(TokenType.OPTION_SPEC, lexeme="--max_results", pos=18),
+        Token(TokenType.OPT_VAL, lexeme="5", pos=32),
+        Token(TokenType.EOL, lexeme="", pos=33),
+    ]
@@ -0,0 +1,195 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gc
+from unittest import mock
+import weakref
+
+import google.auth.credentials
+import google.cloud.bigquery
+import pytest
+
+import bigquery_magics
+from bigquery_magics import client_pool as client_pool_module
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    credentials = mock.create_autospec(
+        google.auth.credentials.Credentials, instance=True
+    )
+    monkeypatch.setattr(bigquery_magics.context, "_project", "test-project")
+    monkeypatch.setattr(bigquery_magics.context, "_credentials", credentials)
+    monkeypatch.setattr(bigquery_magics.context, "_connection", None)
+
+    pool = client_pool_module.ClientPool()
+    yield pool
+    pool.close()
+
+
+def _get_bq_client(pool, project=None, endpoint=None, location=None):
+    return pool.get_bq_client(
+        project=project, bigquery_api_endpoint=endpoint, location=location
+    )
+
+
+def test_get_bq_client_reuses_client(pool):
+    client = _get_bq_client(pool)
+
+    assert isinstance(client, google.cloud.bigquery.Client)
+    assert client.project == "test-project"
+    assert _get_bq_client(pool) is client
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"project": "other-project"},
+        {"endpoint": "https://bigquery.example.com"},
+        {"location": "EU"},
+    ],
+)
+def test_get_bq_client_keyed_by_arguments(pool, kwargs):
+    client = _get_bq_client(pool)
+
+    assert _get_bq_client(pool, **kwargs) is not client
+    assert _get_bq_client(pool) is client
+
+
+def test_get_bq_client_keyed_by_credentials(pool, monkeypatch):
+    client = _get_bq_client(pool)
+
+    other_credentials = mock.create_autospec(
+        google.auth.credentials.Credentials, instance=True
+    )
+    monkeypatch.setattr(bigquery_magics.context, "_credentials", other_credentials)
+
+    assert _get_bq_client(pool) is not client
+
+
+def test_replaced_credentials_evict_their_clients_without_closing(pool, monkeypatch):
+    client = _get_bq_client(pool)
+    bqstorage_client = pool.get_bqstorage_client(
+        client, bqstorage_api_endpoint=None, factory=mock.Mock
+    )
+
+    other_credentials = mock.create_autospec(
+        google.auth.credentials.Credentials, instance=True
+    )
+    monkeypatch.setattr(bigquery_magics.context, "_credentials", other_credentials)
+    with mock.patch.object(client, "close") as close:
+        new_client = _get_bq_client(pool)
+
+    # An --async cell may still be downloading through the evicted clients.
+    close.assert_not_called()
+    bqstorage_client._transport.grpc_channel.close.assert_not_called()
+    assert new_client is not client
+    assert len(pool._clients) == 1
+
+
+def test_pool_does_not_keep_credentials_alive(pool, monkeypatch):
+    credentials = mock.create_autospec(
+        google.auth.credentials.Credentials, instance=True
+    )
+    credentials_ref = weakref.ref(credentials)
+    # The previous credentials are restored after the test.
+    monkeypatch.setattr(bigquery_magics.context, "_credentials", credentials)
+    with mock.patch.object(client_pool_module.core, "create_bq_client"):
+        _get_bq_client(pool)
+
+    bigquery_magics.context._credentials = None
+    del credentials
+    gc.collect()
+
+    assert credentials_ref() is None
+
+
+def test_context_settings_change_invalidates_pool(pool, monkeypatch):
+    client = _get_bq_client(pool)
+
+    with mock.patch.object(client, "close") as close:
+        monkeypatch.setattr(
+            bigquery_magics.context,
+            "bigquery_client_options",
+            {"api_endpoint": "https://bigquery.example.com"},
+        )
+        new_client = _get_bq_client(pool)
+
+    close.assert_not_called()
+    assert new_client is not client
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda job_config: setattr(job_config, "maximum_bytes_billed", 1000),
+        lambda job_config: job_config.labels.update({"team": "data"}),
+    ],
+)
+def test_default_query_job_config_change_invalidates_pool(pool, monkeypatch, change):
+    monkeypatch.setattr(
+        bigquery_magics.context,
+        "default_query_job_config",
+        google.cloud.bigquery.QueryJobConfig(labels={}),
+    )
+    client = _get_bq_client(pool)
+
+    change(bigquery_magics.context.default_query_job_config)
+    new_client = _get_bq_client(pool)
+
+    assert new_client is not client
+    assert _get_bq_client(pool) is new_client
+
+
+def test_get_bqstorage_client_reuses_client(pool):
+    bq_client = _get_bq_client(pool)
+    factory = mock.Mock(side_effect=lambda: mock.Mock())
+
+    bqstorage_client = pool.get_bqstorage_client(
+        bq_client, bqstorage_api_endpoint=None, factory=factory
+    )
+    assert (
+        pool.get_bqstorage_client(
+            bq_client, bqstorage_api_endpoint=None, factory=factory
+        )
+        is bqstorage_client
+    )
+    assert (
+        pool.get_bqstorage_client(
+            bq_client, bqstorage_api_endpoint="bqstorage.example.com", factory=factory
+        )
+        is not bqstorage_client
+    )
+    assert factory.call_count == 2
+
+
+def test_close_closes_all_transports(pool):
+    bq_client = _get_bq_client(pool)
+    bqstorage_client = pool.get_bqstorage_client(
+        bq_client, bqstorage_api_endpoint=None, factory=mock.Mock
+    )
+
+    with mock.patch.object(bq_client, "close", side_effect=OSError) as close:
+        pool.close()
+
+    close.assert_called_once_with()
+    bqstorage_client._transport.grpc_channel.close.assert_called_once_with()
+    assert _get_bq_client(pool) is not bq_client
+
+
+def test_unload_extension_closes_pool():
+    with mock.patch.object(client_pool_module.client_pool, "close") as close:
+        bigquery_magics.unload_ipython_extension(mock.Mock())
+
+    close.assert_called_once_with()
@@ -12,6 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import datetime
+import threading
+import time
 import unittest.mock as mock
 
 import google.auth.credentials
@@ -19,6 +22,7 @@ import pydata_google_auth
 import pytest
 
 import bigquery_magics
+import bigquery_magics.config
 
 
 def test_context_with_default_credentials():
@@ -42,7 +46,161 @@ def test_context_with_default_credentials():
         assert bigquery_magics.context.credentials is credentials_mock
         assert bigquery_magics.context.project == project
 
-    assert default_mock.call_count == 2
+    # Credentials and project are resolved together.
+    assert default_mock.call_count == 1
+
+
+def test_context_resolves_default_credentials_once_across_threads(monkeypatch):
+    monkeypatch.setattr(bigquery_magics.context, "_credentials", None)
+    monkeypatch.setattr(bigquery_magics.context, "_project", None)
+
+    credentials_mock = mock.create_autospec(
+        google.auth.credentials.Credentials, instance=True
+    )
+
+    def slow_default(*args, **kwargs):
+        time.sleep(0.1)
+        return credentials_mock, "prahj-ekt"
+
+    default_patch = mock.patch.object(
+        pydata_google_auth, "default", autospec=True, side_effect=slow_default
+    )
+    results = []
+
+    def resolve():
+        results.append(
+            (bigquery_magics.context.credentials, bigquery_magics.context.project)
+        )
+
+    with default_patch as default_mock:
+        threads = [threading.Thread(target=resolve) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert default_mock.call_count == 1
+    assert results == [(credentials_mock, "prahj-ekt")] * 4
+
+
+def test_context_resolves_missing_default_project_once(monkeypatch):
+    monkeypatch.setattr(bigquery_magics.context, "_credentials", None)
+    monkeypatch.setattr(bigquery_magics.context, "_project", None)
+    monkeypatch.setattr(
+        bigquery_magics.context, "_credentials_without_default_project", None
+    )
+
+    credentials_mock = mock.create_autospec(
+        google.auth.credentials.Credentials, instance=True
+    )
+    default_patch = mock.patch.object(
+        pydata_google_auth,
+        "default",
+        autospec=True,
+        return_value=(credentials_mock, None),
+    )
+    with default_patch as default_mock:
+        assert bigquery_magics.context.project is None
+        assert bigquery_magics.context.project is None
+        assert bigquery_magics.context.credentials is credentials_mock
+
+    assert default_mock.call_count == 1
+
+
+def test_context_refreshes_token_once_across_threads(monkeypatch):
+    context = bigquery_magics.config.Context()
+    credentials_mock = mock.Mock(spec=["token", "expiry", "refresh"])
+    credentials_mock.token = None
+
+    def slow_refresh(request):
+        time.sleep(0.1)
+        credentials_mock.token = "token"
+
+    credentials_mock.refresh.side_effect = slow_refresh
+
+    # For example the background refresh and the warm-up on extension load.
+    threads = [
+        threading.Thread(target=context._refresh_token, args=(credentials_mock, None))
+        for _ in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert credentials_mock.refresh.call_count == 1
+
+
+@pytest.mark.parametrize(
+    ("token", "expires_in", "expected"),
+    [
+        pytest.param(None, None, 0.0, id="no-token"),
+        pytest.param("token", None, None, id="never-expires"),
+        pytest.param("token", datetime.timedelta(hours=1), 55 * 60, id="valid"),
+        pytest.param("token", datetime.timedelta(minutes=1), 0.0, id="expiring"),
+    ],
+)
+def test__seconds_until_refresh(token, expires_in, expected):
+    credentials = mock.Mock(spec=["token", "expiry"])
+    credentials.token = token
+    credentials.expiry = None
+    if expires_in is not None:
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        credentials.expiry = now + expires_in
+
+    delay = bigquery_magics.config._seconds_until_refresh(credentials)
+
+    if expected is None:
+        assert delay is None
+    else:
+        assert delay == pytest.approx(expected, abs=5)
+
+
+def test_context_refreshes_default_credentials_in_background(monkeypatch):
+    context = bigquery_magics.config.Context()
+    monkeypatch.setattr(context, "_credentials", None)
+    monkeypatch.setattr(context, "_project", None)
+
+    refreshed = threading.Event()
+    credentials_mock = mock.Mock(spec=["token", "expiry", "refresh"])
+    credentials_mock.token = None
+    credentials_mock.expiry = None
+
+    def refresh(request):
+        credentials_mock.token = "token"
+        credentials_mock.expiry = datetime.datetime.now(datetime.timezone.utc).replace(
+            tzinfo=None
+        ) + datetime.timedelta(hours=1)
+        refreshed.set()
+
+    credentials_mock.refresh.side_effect = refresh
+    default_patch = mock.patch.object(
+        pydata_google_auth,
+        "default",
+        autospec=True,
+        return_value=(credentials_mock, "prahj-ekt"),
+    )
+
+    with default_patch:
+        assert context.credentials is credentials_mock
+
+    # No token yet, so it is fetched right away.
+    first_timer = context._credentials_refresh_timer
+    assert first_timer.interval == 0.0
+    first_timer.join(timeout=10)
+    assert refreshed.is_set()
+
+    # The next refresh is scheduled ahead of the token expiry.
+    timer = context._credentials_refresh_timer
+    assert timer is not None
+    assert timer.interval == pytest.approx(55 * 60, abs=5)
+
+    # Replacing the credentials cancels the scheduled refresh.
+    context.credentials = mock.Mock()
+    assert context._credentials_refresh_timer is None
+    timer.join(timeout=10)
+    assert not timer.is_alive()
+    assert credentials_mock.refresh.call_count == 1
 
 
 def test_context_credentials_and_project_can_be_set_explicitly():
@@ -86,3 +244,36 @@ def test_context_set_engine(monkeypatch, engine):
 def test_context_set_invalid_engine(monkeypatch):
     with pytest.raises(ValueError):
         monkeypatch.setattr(bigquery_magics.context, "engine", "whatever")
+
+
+@pytest.mark.parametrize("output_format", ["pandas", "arrow", "polars"])
+def test_context_set_output_format(monkeypatch, output_format):
+    monkeypatch.setattr(bigquery_magics.context, "output_format", output_format)
+    assert bigquery_magics.context.output_format == output_format
+
+
+def test_context_set_invalid_output_format(monkeypatch):
+    with pytest.raises(ValueError):
+        monkeypatch.setattr(bigquery_magics.context, "output_format", "whatever")
+
+
+@pytest.mark.parametrize("policy", ["error", "sample", "stream", "spill"])
+def test_context_set_memory_budget_policy(monkeypatch, policy):
+    monkeypatch.setattr(bigquery_magics.context, "memory_budget_policy", policy)
+    assert bigquery_magics.context.memory_budget_policy == policy
+
+
+def test_context_set_invalid_memory_budget_policy(monkeypatch):
+    with pytest.raises(ValueError, match="memory_budget_policy must be"):
+        monkeypatch.setattr(bigquery_magics.context, "memory_budget_policy", "whatever")
+
+
+def test_context_set_stats_history_size(monkeypatch):
+    monkeypatch.setattr(bigquery_magics.context, "stats_history_size", 10)
+    assert bigquery_magics.context.stats_history_size == 10
+
+
+@pytest.mark.parametrize("size", [0, -1, 1.5, True])
+def test_context_set_invalid_stats_history_size(monkeypatch, size):
+    with pytest.raises(ValueError, match="stats_history_size must be"):
+        monkeypatch.setattr(bigquery_magics.context, "stats_history_size", size)
@@ -0,0 +1,183 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import os
+from unittest import mock
+
+import google.cloud.bigquery
+import pandas
+import pyarrow
+import pytest
+
+import bigquery_magics
+from bigquery_magics import disk_cache as disk_cache_module
+from bigquery_magics.result_cache import ResultInfo
+
+STARTED = datetime.datetime(2026, 1, 1, 12, tzinfo=datetime.timezone.utc)
+
+
+def _info(job_id="job_1"):
+    return ResultInfo(
+        job_id=job_id, started=STARTED, referenced_tables=["my-project.ds.t"]
+    )
+
+
+def _bq_client(modified=STARTED - datetime.timedelta(hours=1)):
+    bq_client = mock.create_autospec(google.cloud.bigquery.Client, instance=True)
+    bq_client.get_table.return_value = mock.Mock(modified=modified, table_type="TABLE")
+    return bq_client
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(bigquery_magics.context, "disk_cache_dir", str(tmp_path))
+    return disk_cache_module.DiskCache()
+
+
+def _files(tmp_path):
+    return sorted(path.name for path in tmp_path.iterdir())
+
+
+@pytest.mark.parametrize("compression", ["lz4", "zstd", None])
+def test_put_get_round_trip(cache, tmp_path, monkeypatch, compression):
+    monkeypatch.setattr(bigquery_magics.context, "disk_cache_compression", compression)
+    result = pandas.DataFrame(
+        {
+            "num": [1, 2, 3],
+            "name": ["a", None, "c"],
+            "value": [0.5, float("nan"), 2.5],
+            "ts": pandas.to_datetime(["2026-01-01", "2026-01-02", None], utc=True),
+        }
+    )
+
+    cache.put("key", result, _info())
+    cached, info = cache.get("key", _bq_client())
+
+    pandas.testing.assert_frame_equal(cached, result)
+    assert info == _info()
+    assert _files(tmp_path) == ["key-job_1.arrow"]
+    assert cache.stats()["hits"] == 1
+
+
+def test_put_get_arrow_table(cache):
+    result = pyarrow.table({"num": [1, 2, 3], "name": ["a", None, "c"]})
+
+    cache.put("key", result, _info())
+    cached, _ = cache.get("key", _bq_client())
+
+    assert isinstance(cached, pyarrow.Table)
+    assert cached.equals(result)
+
+
+def test_put_polars_dataframe(cache):
+    polars = pytest.importorskip("polars")
+    result = polars.DataFrame({"num": [1, 2, 3]})
+
+    cache.put("key", result, _info())
+    cached, _ = cache.get("key", _bq_client())
+
+    assert cached.equals(result.to_arrow())
+
+
+def test_get_miss(cache):
+    assert cache.get("key", _bq_client()) is None
+    assert cache.misses == 1
+
+
+def test_disabled_without_directory(monkeypatch):
+    monkeypatch.setattr(bigquery_magics.context, "disk_cache_dir", None)
+    cache = disk_cache_module.DiskCache()
+
+    cache.put("key", pandas.DataFrame({"num": [1]}), _info())
+
+    assert cache.get("key", _bq_client()) is None
+    assert cache.stats() == {"hits": 0, "misses": 0, "entries": 0, "bytes": 0}
+
+
+def test_get_removes_stale_file(cache, tmp_path):
+    cache.put("key", pandas.DataFrame({"num": [1]}), _info())
+
+    bq_client = _bq_client(modified=STARTED + datetime.timedelta(minutes=1))
+    assert cache.get("key", bq_client) is None
+    assert _files(tmp_path) == []
+
+
+def test_get_removes_unreadable_file(cache, tmp_path):
+    (tmp_path / "key-job_1.arrow").write_bytes(b"not an arrow file")
+
+    assert cache.get("key", _bq_client()) is None
+    assert _files(tmp_path) == []
+
+
+def test_put_replaces_results_of_earlier_job(cache, tmp_path):
+    cache.put("key", pandas.DataFrame({"num": [1]}), _info("job_1"))
+    cache.put("key", pandas.DataFrame({"num": [2]}), _info("job_2"))
+
+    cached, info = cache.get("key", _bq_client())
+    assert info.job_id == "job_2"
+    assert cached["num"].tolist() == [2]
+    assert _files(tmp_path) == ["key-job_2.arrow"]
+
+
+def test_put_evicts_least_recently_used(cache, tmp_path, monkeypatch):
+    frame = pandas.DataFrame({"num": range(1000)})
+    cache.put("a", frame, _info())
+    file_size = (tmp_path / "a-job_1.arrow").stat().st_size
+    monkeypatch.setattr(
+        bigquery_magics.context, "disk_cache_max_bytes", file_size * 2.5
+    )
+    cache.put("b", frame, _info())
+    for age, name in enumerate(["a-job_1.arrow", "b-job_1.arrow"]):
+        os.utime(tmp_path / name, (1000 - age, 1000 - age))
+
+    # Reading "b" makes "a" the least recently used.
+    assert cache.get("b", _bq_client()) is not None
+    cache.put("c", frame, _info())
+
+    assert _files(tmp_path) == ["b-job_1.arrow", "c-job_1.arrow"]
+
+
+def test_put_skips_results_larger_than_cache(cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(bigquery_magics.context, "disk_cache_max_bytes", 100)
+
+    cache.put("key", pandas.DataFrame({"num": range(1000)}), _info())
+
+    assert _files(tmp_path) == []
+
+
+def test_put_skips_results_not_convertible_to_arrow(cache, tmp_path):
+    cache.put("key", pandas.DataFrame({"mixed": [1, "a"]}), _info())
+
+    assert _files(tmp_path) == []
+
+
+def test_put_creates_directory(tmp_path, monkeypatch):
+    directory = tmp_path / "nested" / "cache"
+    monkeypatch.setattr(bigquery_magics.context, "disk_cache_dir", str(directory))
+    cache = disk_cache_module.DiskCache()
+
+    cache.put("key", pandas.DataFrame({"num": [1]}), _info())
+
+    assert _files(directory) == ["key-job_1.arrow"]
+
+
+def test_clear(cache, tmp_path):
+    cache.put("key", pandas.DataFrame({"num": [1]}), _info())
+    cache.get("key", _bq_client())
+
+    cache.clear()
+
+    assert _files(tmp_path) == []
+    assert cache.stats() == {"hits": 0, "misses": 0, "entries": 0, "bytes": 0}
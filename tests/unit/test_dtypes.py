@@ -0,0 +1,151 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pandas
+import pyarrow
+import pytest
+
+from bigquery_magics import dtypes
+
+
+def test_arrow_to_pandas():
+    table = pyarrow.table({"name": ["a", "b"], "num": [1, None]})
+
+    dataframe = dtypes.arrow_to_pandas(table)
+
+    assert dataframe["name"].dtype == pandas.ArrowDtype(pyarrow.string())
+    assert dataframe["num"].dtype == pandas.ArrowDtype(pyarrow.int64())
+    assert dataframe["num"].isna().tolist() == [False, True]
+
+
+def test_optimize_low_cardinality_strings():
+    dataframe = pandas.DataFrame({"country": ["US", "FR", "US", "US"] * 100})
+
+    optimized, before, after = dtypes.optimize(dataframe)
+
+    assert isinstance(optimized["country"].dtype, pandas.CategoricalDtype)
+    assert optimized["country"].tolist() == dataframe["country"].tolist()
+    assert after < before
+
+
+def test_optimize_high_cardinality_strings():
+    dataframe = pandas.DataFrame({"id": [f"id-{i}" for i in range(100)]})
+
+    optimized, _, _ = dtypes.optimize(dataframe)
+
+    assert optimized["id"].dtype.storage == "pyarrow"
+    assert optimized["id"].tolist() == dataframe["id"].tolist()
+
+
+def test_optimize_leaves_non_string_objects():
+    dataframe = pandas.DataFrame({"list": [[1, 2], [3]]})
+
+    optimized, before, after = dtypes.optimize(dataframe)
+
+    assert optimized["list"].dtype == object
+    assert after == before
+
+
+@pytest.mark.parametrize(
+    ("values", "expected"),
+    [
+        ([0, 127, -128], "int8"),
+        ([0, 128], "int16"),
+        ([-40_000, 1], "int32"),
+        ([0, 2**40], "int64"),
+    ],
+)
+def test_optimize_downcasts_integers(values, expected):
+    dataframe = pandas.DataFrame({"num": pandas.Series(values, dtype="int64")})
+
+    optimized, _, _ = dtypes.optimize(dataframe)
+
+    assert optimized["num"].dtype == expected
+    assert optimized["num"].tolist() == values
+
+
+def test_optimize_downcasts_nullable_integers():
+    dataframe = pandas.DataFrame({"num": pandas.Series([1, None], dtype="Int64")})
+
+    optimized, _, _ = dtypes.optimize(dataframe)
+
+    assert optimized["num"].dtype == "Int8"
+    assert optimized["num"].isna().tolist() == [False, True]
+
+
+def test_optimize_downcasts_arrow_columns():
+    table = pyarrow.table({"num": [1, 300], "ratio": [0.5, 0.25]})
+    dataframe = dtypes.arrow_to_pandas(table)
+
+    optimized, _, _ = dtypes.optimize(dataframe)
+
+    assert optimized["num"].dtype == pandas.ArrowDtype(pyarrow.int16())
+    assert optimized["ratio"].dtype == pandas.ArrowDtype(pyarrow.float32())
+
+
+@pytest.mark.parametrize(
+    ("values", "expected"),
+    [
+        ([0.5, 1.25], "float32"),
+        ([1.0, 2.0**24], "float32"),
+        ([0.1, 1.0], "float64"),
+        ([1.0, 2.0**24 + 1], "float64"),
+        ([1e300], "float64"),
+    ],
+)
+def test_optimize_downcasts_floats_without_loss(values, expected):
+    dataframe = pandas.DataFrame({"ratio": values})
+
+    optimized, _, _ = dtypes.optimize(dataframe)
+
+    assert optimized["ratio"].dtype == expected
+    assert optimized["ratio"].tolist() == values
+
+
+def test_optimize_downcasts_floats_with_missing_values():
+    dataframe = pandas.DataFrame({"score": [3.0, None, 4.5] * 100})
+
+    optimized, before, after = dtypes.optimize(dataframe)
+
+    assert optimized["score"].dtype == "float32"
+    assert optimized["score"].isna().sum() == 100
+    assert after < before
+
+
+def test_estimate_default_memory_usage(monkeypatch):
+    monkeypatch.setattr(dtypes, "_ESTIMATE_SAMPLE_ROWS", 100)
+    table = pyarrow.table({"name": ["abc", None] * 500, "num": range(1000)})
+
+    estimate = dtypes.estimate_default_memory_usage(table)
+
+    actual = dtypes.memory_usage(table.to_pandas())
+    assert actual * 0.9 <= estimate <= actual * 1.1
+    assert dtypes.estimate_default_memory_usage(table.slice(0, 0)) == 0
+
+
+def test_optimize_empty_dataframe():
+    dataframe = pandas.DataFrame({"num": pandas.Series([], dtype="int64")})
+
+    optimized, before, after = dtypes.optimize(dataframe)
+
+    assert optimized["num"].dtype == "int64"
+    assert before == after
+
+
+@pytest.mark.parametrize(
+    ("num_bytes", "expected"),
+    [(0, "0 B"), (1023, "1023 B"), (1536, "1.5 KiB"), (3 * 1024**3, "3.0 GiB")],
+)
+def test_format_bytes(num_bytes, expected):
+    assert dtypes.format_bytes(num_bytes) == expected
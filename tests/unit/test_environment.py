@@ -0,0 +1,89 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pathlib
+import sys
+from unittest import mock
+
+import pytest
+
+from bigquery_magics import core, environment
+
+Path = pathlib.Path
+
+
+@pytest.fixture(autouse=True)
+def clear_environment_cache():
+    core._get_user_agent.cache_clear()
+    environment._is_vscode_extension_installed.cache_clear()
+    environment._is_package_installed.cache_clear()
+    yield
+    core._get_user_agent.cache_clear()
+    environment._is_vscode_extension_installed.cache_clear()
+    environment._is_package_installed.cache_clear()
+
+
+def test__is_package_installed_does_not_import_package(tmp_path, monkeypatch):
+    package_dir = tmp_path / "bqm_fake_plugin"
+    package_dir.mkdir()
+    (package_dir / "__init__.py").write_text("raise RuntimeError('imported')\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    assert environment._is_package_installed("bqm_fake_plugin")
+    assert "bqm_fake_plugin" not in sys.modules
+
+
+@pytest.mark.parametrize(
+    "package_name", ["bqm_missing_package", "bqm_missing_package.submodule"]
+)
+def test__is_package_installed_missing_package(package_name):
+    assert not environment._is_package_installed(package_name)
+
+
+def test__is_package_installed_is_cached():
+    with mock.patch(
+        "importlib.util.find_spec", autospec=True, return_value=None
+    ) as find_spec:
+        assert not environment._is_package_installed("bqm_missing_package")
+        assert not environment._is_package_installed("bqm_missing_package")
+
+    find_spec.assert_called_once_with("bqm_missing_package")
+
+
+def test__is_vscode_extension_installed_is_cached(tmp_path):
+    extension_dir = (
+        tmp_path / ".vscode" / "extensions" / "googlecloudtools.cloudcode-0.12"
+    )
+    extension_dir.mkdir(parents=True)
+    (extension_dir / "package.json").write_text("{}")
+
+    with mock.patch("pathlib.Path.home", return_value=tmp_path) as home:
+        assert environment.is_vscode_google_cloud_code_extension_installed()
+        assert environment.is_vscode_google_cloud_code_extension_installed()
+
+    home.assert_called_once_with()
+
+
+def test__get_user_agent_is_cached(monkeypatch):
+    monkeypatch.setenv("VSCODE_PID", "1234")
+
+    with mock.patch.object(
+        environment, "_is_vscode_extension_installed", return_value=False
+    ) as is_installed:
+        first = core._get_user_agent()
+        second = core._get_user_agent()
+
+    assert first == second
+    assert first.endswith(" vscode")
+    is_installed.assert_called_once()
@@ -0,0 +1,115 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pyarrow
+import pyarrow.ipc
+import pyarrow.parquet
+import pytest
+
+from bigquery_magics import export
+
+SCHEMA = pyarrow.schema([("num", pyarrow.int64())])
+
+
+def _batches(*sizes):
+    start = 0
+    for size in sizes:
+        yield pyarrow.record_batch(
+            [pyarrow.array(range(start, start + size), pyarrow.int64())],
+            schema=SCHEMA,
+        )
+        start += size
+
+
+def _empty_schema():
+    return SCHEMA
+
+
+@pytest.mark.parametrize(
+    ("row_group_size", "expected_row_groups"),
+    [(None, [3, 4, 2]), (4, [4, 4, 1]), (100, [9])],
+)
+def test_write_parquet_row_groups(tmp_path, row_group_size, expected_row_groups):
+    path = tmp_path / "results.parquet"
+
+    num_rows = export.write_parquet(
+        _batches(3, 4, 2),
+        str(path),
+        empty_schema=_empty_schema,
+        row_group_size=row_group_size,
+    )
+
+    assert num_rows == 9
+    parquet_file = pyarrow.parquet.ParquetFile(path)
+    assert [
+        parquet_file.metadata.row_group(i).num_rows
+        for i in range(parquet_file.num_row_groups)
+    ] == expected_row_groups
+    assert parquet_file.read().column("num").to_pylist() == list(range(9))
+
+
+@pytest.mark.parametrize("compression", ["snappy", "zstd", "none"])
+def test_write_parquet_compression(tmp_path, compression):
+    path = tmp_path / "results.parquet"
+
+    export.write_parquet(
+        _batches(3), str(path), empty_schema=_empty_schema, compression=compression
+    )
+
+    column = pyarrow.parquet.ParquetFile(path).metadata.row_group(0).column(0)
+    assert column.compression == compression.upper().replace("NONE", "UNCOMPRESSED")
+
+
+def test_write_parquet_empty_results(tmp_path):
+    path = tmp_path / "results.parquet"
+
+    num_rows = export.write_parquet(iter([]), str(path), empty_schema=_empty_schema)
+
+    assert num_rows == 0
+    assert pyarrow.parquet.read_table(path).schema == SCHEMA
+
+
+@pytest.mark.parametrize("compression", [None, "lz4", "zstd", "none"])
+def test_write_arrow_ipc(tmp_path, compression):
+    path = tmp_path / "results.arrow"
+
+    num_rows = export.write_arrow_ipc(
+        _batches(3, 4), str(path), empty_schema=_empty_schema, compression=compression
+    )
+
+    assert num_rows == 7
+    reader = pyarrow.ipc.open_file(str(path))
+    assert reader.num_record_batches == 2
+    assert reader.read_all().column("num").to_pylist() == list(range(7))
+
+
+def test_write_arrow_ipc_empty_results(tmp_path):
+    path = tmp_path / "results.arrow"
+
+    num_rows = export.write_arrow_ipc(iter([]), str(path), empty_schema=_empty_schema)
+
+    assert num_rows == 0
+    assert pyarrow.ipc.open_file(str(path)).schema == SCHEMA
+
+
+@pytest.mark.parametrize("write", [export.write_parquet, export.write_arrow_ipc])
+def test_write_leaves_no_file_on_error(tmp_path, write):
+    def batches():
+        yield from _batches(3)
+        raise RuntimeError("download failed")
+
+    with pytest.raises(RuntimeError):
+        write(batches(), str(tmp_path / "results"), empty_schema=_empty_schema)
+
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,70 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import subprocess
+import sys
+
+import pytest
+
+# Modules that loading the extension must not import.
+HEAVY_MODULES = (
+    "bigframes",
+    "bigquery_magics.graph_server",
+    "geopandas",
+    "google.cloud.bigquery",
+    "google.cloud.bigquery_storage",
+    "pandas",
+    "pyarrow",
+    "pydata_google_auth",
+)
+
+# IPython is already imported in a notebook kernel, so it is imported before
+# measuring what loading the extension adds.
+LOAD_EXTENSION_CODE = """
+from IPython.core.interactiveshell import InteractiveShell
+
+ip = InteractiveShell.instance()
+ip.extension_manager.load_extension("bigquery_magics")
+assert "bigquery" in ip.magics_manager.magics["cell"]
+"""
+
+
+def _imported_modules(code):
+    """Returns the modules imported by the code, in a fresh interpreter."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = set()
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        modules.add(line.rsplit("|", 1)[1].strip())
+    return modules
+
+
+@pytest.fixture(scope="module")
+def load_extension_modules():
+    return _imported_modules(LOAD_EXTENSION_CODE)
+
+
+def test_load_extension_imports_magics(load_extension_modules):
+    assert "bigquery_magics.bigquery" in load_extension_modules
+
+
+@pytest.mark.parametrize("module", HEAVY_MODULES)
+def test_load_extension_does_not_import_heavy_modules(load_extension_modules, module):
+    assert module not in load_extension_modules
@@ -0,0 +1,105 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from google.cloud.bigquery import SchemaField
+import pytest
+
+from bigquery_magics import memory_budget
+
+SCHEMA = [SchemaField("num", "INTEGER"), SchemaField("name", "STRING")]
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        (1024, 1024),
+        ("1024", 1024),
+        ("500MB", 500_000_000),
+        ("2GiB", 2 * 1024**3),
+        ("1.5 kib", 1536),
+    ],
+)
+def test_parse_size(value, expected):
+    assert memory_budget.parse_size(value) == expected
+
+
+@pytest.mark.parametrize("value", ["", "lots", "2 parsecs", "-1GB", 0])
+def test_parse_size_invalid(value):
+    with pytest.raises(ValueError):
+        memory_budget.parse_size(value)
+
+
+def test_estimate_size_from_table_size():
+    estimate = memory_budget.estimate_size(SCHEMA, 1000, 100_000, python_objects=False)
+
+    assert estimate == 100_000
+
+
+def test_estimate_size_from_schema():
+    estimate = memory_budget.estimate_size(SCHEMA, 1000, python_objects=False)
+
+    # 8 bytes per INTEGER, and STRING values assumed to be short.
+    assert estimate == 1000 * (8 + 32)
+
+
+def test_estimate_size_counts_python_objects():
+    without_objects = memory_budget.estimate_size(
+        SCHEMA, 1000, 100_000, python_objects=False
+    )
+    with_objects = memory_budget.estimate_size(SCHEMA, 1000, 100_000)
+
+    assert with_objects > without_objects
+
+
+def test_estimate_size_w_max_rows():
+    estimate = memory_budget.estimate_size(
+        SCHEMA, 1000, 100_000, max_rows=10, python_objects=False
+    )
+
+    assert estimate == 1000
+
+
+def test_estimate_size_w_selected_fields():
+    estimate = memory_budget.estimate_size(
+        SCHEMA,
+        1000,
+        100_000,
+        selected_fields=SCHEMA[:1],
+        python_objects=False,
+    )
+
+    assert estimate == 100_000 * 8 // 40
+
+
+def test_estimate_size_w_repeated_record():
+    schema = [
+        SchemaField(
+            "items",
+            "RECORD",
+            mode="REPEATED",
+            fields=[SchemaField("id", "INTEGER"), SchemaField("ok", "BOOLEAN")],
+        )
+    ]
+
+    estimate = memory_budget.estimate_size(schema, 10, python_objects=False)
+
+    assert estimate == 10 * 4 * (8 + 1)
+
+
+@pytest.mark.parametrize(
+    ("budget", "estimate", "expected"),
+    [(100, 1000, 10), (1000, 1000, 100), (5000, 1000, 100), (100, 0, 100)],
+)
+def test_rows_within(budget, estimate, expected):
+    assert memory_budget.rows_within(budget, estimate, 100) == expected
@@ -0,0 +1,134 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from concurrent import futures
+from unittest import mock
+
+import pytest
+
+from bigquery_magics.query_handle import QueryHandle
+
+
+@pytest.fixture
+def handle():
+    query_job = mock.Mock(job_id="job_1234")
+    return QueryHandle(query_job)
+
+
+def test_set_result_calls_on_result(handle):
+    on_result = mock.Mock()
+
+    handle._set_result("result", on_result)
+
+    on_result.assert_called_once_with("result")
+    assert handle.done()
+    assert handle.result(timeout=0) == "result"
+    assert repr(handle) == "<QueryHandle job_id='job_1234' state='done'>"
+
+
+def test_set_exception(handle):
+    error = ValueError("boom")
+
+    handle._set_exception(error)
+
+    assert handle.exception(timeout=0) is error
+    with pytest.raises(ValueError, match="boom"):
+        handle.result(timeout=0)
+    assert "state='failed'" in repr(handle)
+
+
+def test_result_timeout(handle):
+    assert "state='running'" in repr(handle)
+    with pytest.raises(futures.TimeoutError):
+        handle.result(timeout=0)
+
+
+def test_cancel_cancels_job_and_ignores_later_results(handle):
+    on_result = mock.Mock()
+
+    assert handle.cancel()
+    handle._set_result("result", on_result)
+    handle._set_exception(ValueError("boom"))
+
+    handle.query_job.cancel.assert_called_once_with()
+    on_result.assert_not_called()
+    assert handle.cancelled()
+    with pytest.raises(futures.CancelledError):
+        handle.result(timeout=0)
+    assert "state='cancelled'" in repr(handle)
+
+
+def test_cancel_ignores_job_errors(handle):
+    handle.query_job.cancel.side_effect = RuntimeError("already done")
+
+    assert handle.cancel()
+    assert handle.cancelled()
+
+
+def test_cancel_after_result_is_noop(handle):
+    handle._set_result("result", mock.Mock())
+
+    assert not handle.cancel()
+    handle.query_job.cancel.assert_not_called()
+
+
+def test_add_done_callback_passes_handle(handle):
+    callback = mock.Mock()
+    handle.add_done_callback(callback)
+
+    handle._set_result("result", mock.Mock())
+
+    callback.assert_called_once_with(handle)
+
+
+def test_await_returns_result(handle):
+    async def wait():
+        asyncio.get_running_loop().call_soon(handle._set_result, "result", mock.Mock())
+        return await handle
+
+    assert asyncio.run(wait()) == "result"
+
+
+def test_set_result_stores_on_result_errors(handle):
+    on_result = mock.Mock(side_effect=ValueError("could not store the results"))
+
+    handle._set_result("result", on_result)
+
+    assert handle.done()
+    assert "state='failed'" in repr(handle)
+    with pytest.raises(ValueError, match="could not store"):
+        handle.result(timeout=0)
+
+
+def test_messages_are_printed_once_with_result(handle, capsys):
+    handle._add_message("Optimized dtypes")
+    handle._set_result("result", mock.Mock())
+    assert capsys.readouterr().out == ""
+
+    assert handle.result(timeout=0) == "result"
+    assert handle.result(timeout=0) == "result"
+
+    assert capsys.readouterr().out == "Optimized dtypes\n"
+    assert handle.messages == ["Optimized dtypes"]
+
+
+def test_await_prints_messages(handle, capsys):
+    async def wait():
+        handle._add_message("Optimized dtypes")
+        asyncio.get_running_loop().call_soon(handle._set_result, "result", mock.Mock())
+        return await handle
+
+    assert asyncio.run(wait()) == "result"
+    assert capsys.readouterr().out == "Optimized dtypes\n"
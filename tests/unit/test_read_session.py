@@ -0,0 +1,190 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import mock
+
+import pytest
+
+from bigquery_magics import read_session
+
+bigquery_storage = pytest.importorskip("google.cloud.bigquery_storage")
+
+
+def _create_read_session(client, max_stream_count):
+    requested_session = bigquery_storage.types.ReadSession()
+    client.create_read_session(
+        parent="projects/my-project",
+        read_session=requested_session,
+        max_stream_count=max_stream_count,
+    )
+    return requested_session, client.client.create_read_session.call_args.kwargs
+
+
+def _client(**options):
+    bqstorage_client = mock.create_autospec(
+        bigquery_storage.BigQueryReadClient, instance=True
+    )
+    return read_session.TunedReadClient(
+        bqstorage_client, read_session.ReadSessionOptions(**options)
+    )
+
+
+@pytest.mark.parametrize(
+    ("options", "library_streams", "expected_streams"),
+    [
+        pytest.param({"max_stream_count": 16}, 0, 16, id="max-stream-count"),
+        pytest.param({"max_stream_count": 16}, 1, 1, id="ordered"),
+        pytest.param({"preserve_order": True}, 0, 1, id="preserve-order"),
+        pytest.param(
+            {"preserve_order": False, "max_stream_count": 16},
+            1,
+            16,
+            id="no-preserve-order",
+        ),
+        pytest.param({"preserve_order": False}, 1, 0, id="no-preserve-order-default"),
+        pytest.param({"compression": "zstd"}, 0, 0, id="compression-only"),
+    ],
+)
+def test_create_read_session_stream_count(options, library_streams, expected_streams):
+    client = _client(**options)
+
+    _, kwargs = _create_read_session(client, library_streams)
+
+    assert kwargs["max_stream_count"] == expected_streams
+    assert kwargs["parent"] == "projects/my-project"
+
+
+@pytest.mark.parametrize(
+    ("compression", "expected"),
+    [
+        ("lz4", "LZ4_FRAME"),
+        ("zstd", "ZSTD"),
+        ("none", "COMPRESSION_UNSPECIFIED"),
+    ],
+)
+def test_create_read_session_compression(compression, expected):
+    client = _client(compression=compression)
+
+    requested_session, _ = _create_read_session(client, 0)
+
+    codec = requested_session.read_options.arrow_serialization_options
+    assert codec.buffer_compression.name == expected
+
+
+def test_other_calls_are_passed_through():
+    client = _client(max_stream_count=4)
+
+    client.read_rows("stream-name")
+
+    client.client.read_rows.assert_called_once_with("stream-name")
+
+
+def test_tune_read_client_without_options():
+    bqstorage_client = object()
+
+    assert (
+        read_session.tune_read_client(
+            bqstorage_client, read_session.ReadSessionOptions()
+        )
+        is bqstorage_client
+    )
+    assert (
+        read_session.tune_read_client(
+            None, read_session.ReadSessionOptions(max_stream_count=4)
+        )
+        is None
+    )
+
+
+def _reader(*page_sizes):
+    pages = [mock.Mock(num_items=size) for size in page_sizes]
+    reader = mock.Mock()
+    reader.rows.return_value.pages = iter(pages)
+    return reader, pages
+
+
+def test_limit_rows_stops_reading_streams():
+    bqstorage_client = mock.create_autospec(
+        bigquery_storage.BigQueryReadClient, instance=True
+    )
+    first_reader, first_pages = _reader(40, 40, 40)
+    second_reader, second_pages = _reader(30, 30)
+    bqstorage_client.read_rows.side_effect = [first_reader, second_reader]
+    client = read_session.limit_rows(bqstorage_client, 100)
+
+    first_stream = client.read_rows("stream-1").rows().pages
+    second_stream = client.read_rows("stream-2").rows().pages
+    read = [next(first_stream), next(second_stream), next(first_stream)]
+
+    assert read == [first_pages[0], second_pages[0], first_pages[1]]
+    assert list(second_stream) == []
+    assert list(first_stream) == []
+    # Both streams had pages left, so their calls are cancelled.
+    first_reader._wrapped.cancel.assert_called_once_with()
+    second_reader._wrapped.cancel.assert_called_once_with()
+
+
+def test_limit_rows_keeps_finished_streams():
+    bqstorage_client = mock.create_autospec(
+        bigquery_storage.BigQueryReadClient, instance=True
+    )
+    reader, pages = _reader(10, 10)
+    bqstorage_client.read_rows.return_value = reader
+    client = read_session.limit_rows(bqstorage_client, 100)
+
+    assert list(client.read_rows("stream-1").rows().pages) == pages
+    reader._wrapped.cancel.assert_not_called()
+
+
+def test_limit_rows_releases_streams_closed_early():
+    bqstorage_client = mock.create_autospec(
+        bigquery_storage.BigQueryReadClient, instance=True
+    )
+    reader, pages = _reader(10, 10)
+    bqstorage_client.read_rows.return_value = reader
+    client = read_session.limit_rows(bqstorage_client, 100)
+
+    stream = client.read_rows("stream-1").rows().pages
+    assert next(stream) is pages[0]
+    stream.close()
+
+    reader._wrapped.cancel.assert_called_once_with()
+
+
+def test_limit_rows_keeps_options():
+    bqstorage_client = object()
+    options = read_session.ReadSessionOptions(compression="zstd")
+    tuned_client = read_session.TunedReadClient(bqstorage_client, options)
+
+    limited_client = read_session.limit_rows(tuned_client, 10)
+
+    assert limited_client.client is bqstorage_client
+    assert limited_client.options is options
+
+
+def test_restrict_rows():
+    bqstorage_client = mock.create_autospec(
+        bigquery_storage.BigQueryReadClient, instance=True
+    )
+    client = read_session.restrict_rows(
+        read_session.TunedReadClient(
+            bqstorage_client, read_session.ReadSessionOptions(max_stream_count=4)
+        ),
+        "num > 5",
+    )
+
+    requested_session, kwargs = _create_read_session(client, 0)
+
+    assert requested_session.read_options.row_restriction == "num > 5"
+    assert kwargs["max_stream_count"] == 4
@@ -0,0 +1,393 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+from unittest import mock
+
+from google.api_core import exceptions
+import google.auth.compute_engine
+from google.auth.credentials import AnonymousCredentials
+import google.cloud.bigquery
+from google.cloud.bigquery import QueryJobConfig, ScalarQueryParameter, TableReference
+import google.oauth2.credentials
+import pandas
+import pyarrow
+import pytest
+
+import bigquery_magics
+from bigquery_magics import result_cache as result_cache_module
+
+STARTED = datetime.datetime(2026, 1, 1, 12, tzinfo=datetime.timezone.utc)
+CREDENTIALS = AnonymousCredentials()
+TABLE_REF = TableReference.from_string("my-project.my_dataset.my_table")
+
+
+@pytest.mark.parametrize(
+    ("query", "expected"),
+    [
+        ("  SELECT\n\t1  \n", "SELECT 1"),
+        ("SELECT 'a  b',   \"c  d\"", "SELECT 'a  b', \"c  d\""),
+        ("SELECT 'it\\'s  ',  1", "SELECT 'it\\'s  ', 1"),
+        ("SELECT '''a\n\n b''' ,  1", "SELECT '''a\n\n b''' , 1"),
+        ("SELECT  `my  col`  FROM t", "SELECT `my  col` FROM t"),
+        ("SELECT 1  -- a  comment\n  , 2", "SELECT 1 -- a  comment , 2"),
+        ("SELECT /* a\n  b */  1", "SELECT /* a\n  b */ 1"),
+    ],
+)
+def test_normalize_query(query, expected):
+    assert result_cache_module.normalize_query(query) == expected
+
+
+def _fingerprint(query="SELECT 1", job_config=None, **kwargs):
+    kwargs.setdefault("project", "my-project")
+    kwargs.setdefault("location", None)
+    kwargs.setdefault("credentials", CREDENTIALS)
+    return result_cache_module.query_fingerprint(
+        query, job_config or QueryJobConfig(), **kwargs
+    )
+
+
+def test_query_fingerprint_ignores_whitespace_and_unrelated_config():
+    job_config = QueryJobConfig(maximum_bytes_billed=100, labels={"a": "b"})
+
+    assert _fingerprint("SELECT  1\n") == _fingerprint("SELECT 1", job_config)
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"query": "SELECT 2"},
+        {"query": "SELECT 'a  b'"},
+        {"job_config": QueryJobConfig(use_legacy_sql=True)},
+        {"job_config": QueryJobConfig(default_dataset="my-project.other")},
+        {
+            "job_config": QueryJobConfig(
+                query_parameters=[ScalarQueryParameter("num", "INT64", 1)]
+            )
+        },
+        {"project": "other-project"},
+        {"location": "EU"},
+        {"credentials": mock.Mock(service_account_email="sa@my-project.com")},
+        {"max_results": "10"},
+    ],
+)
+def test_query_fingerprint_differs(kwargs):
+    assert _fingerprint("SELECT 'a b'") != _fingerprint(
+        **{"query": "SELECT 'a b'", **kwargs}
+    )
+
+
+def _user_credentials(refresh_token="refresh-token", account=""):
+    return google.oauth2.credentials.Credentials(
+        None,
+        refresh_token=refresh_token,
+        client_id="client-id",
+        client_secret="client-secret",
+        account=account,
+    )
+
+
+def test_credentials_identity():
+    service_account = mock.Mock(service_account_email="sa@my-project.com")
+    user = _user_credentials(account="user@example.com")
+
+    assert result_cache_module.credentials_identity(service_account) == (
+        "sa@my-project.com"
+    )
+    assert result_cache_module.credentials_identity(user) == "user@example.com"
+    assert result_cache_module.credentials_identity(CREDENTIALS) is None
+
+
+def test_credentials_identity_user_without_account():
+    # As created again after a kernel restart.
+    assert _fingerprint(credentials=_user_credentials()) == _fingerprint(
+        credentials=_user_credentials()
+    )
+    assert _fingerprint(credentials=_user_credentials()) != _fingerprint(
+        credentials=_user_credentials(refresh_token="other-refresh-token")
+    )
+
+
+def test_credentials_identity_compute_engine():
+    credentials = google.auth.compute_engine.Credentials()
+    identity = result_cache_module.credentials_identity(credentials)
+
+    # Refreshing replaces the "default" service account with its email.
+    credentials._service_account_email = "sa@my-project.com"
+
+    assert result_cache_module.credentials_identity(credentials) == identity
+
+
+def _query_job(job_id="job_1", statement_type="SELECT", referenced_tables=None):
+    query_job = mock.create_autospec(google.cloud.bigquery.job.QueryJob, instance=True)
+    query_job.job_id = job_id
+    query_job.statement_type = statement_type
+    query_job.started = STARTED
+    query_job.referenced_tables = (
+        [TABLE_REF] if referenced_tables is None else referenced_tables
+    )
+    return query_job
+
+
+@pytest.mark.parametrize(
+    ("query", "query_job", "expected"),
+    [
+        ("SELECT * FROM t", _query_job(), True),
+        ("SELECT 1", _query_job(referenced_tables=[]), False),
+        ("INSERT INTO t VALUES (1)", _query_job(statement_type="INSERT"), False),
+        ("SELECT *, CURRENT_TIMESTAMP() FROM t", _query_job(), False),
+        ("SELECT rand() FROM t", _query_job(), False),
+    ],
+)
+def test_is_cacheable(query, query_job, expected):
+    assert result_cache_module.is_cacheable(query, query_job) is expected
+
+
+def _info(query_job=None):
+    return result_cache_module.ResultInfo.from_query_job(query_job or _query_job())
+
+
+def _bq_client(modified=STARTED - datetime.timedelta(hours=1), table_type="TABLE"):
+    bq_client = mock.create_autospec(google.cloud.bigquery.Client, instance=True)
+    bq_client.get_table.return_value = mock.Mock(
+        modified=modified, table_type=table_type
+    )
+    return bq_client
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(bigquery_magics.context, "client_cache_max_bytes", 10_000)
+    return result_cache_module.ResultCache()
+
+
+def test_get_returns_copy_of_cached_result(cache):
+    result = pandas.DataFrame({"num": [1, 2, 3]})
+    cache.put("key", result, _info())
+    result["num"] = 0
+
+    cached, info = cache.get("key", _bq_client())
+    cached["num"] = 1
+
+    assert info.job_id == "job_1"
+    assert cache.get("key", _bq_client())[0]["num"].tolist() == [1, 2, 3]
+    assert cache.stats() == {
+        "hits": 2,
+        "misses": 0,
+        "entries": 1,
+        "bytes": cache.size,
+    }
+
+
+def test_put_get_arrow_table(cache):
+    result = pyarrow.table({"num": [1, 2, 3]})
+    cache.put("key", result, _info())
+
+    cached, _ = cache.get("key", _bq_client())
+
+    assert cached is result
+    assert cache.size == result.nbytes
+
+
+def test_put_get_polars_dataframe(cache):
+    polars = pytest.importorskip("polars")
+    result = polars.DataFrame({"num": [1, 2, 3]})
+    cache.put("key", result, _info())
+
+    cached, _ = cache.get("key", _bq_client())
+
+    assert cached is not result
+    assert cached.equals(result)
+    assert cache.size == result.estimated_size()
+
+
+def test_get_miss(cache):
+    assert cache.get("key", _bq_client()) is None
+    assert cache.misses == 1
+
+
+@pytest.mark.parametrize(
+    "bq_client",
+    [
+        _bq_client(modified=STARTED + datetime.timedelta(seconds=1)),
+        _bq_client(modified=None),
+        _bq_client(table_type="VIEW"),
+        _bq_client(table_type="EXTERNAL"),
+    ],
+)
+def test_get_discards_stale_entry(cache, bq_client):
+    cache.put("key", pandas.DataFrame({"num": [1]}), _info())
+
+    assert cache.get("key", bq_client) is None
+    assert cache.stats()["entries"] == 0
+    assert cache.size == 0
+
+
+def test_get_validates_every_hit(cache):
+    cache.put("key", pandas.DataFrame({"num": [1]}), _info())
+    bq_client = _bq_client()
+
+    assert cache.get("key", bq_client) is not None
+    bq_client.get_table.return_value.modified = STARTED + datetime.timedelta(hours=1)
+
+    assert cache.get("key", bq_client) is None
+    assert bq_client.get_table.call_count == 2
+
+
+def test_get_discards_entry_of_deleted_table(cache):
+    cache.put("key", pandas.DataFrame({"num": [1]}), _info())
+    bq_client = _bq_client()
+    bq_client.get_table.side_effect = exceptions.NotFound("table")
+
+    assert cache.get("key", bq_client) is None
+
+
+def test_put_evicts_least_recently_used(cache):
+    frame = pandas.DataFrame({"num": range(300)})  # about 2.5 KB each
+    for key in ("a", "b", "c"):
+        cache.put(key, frame, _info())
+    cache.get("a", _bq_client())
+
+    cache.put("d", frame, _info())
+    cache.put("e", frame, _info())
+
+    assert cache.get("b", _bq_client()) is None
+    assert cache.get("c", _bq_client()) is None
+    for key in ("a", "d", "e"):
+        assert cache.get(key, _bq_client()) is not None
+    assert cache.size <= 10_000
+
+
+def test_put_skips_results_larger_than_cache(cache):
+    cache.put("key", pandas.DataFrame({"num": range(10_000)}), _info())
+
+    assert cache.size == 0
+    assert cache.get("key", _bq_client()) is None
+
+
+def test_put_replaces_entry(cache):
+    cache.put("key", pandas.DataFrame({"num": range(100)}), _info(_query_job("job_1")))
+    cache.put("key", pandas.DataFrame({"num": range(10)}), _info(_query_job("job_2")))
+
+    result, info = cache.get("key", _bq_client())
+    assert info.job_id == "job_2"
+    assert len(result) == 10
+    assert cache.size == result_cache_module._memory_usage(result)
+
+
+def test_clear(cache):
+    cache.put("key", pandas.DataFrame({"num": [1]}), _info())
+    cache.get("key", _bq_client())
+    cache.get("other", _bq_client())
+
+    cache.clear()
+
+    assert cache.stats() == {"hits": 0, "misses": 0, "entries": 0, "bytes": 0}
+
+
+def test_result_info_json_round_trip():
+    info = _info()
+
+    assert info.referenced_tables == ["my-project.my_dataset.my_table"]
+    assert result_cache_module.ResultInfo.from_json(info.to_json()) == info
+
+
+@pytest.mark.parametrize(
+    ("table_id", "expected"),
+    [
+        ("my-project._abc123.anon456", True),
+        ("my-project.my_dataset.my_table", False),
+    ],
+)
+def test_is_anonymous_table(table_id, expected):
+    table_ref = TableReference.from_string(table_id)
+    assert result_cache_module.is_anonymous_table(table_ref) is expected
+
+
+def test_is_anonymous_table_none():
+    assert not result_cache_module.is_anonymous_table(None)
+
+
+def _recent_info(**kwargs):
+    started = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+        **kwargs
+    )
+    return result_cache_module.ResultInfo(
+        job_id="job_1", started=started, referenced_tables=[str(TABLE_REF)]
+    )
+
+
+def test_destination_tables_get():
+    tables = result_cache_module.DestinationTables()
+    info = _recent_info(hours=1)
+    tables.put("key", "my-project._abc.anon", info)
+
+    assert tables.get("key", _bq_client(modified=info.started)) is None
+    tables.put("key", "my-project._abc.anon", info)
+    bq_client = _bq_client(modified=info.started - datetime.timedelta(seconds=1))
+    assert tables.get("key", bq_client) == ("my-project._abc.anon", info)
+    assert tables.get("other", bq_client) is None
+    assert tables.stats() == {"hits": 1, "misses": 2, "entries": 1}
+
+
+@pytest.mark.parametrize(
+    ("expires_in", "expected"),
+    [
+        (None, False),
+        (datetime.timedelta(hours=2), False),
+        (datetime.timedelta(minutes=30), True),
+        (datetime.timedelta(minutes=-1), True),
+    ],
+)
+def test_expires_soon(expires_in, expected):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    table = mock.Mock(expires=None if expires_in is None else now + expires_in)
+    assert result_cache_module.expires_soon(table) is expected
+
+
+def test_destination_tables_get_old_job():
+    # The expiration time of the table decides whether it can be read, not
+    # the age of the job.
+    tables = result_cache_module.DestinationTables()
+    info = _recent_info(days=2)
+    tables.put("key", "my-project._abc.anon", info)
+
+    bq_client = _bq_client(modified=info.started - datetime.timedelta(days=1))
+    assert tables.get("key", bq_client) == ("my-project._abc.anon", info)
+
+
+def test_destination_tables_put_evicts_least_recently_used():
+    tables = result_cache_module.DestinationTables(max_entries=2)
+    info = _recent_info(hours=1)
+    bq_client = _bq_client(modified=info.started - datetime.timedelta(days=1))
+    for key in ("a", "b"):
+        tables.put(key, f"my-project._abc.{key}", info)
+    tables.get("a", bq_client)
+
+    tables.put("c", "my-project._abc.c", info)
+
+    assert tables.get("b", bq_client) is None
+    assert tables.get("a", bq_client) is not None
+    assert tables.get("c", bq_client) is not None
+
+
+def test_destination_tables_discard_and_clear():
+    tables = result_cache_module.DestinationTables()
+    tables.put("a", "my-project._abc.a", _recent_info(hours=1))
+    tables.put("b", "my-project._abc.b", _recent_info(hours=1))
+
+    tables.discard("a")
+    assert tables.stats()["entries"] == 1
+    tables.clear()
+    assert tables.stats() == {"hits": 0, "misses": 0, "entries": 0}
@@ -0,0 +1,60 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import mock
+
+from bigquery_magics.result_stream import ResultStream
+
+
+def _chunks(closed):
+    try:
+        yield 1
+        yield 2
+    finally:
+        closed.append(True)
+
+
+def test_iterates_chunks_and_closes_when_exhausted():
+    closed = []
+    on_close = mock.Mock()
+    stream = ResultStream(_chunks(closed), total_rows=2, on_close=on_close)
+
+    assert list(stream) == [1, 2]
+    assert stream.closed
+    assert closed == [True]
+    on_close.assert_called_once_with()
+    assert list(stream) == []
+    assert repr(stream) == "<ResultStream total_rows=2 state='closed'>"
+
+
+def test_close_stops_download():
+    closed = []
+    on_close = mock.Mock()
+
+    with ResultStream(_chunks(closed), on_close=on_close) as stream:
+        assert next(stream) == 1
+        assert "state='open'" in repr(stream)
+
+    assert closed == [True]
+    on_close.assert_called_once_with()
+    stream.close()
+    on_close.assert_called_once_with()
+
+
+def test_close_without_generator():
+    stream = ResultStream(iter([1, 2]))
+    stream.close()
+
+    assert list(stream) == []
+    assert stream.total_rows is None
@@ -0,0 +1,246 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import threading
+from unittest import mock
+
+import pandas
+import pyarrow
+
+from bigquery_magics import stats
+
+
+def test_time_accumulates_phases():
+    run_stats = stats.RunStats()
+
+    with run_stats.time("download"):
+        pass
+    with run_stats.time("convert"):
+        pass
+    with run_stats.time("download"):
+        pass
+
+    assert list(run_stats.timings) == ["download", "convert"]
+    assert run_stats.conversion_seconds == run_stats.timings["convert"]
+
+
+def test_timed_without_current_stats_is_noop():
+    with stats.timed("download"):
+        pass
+
+    assert stats.current() is None
+
+
+def test_recording_sets_current_stats_of_thread():
+    run_stats = stats.RunStats()
+    other_thread_stats = []
+
+    with stats.recording(run_stats):
+        with stats.timed("download"):
+            thread = threading.Thread(
+                target=lambda: other_thread_stats.append(stats.current())
+            )
+            thread.start()
+            thread.join()
+        assert stats.current() is run_stats
+
+    assert stats.current() is None
+    assert other_thread_stats == [None]
+    assert "download" in run_stats.timings
+
+
+def test_count_api_requests_of_current_cell():
+    client = mock.Mock()
+    client._call_api.return_value = {"kind": "bigquery#job"}
+    stats.count_api_requests(client)
+    run_stats = stats.RunStats()
+
+    client._call_api(None, method="GET", path="/projects/p/jobs/j")
+    with stats.recording(run_stats):
+        assert client._call_api(None, method="POST") == {"kind": "bigquery#job"}
+        client._call_api(None, method="GET")
+
+    assert run_stats.api_calls == 2
+
+
+def test_record_job():
+    created = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+    job = mock.Mock(
+        job_id="job_1234",
+        total_bytes_processed=1024,
+        slot_millis=250,
+        cache_hit=False,
+        created=created,
+        started=created + datetime.timedelta(seconds=1),
+        ended=created + datetime.timedelta(seconds=3.5),
+    )
+    run_stats = stats.RunStats()
+
+    run_stats.record_job(job)
+
+    assert run_stats.job_id == "job_1234"
+    assert run_stats.total_bytes_processed == 1024
+    assert run_stats.slot_millis == 250
+    assert run_stats.cache_hit is False
+    assert run_stats.queued_seconds == 1.0
+    assert run_stats.execution_seconds == 2.5
+
+
+def test_record_job_without_timestamps():
+    job = mock.Mock(spec=["job_id", "total_bytes_processed"])
+    job.job_id = None
+    job.total_bytes_processed = 10
+    run_stats = stats.RunStats(job_id="previous")
+
+    run_stats.record_job(job)
+
+    assert run_stats.job_id == "previous"
+    assert run_stats.cache_hit is None
+    assert run_stats.queued_seconds is None
+
+
+def test_record_result():
+    table = pyarrow.table({"num": pyarrow.array(range(10), pyarrow.int64())})
+    run_stats = stats.RunStats()
+
+    run_stats.record_result(table)
+    assert (run_stats.rows_downloaded, run_stats.bytes_downloaded) == (10, 80)
+
+    run_stats.record_result(table.to_pandas())
+    assert run_stats.rows_downloaded == 10
+    assert run_stats.bytes_downloaded >= 80
+
+
+def test_summary():
+    run_stats = stats.RunStats(
+        job_id="job_1234",
+        total_bytes_processed=1024,
+        slot_millis=250,
+        cache_hit=True,
+        rows_downloaded=10,
+        bytes_downloaded=80,
+        timings={"wait": 1.5, "download": 0.25},
+    )
+
+    summary = run_stats.summary()
+
+    assert "Timings: wait 1.500s, download 0.250s (total 1.750s)" in summary
+    assert "job ID job_1234" in summary
+    assert "1024 bytes processed, 250 slot-ms, cache hit" in summary
+    assert "Downloaded: 10 rows, 80 bytes" in summary
+
+
+def test_summary_empty():
+    assert stats.RunStats().summary() == ""
+
+
+def test_record_result_pandas_ignores_python_objects():
+    dataframe = pandas.DataFrame({"name": pandas.Series(["a" * 1000], dtype=object)})
+    run_stats = stats.RunStats()
+
+    run_stats.record_result(dataframe)
+
+    assert run_stats.bytes_downloaded < 1000
+
+
+def test_record_job_ignores_missing_statistics():
+    job = mock.Mock(job_id="job_1234", total_bytes_billed=2048)
+    run_stats = stats.RunStats()
+
+    run_stats.record_job(job)
+
+    assert run_stats.total_bytes_billed == 2048
+    assert run_stats.total_bytes_processed is None
+    assert run_stats.slot_millis is None
+    assert run_stats.cache_hit is None
+
+
+def test_session_stats_drops_oldest_runs():
+    session_stats = stats.SessionStats(max_size=2)
+    runs = [stats.RunStats(job_id=f"job_{index}") for index in range(3)]
+
+    for run_stats in runs:
+        session_stats.add(run_stats)
+
+    assert session_stats.runs() == runs[1:]
+    assert "Cells: 2 (the last 2 of 3" in session_stats.summary()
+
+    session_stats.max_size = 1
+    assert session_stats.runs() == runs[2:]
+
+    session_stats.clear()
+    assert session_stats.runs() == []
+
+
+def test_session_stats_top():
+    session_stats = stats.SessionStats()
+    fast = stats.RunStats(duration=1.0, total_bytes_billed=300)
+    slow = stats.RunStats(duration=5.0, total_bytes_billed=100)
+    unknown = stats.RunStats(duration=3.0)
+    for run_stats in (fast, slow, unknown):
+        session_stats.add(run_stats)
+
+    assert session_stats.top(2) == [slow, unknown]
+    assert session_stats.top(5, sort_by="bytes_billed") == [fast, slow]
+
+
+def test_session_stats_summary():
+    session_stats = stats.SessionStats()
+    session_stats.add(
+        stats.RunStats(
+            job_id="job_1",
+            query="SELECT *\nFROM " + "t" * 100,
+            cell_number=3,
+            duration=2.0,
+            total_bytes_processed=1000,
+            total_bytes_billed=10485760,
+            slot_millis=500,
+            cache_hit=False,
+            rows_downloaded=10,
+            bytes_downloaded=80,
+            timings={"wait": 1.5, "download": 0.25},
+        )
+    )
+    session_stats.add(
+        stats.RunStats(
+            duration=0.5,
+            total_bytes_processed=24,
+            total_bytes_billed=0,
+            slot_millis=0,
+            cache_hit=True,
+            rows_downloaded=1,
+            bytes_downloaded=8,
+            timings={"wait": 0.5},
+        )
+    )
+
+    summary = session_stats.summary(top=1)
+
+    assert summary.splitlines() == [
+        "Cells: 2",
+        "Query: 1024 bytes processed, 10485760 bytes billed, 500 slot-ms, "
+        "cache hits 1/2 (50%)",
+        "Timings: wait 2.000s, download 0.250s (total 2.250s)",
+        "Downloaded: 11 rows, 88 bytes",
+        "Top 1 cells by duration:",
+        "  In [3] 2.000s, 1000 bytes processed, 10485760 bytes billed, "
+        "500 slot-ms, job ID job_1: SELECT * FROM " + "t" * 43 + "...",
+    ]
+
+
+def test_session_stats_summary_empty():
+    summary = stats.SessionStats().summary()
+
+    assert summary == "No %%bigquery cells have run in this session."
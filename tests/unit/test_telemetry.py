@@ -0,0 +1,148 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+
+import pytest
+
+from bigquery_magics import stats, telemetry
+
+
+@pytest.fixture
+def span_exporter(monkeypatch):
+    sdk_trace = pytest.importorskip("opentelemetry.sdk.trace")
+    from opentelemetry import trace
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+        InMemorySpanExporter,
+    )
+
+    exporter = InMemorySpanExporter()
+    provider = sdk_trace.TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    monkeypatch.setattr(trace, "get_tracer_provider", lambda: provider)
+    return exporter
+
+
+@pytest.fixture
+def metric_reader(monkeypatch):
+    sdk_metrics = pytest.importorskip("opentelemetry.sdk.metrics")
+    from opentelemetry import metrics
+    from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+
+    reader = InMemoryMetricReader()
+    provider = sdk_metrics.MeterProvider(metric_readers=[reader])
+    monkeypatch.setattr(metrics, "get_meter_provider", lambda: provider)
+    return reader
+
+
+def _histogram_points(reader):
+    points = {}
+    for resource_metrics in reader.get_metrics_data().resource_metrics:
+        for scope_metrics in resource_metrics.scope_metrics:
+            for metric in scope_metrics.metrics:
+                points[metric.name] = list(metric.data.data_points)
+    return points
+
+
+def test_span_without_opentelemetry(monkeypatch):
+    monkeypatch.setitem(sys.modules, "opentelemetry", None)
+
+    with telemetry.span("cell") as current_span:
+        pass
+
+    assert current_span is None
+
+
+def test_record_run_without_opentelemetry(monkeypatch):
+    monkeypatch.setitem(sys.modules, "opentelemetry", None)
+
+    telemetry.record_run(None, stats.RunStats(timings={"wait": 1.0}), 1.0)
+
+
+def test_span_without_tracer_provider_is_not_recording():
+    pytest.importorskip("opentelemetry.trace")
+
+    with telemetry.span("cell") as current_span:
+        assert not current_span.is_recording()
+
+
+def test_timed_emits_child_spans(span_exporter):
+    with telemetry.span("cell"), stats.recording(stats.RunStats()):
+        with stats.timed("download"):
+            pass
+        with stats.timed("convert"):
+            pass
+
+    spans = {span.name: span for span in span_exporter.get_finished_spans()}
+    assert set(spans) == {
+        "bigquery_magics.cell",
+        "bigquery_magics.download",
+        "bigquery_magics.convert",
+    }
+    cell_span = spans["bigquery_magics.cell"]
+    assert spans["bigquery_magics.download"].parent.span_id == (
+        cell_span.context.span_id
+    )
+
+
+def test_span_records_exceptions(span_exporter):
+    with pytest.raises(ValueError):
+        with telemetry.span("cell"):
+            raise ValueError("boom")
+
+    (span,) = span_exporter.get_finished_spans()
+    assert not span.status.is_ok
+    assert span.events[0].name == "exception"
+
+
+def test_record_run(span_exporter, metric_reader):
+    run_stats = stats.RunStats(
+        job_id="job_1234",
+        engine="pandas",
+        project="my-project",
+        location="US",
+        rows_downloaded=100,
+        bytes_downloaded=800,
+        timings={"wait": 1.0, "download": 0.5},
+    )
+
+    with telemetry.span("cell") as cell_span:
+        telemetry.record_run(cell_span, run_stats, 2.0)
+
+    (span,) = span_exporter.get_finished_spans()
+    assert span.attributes["bigquery_magics.job_id"] == "job_1234"
+    assert span.attributes["bigquery_magics.engine"] == "pandas"
+    assert span.attributes["bigquery_magics.project"] == "my-project"
+    assert span.attributes["bigquery_magics.location"] == "US"
+    assert span.attributes["bigquery_magics.rows"] == 100
+    assert span.attributes["bigquery_magics.bytes"] == 800
+
+    points = _histogram_points(metric_reader)
+    assert points["bigquery_magics.cell.duration"][0].sum == 2.0
+    phases = {
+        point.attributes["phase"]: point.sum
+        for point in points["bigquery_magics.phase.duration"]
+    }
+    assert phases == {"wait": 1.0, "download": 0.5}
+    assert points["bigquery_magics.download.throughput"][0].sum == 1600.0
+    assert points["bigquery_magics.download.row_throughput"][0].sum == 200.0
+
+
+def test_record_run_without_download(metric_reader):
+    telemetry.record_run(None, stats.RunStats(timings={"wait": 1.0}), 1.0)
+
+    points = _histogram_points(metric_reader)
+    assert "bigquery_magics.cell.duration" in points
+    assert "bigquery_magics.download.throughput" not in points